@@ -7,6 +7,7 @@ mode for humans to use.
 # pylint: disable=R0902
 
 import logging
+import time
 
 import LD_PharpDLL
 import LD_Pharp_Config
@@ -111,8 +112,14 @@ errcodes_h = {
 
 
 class LD_Pharp:
-    def __init__(self, device_Number=0, hw_Config=None, dll_Path=None):
+    def __init__(self, device_Number=0, hw_Config=None, dll_Path=None,
+                 mode=phdefine_h["MODE_HIST"]):
         """
+        Mode:
+            MODE_HIST, MODE_T2 or MODE_T3 from phdefine_h. Histograms come
+            from Get_A_Histogram in MODE_HIST, photon by photon records from
+            Read_FIFO (see fifo_Thread.py) in the TTTR modes. Can be changed
+            later with Set_Mode.
         Binning:
             How many bins of width "resolution" to combine to output the
             histogram. Number of bins combined are 2**binning. Changes the
@@ -139,17 +146,57 @@ class LD_Pharp:
             self.logger.debug("HW Settings passed in")
             self.hw_Settings = hw_Config
 
+        # Warning bits to report, (all of them unless Mask_Warning is used)
+        # and the text for each combination of them already looked up.
+        self.warnings_Mask = ~0
+        self.warnings_Text = {}
+
+        # How Wait_For_Measurement waits (all ms). Sleep in chunks of at most
+        # wait_Chunk until wait_Margin before the measurement should end,
+        # then poll, sleeping poll_Min between polls at first and backing off
+        # to poll_Max.
+        self.wait_Chunk = 50.0
+        self.wait_Margin = 2.0
+        self.poll_Min = 0.1
+        self.poll_Max = 1.0
+        # How many times the last measurement was polled and how long (ms)
+        # after it actually ended that was noticed.
+        self.last_Wait_Stats = {"polls": 0, "overshoot": 0.0}
+
+        # The Picoharp can keep adding to the same histogram over many
+        # measurements (LD_Pharp_Dummy can't, so the GUI adds them up
+        # itself). See Set_Accumulate.
+        self.device_Accumulation = True
+        self.accumulate = False
+        self.clear_Pending = True
+        self.overflowed = False
+        # Whether the Picoharp is set to stop measuring as soon as any bin
+        # is full. Only wanted when accumulating (where the overflow is
+        # noticed and the total frozen), a single shot just runs for the
+        # whole acquisition time.
+        self.stop_Overflow = False
+
+        # The settings the device actually has now, so Update_Settings only
+        # has to send the ones that change. None means send everything.
+        self.applied_Settings = None
+        # Count rates aren't right for a while after changing the sync divider
+        # or the CFDs (demo says at least 100ms), how long to wait (s).
+        self.rate_Settle_Time = 0.2
+
         # Connect to the Picoharp device.
         self.my_PharpDLL = LD_PharpDLL.LD_PharpDLL(device_Number, dll_Path)
+        self.closed = False
 
         # TODO: Check this is the expected version.
         self.library_Version = self.my_PharpDLL.Get_LibraryVersion()
 
         # Housekeeping for getting the Picoharp up.
         self.my_PharpDLL.Open()
-        self.my_PharpDLL.Initialize(0)
+        self.mode = mode
+        self.my_PharpDLL.Initialize(self.mode)
         self.hardware_Info = self.my_PharpDLL.Get_HardwareInfo()
         self.my_PharpDLL.Calibrate()
+        self.my_PharpDLL.Set_StopOverflow(0, 65535)
 
         # Get base resolution from the device.
         #self.base_Resolution = self.my_PharpDLL.Get_BaseResolution()
@@ -167,24 +214,53 @@ class LD_Pharp:
 
     def __del__(self):
         self.logger.debug(f"Bye")
+        self.Close()
+
+    def Close(self):
+        """
+        Close the device. Only the first call does anything, so it can be
+        closed early (e.g. by Device_Manager) and still be deleted later.
+        """
+        if self.closed:
+            return
+        self.closed = True
         self.my_PharpDLL.Close()
 
     def Update_Settings(self, hw_Settings):
         """
-        Even though args are best sent as an unpacked dict, enforcing the
-        parameters separately enforces that they all get sent.
+        Send the settings in hw_Settings which are different to the ones the
+        device already has, and wait for the count rates to settle if that's
+        needed.
         """
 
+        changed = hw_Settings.Diff(self.applied_Settings)
+        self.logger.debug(f"Settings changed: {changed}")
         self.hw_Settings = hw_Settings
         # Set the ones that need to be set now with functions.
-        self.my_PharpDLL.Set_SyncDiv(hw_Settings.sync_Divider)
-        self.my_PharpDLL.Set_InputCFD(hw_Settings.CFD0_Level,
-                                      hw_Settings.CFD0_ZeroCrossing,
-                                      hw_Settings.CFD1_Level,
-                                      hw_Settings.CFD1_ZeroCrossing
-                                      )
-        self.my_PharpDLL.Set_Binning(hw_Settings.binning)
-        self.my_PharpDLL.Set_SyncOffset(hw_Settings.sync_Offset)
+        if "sync_Divider" in changed:
+            self.my_PharpDLL.Set_SyncDiv(hw_Settings.sync_Divider,
+                                         settle=False)
+        if changed & {"CFD0_Level", "CFD0_ZeroCrossing",
+                      "CFD1_Level", "CFD1_ZeroCrossing"}:
+            self.my_PharpDLL.Set_InputCFD(hw_Settings.CFD0_Level,
+                                          hw_Settings.CFD0_ZeroCrossing,
+                                          hw_Settings.CFD1_Level,
+                                          hw_Settings.CFD1_ZeroCrossing
+                                          )
+        if "binning" in changed:
+            self.my_PharpDLL.Set_Binning(hw_Settings.binning)
+        if "sync_Offset" in changed:
+            self.my_PharpDLL.Set_SyncOffset(hw_Settings.sync_Offset)
+        # acq_Time is only used when starting each measurement.
+        self.applied_Settings = hw_Settings.Copy()
+
+        # Just the once however many of them changed.
+        if changed & {"sync_Divider", "CFD0_Level", "CFD0_ZeroCrossing",
+                      "CFD1_Level", "CFD1_ZeroCrossing"}:
+            time.sleep(self.rate_Settle_Time)
+
+        if "binning" not in changed:
+            return
         # Figure out the resolution that is implied by the requested binning.
         new_Resolution = self.base_Resolution * (2 ** hw_Settings.binning)
         self.logger.debug(f"Asked for resolution {new_Resolution}")
@@ -193,6 +269,54 @@ class LD_Pharp:
         self.resolution = self.my_PharpDLL.Get_Resolution()
         self.logger.debug(f"New resolution is {self.resolution}")
 
+    def Set_Mode(self, mode):
+        """
+        Switch between histogramming and the TTTR (T2/T3) modes. The device
+        has to be initialized again for this, which loses the settings and
+        calibration, so those are redone too.
+        """
+
+        self.logger.info(f"Switching to mode {mode}")
+        self.mode = mode
+        self.my_PharpDLL.Initialize(self.mode)
+        self.my_PharpDLL.Calibrate()
+        self.my_PharpDLL.Set_StopOverflow(0, 65535)
+        self.stop_Overflow = False
+        # Initialize put the device back to its defaults.
+        self.applied_Settings = None
+        self.Update_Settings(self.hw_Settings)
+
+    def Start_Measurement(self, acq_Time=None):
+        """
+        Start a measurement of acq_Time ms (defaults to the one in the
+        hardware settings). For TTTR modes, where the data is read as it
+        arrives rather than at the end.
+        """
+
+        if acq_Time is None:
+            acq_Time = self.hw_Settings.acq_Time
+        self.my_PharpDLL.Start(acq_Time)
+
+    def Stop_Measurement(self):
+        self.my_PharpDLL.Stop()
+
+    def Measurement_Done(self):
+        """
+        True once the acquisition time of the current measurement is up.
+        """
+        return self.my_PharpDLL.Get_CTCStatus() != 0
+
+    def Read_FIFO(self, buffer):
+        """
+        Fill (the start of) buffer, a uint32 numpy array of TTREADMAX
+        records, with TTTR records from the device FIFO. Returns how many
+        were read.
+        """
+        return self.my_PharpDLL.Read_FIFO(buffer)
+
+    def Get_Flags(self):
+        return self.my_PharpDLL.Get_Flags()
+
     def Get_CountRate(self):
         """
         Returns both channel count rates in a python list.
@@ -200,42 +324,160 @@ class LD_Pharp:
         count_Channels = self.my_PharpDLL.Get_CountRate()
         return count_Channels
 
-    def Get_A_Histogram(self, n_Channels=65536):
+    def Get_A_Histogram(self, n_Channels=65536, idle=None, out=None):
         """
-        Returns the time tagging histogram as a python list. It's always the
-        full number of channels that can be supplied by the Picoharp. They can
-        be trimmed later.
+        Returns the time tagging histogram as a numpy uint32 array. It's
+        always the full number of channels that can be supplied by the
+        Picoharp. They can be trimmed later.
+        The array is the DLL wrapper's reusable readout buffer, so it is
+        only valid until the next call, unless out is given (see
+        LD_PharpDLL.Get_Histogram) in which case it's read into that.
+        With Set_Accumulate(True) it's the running total of every
+        measurement since the last Clear_Histogram.
+        idle is passed on to Wait_For_Measurement.
         """
         # If this isn't called, the histogram is a cumulative one rather than
         # a single shot.
-        # TODO: Optionally be able to clear this?
-        self.my_PharpDLL.ClearHistMem()
-
-        self.my_PharpDLL.Start(self.hw_Settings.acq_Time)
-
-        # Ask the Picoharp if it's done yet. Either because acq_Time has passed
-        # or because a bin in the histogram has been filled.
-        # TODO: Start using 3.8 or whatever for walrus operator
-        ctc = self.my_PharpDLL.Get_CTCStatus()
-        while ctc == 0:
-            ctc = self.my_PharpDLL.Get_CTCStatus()
-        # Manual says you still have to explicitly stop the Picoharp.
-        self.my_PharpDLL.Stop()
+        if self.clear_Pending or not self.accumulate:
+            self.my_PharpDLL.ClearHistMem()
+            self.clear_Pending = False
+            self.overflowed = False
+        if self.stop_Overflow != self.accumulate:
+            # Stop measuring as soon as any bin of the running total is
+            # full, rather than carrying on with one that's no longer right.
+            self.my_PharpDLL.Set_StopOverflow(int(self.accumulate), 65535)
+            self.stop_Overflow = self.accumulate
+
+        if self.overflowed:
+            # A bin of the running total is full so the Picoharp would stop
+            # again straight away. Keep showing the total until it's cleared,
+            # a frame's worth of time apart, but still calling idle and
+            # stopping as soon as a clear comes in.
+            end = time.perf_counter() + self.hw_Settings.acq_Time / 1000
+            while not self.clear_Pending:
+                if idle is not None:
+                    idle()
+                remaining = end - time.perf_counter()
+                if remaining <= 0:
+                    break
+                time.sleep(min(remaining, self.wait_Chunk / 1000))
+            self.last_Wait_Stats = {"polls": 0, "overshoot": 0.0}
+        else:
+            self.my_PharpDLL.Start(self.hw_Settings.acq_Time)
+            self.Wait_For_Measurement(self.hw_Settings.acq_Time, idle)
+            # Manual says you still have to explicitly stop the Picoharp.
+            self.my_PharpDLL.Stop()
+            if self.accumulate:
+                flags = self.my_PharpDLL.Get_Flags()
+                if flags & phdefine_h["FLAG_OVERFLOW"]:
+                    self.logger.warning("Histogram full, not accumulating "
+                                        "any more until it's cleared")
+                    self.overflowed = True
 
         # Pull the histogram off the Picoharp.
-        histogram = self.my_PharpDLL.Get_Histogram(n_Channels)
+        histogram = self.my_PharpDLL.Get_Histogram(n_Channels, out)
 
-        # Some Picoharp status stuff that might be useful?
-        # flags = self.my_PharpDLL.Get_Flags()
-        # time = self.my_PharpDLL.Get_ElapsedMeasTime()
-        # print(f"Flags {flags}")
         return histogram
 
+    def Set_Accumulate(self, accumulate):
+        """
+        Turn on (or off) adding each measurement on to the histogram already
+        in the Picoharp's memory instead of clearing it first. Either way
+        the next histogram starts from empty.
+        """
+        self.accumulate = accumulate
+        self.clear_Pending = True
+
+    def Clear_Histogram(self):
+        """
+        Empty the histogram (at the start of the next measurement, so this
+        can be called from any thread).
+        """
+        self.clear_Pending = True
+
+    def Wait_For_Measurement(self, acq_Time, idle=None):
+        """
+        Wait for a measurement of acq_Time ms which has just been started to
+        finish. Either because acq_Time has passed or because a bin in the
+        histogram has been filled.
+        Rather than asking the Picoharp over and over (which keeps a core
+        busy for the whole measurement) sleep until nearly the end, going by
+        the device's own elapsed time, then poll with a growing sleep in
+        between. The sleeps before the end are kept short enough that a
+        measurement that stops early isn't missed by much either.
+        idle, if given, is called between those sleeps (at least every
+        wait_Chunk ms) to do other things with the device, e.g. read the
+        count rates. It isn't called once the end is near so it doesn't
+        delay noticing the end.
+        Returns (and keeps in last_Wait_Stats) the number of polls and the
+        overshoot, how long after the end of the measurement it was noticed
+        (ms).
+        """
+
+        start = time.perf_counter()
+        n_Polls = 0
+        poll_Sleep = self.poll_Min
+        near_End = False
+        while True:
+            n_Polls += 1
+            if self.my_PharpDLL.Get_CTCStatus():
+                break
+            if not near_End:
+                if idle is not None:
+                    idle()
+                elapsed = self.my_PharpDLL.Get_ElapsedMeasTime()
+                remaining = acq_Time - elapsed - self.wait_Margin
+                if remaining > 0:
+                    time.sleep(min(remaining, self.wait_Chunk) / 1000)
+                    continue
+                near_End = True
+            time.sleep(poll_Sleep / 1000)
+            poll_Sleep = min(2 * poll_Sleep, self.poll_Max)
+
+        # Compare the time spent waiting to how long the measurement actually
+        # ran for.
+        waited = (time.perf_counter() - start) * 1000
+        overshoot = max(0.0, waited - self.my_PharpDLL.Get_ElapsedMeasTime())
+
+        self.last_Wait_Stats = {"polls": n_Polls, "overshoot": overshoot}
+        return self.last_Wait_Stats
+
     def Get_Warnings(self):
-        warn_Code = self.my_PharpDLL.Get_Warnings()
+        """
+        Returns the warnings bitmask (see the WARNING_* values in
+        phdefine_h) with any masked warnings removed. Decode_Warnings turns
+        it into text.
+        """
+        return self.my_PharpDLL.Get_Warnings() & self.warnings_Mask
+
+    def Decode_Warnings(self, warn_Code):
+        """
+        Text explaining the warnings in warn_Code. The dll is only asked for
+        the text the first time each combination of warnings is seen, the
+        result is remembered.
+        """
+        try:
+            return self.warnings_Text[warn_Code]
+        except KeyError:
+            pass
+
         warn_Text = self.my_PharpDLL.Get_WarningsText(warn_Code)
         # Strip any multiple newlines, and also the trailing newline.
-        return warn_Text.replace("\n\n\n", "\n").replace("\n\n", "\n")[:-1]
+        warn_Text = warn_Text.replace("\n\n\n", "\n").replace("\n\n", "\n")
+        warn_Text = warn_Text[:-1]
+        self.warnings_Text[warn_Code] = warn_Text
+        return warn_Text
+
+    def Mask_Warning(self, warning_Name, masked=True):
+        """
+        Stop (or with masked=False, start again) reporting a warning, e.g.
+        Mask_Warning("WARNING_DIVIDER_GREATER_ONE")
+        """
+        bit = phdefine_h[warning_Name]
+        if masked:
+            self.warnings_Mask &= ~bit
+        else:
+            self.warnings_Mask |= bit
 
 if __name__ == "__main__":    
     my_LDPharp = LD_Pharp()
@@ -243,4 +485,4 @@ if __name__ == "__main__":
     print(f"Count rate: {my_LDPharp.Get_CountRate()}")
 
     warns = my_LDPharp.Get_Warnings()
-    print(warns)
\ No newline at end of file
+    print(my_LDPharp.Decode_Warnings(warns))
\ No newline at end of file
@@ -5,11 +5,59 @@ friendly and actually does stuff.
 """
 
 import ctypes
+import functools
 import logging
 import os
 import platform
 import time
 
+import numpy as np
+
+# Shorthands for the pointer types used in phlib.h
+c_int_p = ctypes.POINTER(ctypes.c_int)
+c_uint_p = ctypes.POINTER(ctypes.c_uint)
+c_double_p = ctypes.POINTER(ctypes.c_double)
+
+# PH_GetHistogram always writes this many channels (HISTCHAN in phdefin.h),
+# however many are wanted.
+HISTCHAN = 65536
+
+# Argument types of the phlib.h functions wrapped here. Every one of these
+# takes the device index as its first argument (which is bound once per
+# instance so it is left off here) and returns an int error code.
+device_Prototypes = {
+    "PH_OpenDevice": (ctypes.c_char_p,),
+    "PH_CloseDevice": (),
+    "PH_Initialize": (ctypes.c_int,),
+    "PH_Calibrate": (),
+    "PH_StartMeas": (ctypes.c_int,),
+    "PH_StopMeas": (),
+    "PH_ClearHistMem": (ctypes.c_int,),
+    "PH_CTCStatus": (c_int_p,),
+    "PH_GetBaseResolution": (c_double_p, c_int_p),
+    "PH_GetCountRate": (ctypes.c_int, c_int_p),
+    "PH_GetElapsedMeasTime": (c_double_p,),
+    "PH_GetFlags": (c_int_p,),
+    "PH_GetHardwareInfo": (ctypes.c_char_p, ctypes.c_char_p,
+                           ctypes.c_char_p),
+    "PH_GetHistogram": (c_uint_p, ctypes.c_int),
+    "PH_GetResolution": (c_double_p,),
+    "PH_GetWarnings": (c_int_p,),
+    "PH_GetWarningsText": (ctypes.c_char_p, ctypes.c_int),
+    "PH_ReadFiFo": (c_uint_p, ctypes.c_int, c_int_p),
+    "PH_SetBinning": (ctypes.c_int,),
+    "PH_SetInputCFD": (ctypes.c_int, ctypes.c_int, ctypes.c_int),
+    "PH_SetOffset": (ctypes.c_int,),
+    "PH_SetStopOverflow": (ctypes.c_int, ctypes.c_int),
+    "PH_SetSyncDiv": (ctypes.c_int,),
+    }
+
+# The few phlib.h functions that don't take a device index.
+library_Prototypes = {
+    "PH_GetErrorString": (ctypes.c_char_p, ctypes.c_int),
+    "PH_GetLibraryVersion": (ctypes.c_char_p,),
+    }
+
 
 class LD_PharpDLL:
     """
@@ -43,13 +91,89 @@ class LD_PharpDLL:
 
         if isinstance(dll_Path, str):
             pass
+        elif "PHLIB_PATH" in os.environ:
+            # e.g. to run everything on the simulated library in sim/
+            dll_Path = os.environ["PHLIB_PATH"]
         else:
             dll_Path = default_DLL_Paths[os_Name][arch]
         
         dll_Path = os.path.abspath(dll_Path)
 
         self.phlib = ctypes.CDLL(dll_Path)
-        self.device_Number_ct = ctypes.c_int(device_Number)
+        self.device_Number = device_Number
+
+        # Look every function up once, declare its types so ctypes converts
+        # plain python ints itself, and bind the device index. The methods
+        # below then call e.g. self.PH_CTCStatus(...) directly.
+        self.function_Table = self.Make_Function_Table()
+        for name, function in self.function_Table.items():
+            setattr(self, name, function)
+
+        # Out parameters for the calls that get made over and over again
+        # (the CTC status is polled continuously while a histogram is
+        # acquired). Made once and reused rather than made on every call.
+        self.ctc_Status_ct = ctypes.c_int(0)
+        self.count_Rates_ct = (ctypes.c_int(), ctypes.c_int())
+        self.warnings_ct = ctypes.c_int()
+        self.fifo_Count_ct = ctypes.c_int()
+        self.fifo_Count_ref = ctypes.byref(self.fifo_Count_ct)
+        self.Make_Hot_Calls()
+
+        # Histograms are read straight into this (via its ctypes pointer)
+        # rather than into a fresh ctypes array that then has to be turned
+        # into a list element by element. Made bigger on demand in
+        # Get_Histogram if anyone ever asks for more channels.
+        self.histogram_Buffer = np.zeros(HISTCHAN, dtype=np.uint32)
+        self.histogram_Pointer = self.histogram_Buffer.ctypes.data_as(
+            c_uint_p)
+
+    def Make_Function_Table(self):
+        """
+        Returns a dict of phlib function name: callable, with argtypes and
+        restype declared and (where the function takes one) the device index
+        already bound.
+        """
+
+        function_Table = {}
+        for name, argtypes in device_Prototypes.items():
+            function = getattr(self.phlib, name)
+            function.argtypes = (ctypes.c_int,) + argtypes
+            function.restype = ctypes.c_int
+            function_Table[name] = functools.partial(function,
+                                                     self.device_Number)
+        for name, argtypes in library_Prototypes.items():
+            function = getattr(self.phlib, name)
+            function.argtypes = argtypes
+            function.restype = ctypes.c_int
+            function_Table[name] = function
+
+        return function_Table
+
+    def Make_Hot_Calls(self):
+        """
+        The calls made in tight loops get every argument bound up front as
+        the ctypes object it has to be, so calling one is a single trip into
+        the library with no lookups or conversions on the python side. These
+        use their own function pointers (indexing the CDLL makes a new one)
+        without argtypes, because the bound arguments already are exactly
+        what argtypes would have checked them against.
+        """
+
+        device_Number_ct = ctypes.c_int(self.device_Number)
+
+        def Bind(name, *args):
+            function = self.phlib[name]
+            function.restype = ctypes.c_int
+            return functools.partial(function, device_Number_ct, *args)
+
+        self.hot_CTCStatus = Bind("PH_CTCStatus",
+                                  ctypes.byref(self.ctc_Status_ct))
+        self.hot_CountRate = tuple(
+            Bind("PH_GetCountRate", ctypes.c_int(channel), ctypes.byref(rate))
+            for channel, rate in enumerate(self.count_Rates_ct)
+            )
+        self.hot_Warnings = Bind("PH_GetWarnings",
+                                 ctypes.byref(self.warnings_ct))
 
     def Open(self):
         """
@@ -57,11 +181,10 @@ class LD_PharpDLL:
         """
 
         hwSerial_ct = ctypes.create_string_buffer(b"", 8)
-        return_Code = self.phlib.PH_OpenDevice(self.device_Number_ct,
-                                               hwSerial_ct)
+        return_Code = self.PH_OpenDevice(hwSerial_ct)
 
         if return_Code == 0:
-            device_Number = self.device_Number_ct.value
+            device_Number = self.device_Number
             hwSerial = hwSerial_ct.value.decode("utf-8")
             self.logger.info(
                     f"Connected to device {device_Number}, serial: {hwSerial}"
@@ -76,15 +199,14 @@ class LD_PharpDLL:
         extern int _stdcall PH_CloseDevice(int devidx);
         """
 
-        self.phlib.PH_CloseDevice(self.device_Number_ct)
+        self.PH_CloseDevice()
 
     def Initialize(self, mode_Hist=0):
         """
         extern int _stdcall PH_Initialize(int devidx, int mode);
         """
 
-        return_Code = self.phlib.PH_Initialize(self.device_Number_ct,
-                                               ctypes.c_int(mode_Hist))
+        return_Code = self.PH_Initialize(mode_Hist)
 
         # demo says at least 100ms should pass before reading count rates after
         # setting this solet's put a wait here for safety.
@@ -98,15 +220,14 @@ class LD_PharpDLL:
         """
 
         self.logger.info("Calibrate")
-        return_Code = self.phlib.PH_Calibrate(self.device_Number_ct)
+        return_Code = self.PH_Calibrate()
         return self.ProcessReturnCode(return_Code)
 
     def Start(self, tacq=1000):
         """
         extern int _stdcall PH_StartMeas(int devidx, int tacq);
         """
-        return_Code = self.phlib.PH_StartMeas(self.device_Number_ct,
-                                              ctypes.c_int(tacq))
+        return_Code = self.PH_StartMeas(tacq)
         #self.logger.debug(f"Measuring for {tacq}ms")
         return self.ProcessReturnCode(return_Code)
 
@@ -115,23 +236,32 @@ class LD_PharpDLL:
         extern int _stdcall PH_StopMeas(int devidx);
         """
 
-        return_Code = self.phlib.PH_StopMeas(self.device_Number_ct)
+        return_Code = self.PH_StopMeas()
         #self.logger.debug(f"Stopped")
         return self.ProcessReturnCode(return_Code)
 
-#    def Read_FIFO(self):
-#        """
-#        extern int _stdcall PH_ReadFiFo(int devidx, unsigned int* buffer,
-#        int count, int* nactual);
-#        """
-#        raise NotImplementedError
+    def Read_FIFO(self, buffer):
+        """
+        extern int _stdcall PH_ReadFiFo(int devidx, unsigned int* buffer,
+        int count, int* nactual);
+
+        buffer is a C contiguous numpy uint32 array that the dll fills
+        directly (count is its length, which should be TTREADMAX). Returns
+        the number of records actually read.
+        """
+        return_Code = self.PH_ReadFiFo(buffer.ctypes.data_as(c_uint_p),
+                                       len(buffer),
+                                       self.fifo_Count_ref)
+        if return_Code:
+            self.ProcessReturnCode(return_Code)
+            return 0
+        return self.fifo_Count_ct.value
 
     def ClearHistMem(self):
         """
         extern int _stdcall PH_ClearHistMem(int devidx, int block);
         """
-        return_Code = self.phlib.PH_ClearHistMem(self.device_Number_ct,
-                                                 ctypes.c_int(0))
+        return_Code = self.PH_ClearHistMem(0)
         return self.ProcessReturnCode(return_Code)
 
     def ProcessReturnCode(self, return_Code):
@@ -151,9 +281,9 @@ class LD_PharpDLL:
         """
 
         base_Res_ct = ctypes.c_double()
-        return_Code = self.phlib.PH_GetBaseResolution(
-                                                    self.device_Number_ct,
-                                                    ctypes.byref(base_Res_ct))
+        bin_Steps_ct = ctypes.c_int()
+        return_Code = self.PH_GetBaseResolution(ctypes.byref(base_Res_ct),
+                                                ctypes.byref(bin_Steps_ct))
         self.ProcessReturnCode(return_Code)
 
         return base_Res_ct.value
@@ -164,17 +294,15 @@ class LD_PharpDLL:
         int* rate);
         """
 
-        countRate0_ct = ctypes.c_int()
-        countRate1_ct = ctypes.c_int()
+        countRate0_ct, countRate1_ct = self.count_Rates_ct
+        get_Rate0, get_Rate1 = self.hot_CountRate
 
-        return_Code0 = self.phlib.PH_GetCountRate(self.device_Number_ct,
-                                                  ctypes.c_int(0),
-                                                  ctypes.byref(countRate0_ct))
-        self.ProcessReturnCode(return_Code0)
-        return_Code1 = self.phlib.PH_GetCountRate(self.device_Number_ct,
-                                                  ctypes.c_int(1),
-                                                  ctypes.byref(countRate1_ct))
-        self.ProcessReturnCode(return_Code1)
+        return_Code0 = get_Rate0()
+        if return_Code0:
+            self.ProcessReturnCode(return_Code0)
+        return_Code1 = get_Rate1()
+        if return_Code1:
+            self.ProcessReturnCode(return_Code1)
 
         return countRate0_ct.value, countRate1_ct.value
 
@@ -182,20 +310,17 @@ class LD_PharpDLL:
         """
         extern int _stdcall PH_CTCStatus(int devidx, int* ctcstatus);
         """
-        ctc_Status_ct = ctypes.c_int(0)
-        return_Code = self.phlib.PH_CTCStatus(self.device_Number_ct,
-                                              ctypes.byref(ctc_Status_ct))
-        self.ProcessReturnCode(return_Code)
-        return ctc_Status_ct.value
+        return_Code = self.hot_CTCStatus()
+        if return_Code:
+            self.ProcessReturnCode(return_Code)
+        return self.ctc_Status_ct.value
 
     def Get_ElapsedMeasTime(self):
         """
         extern int _stdcall PH_GetElapsedMeasTime(int devidx, double* elapsed);
         """
         meas_Time_ct = ctypes.c_double()
-        return_Code = self.phlib.PH_GetElapsedMeasTime(
-                                                    self.device_Number_ct,
-                                                    ctypes.byref(meas_Time_ct))
+        return_Code = self.PH_GetElapsedMeasTime(ctypes.byref(meas_Time_ct))
         self.ProcessReturnCode(return_Code)
 
         return meas_Time_ct.value
@@ -206,7 +331,7 @@ class LD_PharpDLL:
         """
 
         errorString_ct = ctypes.create_string_buffer(b"", 40)
-        self.phlib.PH_GetErrorString(errorString_ct, ctypes.c_int(return_Code))
+        self.PH_GetErrorString(errorString_ct, return_Code)
         error_String = errorString_ct.value.decode("utf-8")
 
         self.logger.warning(f"Return code {return_Code} is {error_String}")
@@ -224,8 +349,7 @@ class LD_PharpDLL:
         """
 
         flags_ct = ctypes.c_int()
-        return_Code = self.phlib.PH_GetFlags(self.device_Number_ct,
-                                             ctypes.byref(flags_ct))
+        return_Code = self.PH_GetFlags(ctypes.byref(flags_ct))
         self.ProcessReturnCode(return_Code)
         return flags_ct.value
 
@@ -246,10 +370,9 @@ class LD_PharpDLL:
         hwVersion_ct = ctypes.create_string_buffer(b"", 8)
         hwModel_ct = ctypes.create_string_buffer(b"", 16)
 
-        return_Code = self.phlib.PH_GetHardwareInfo(self.device_Number_ct,
-                                                    hwModel_ct,
-                                                    hwPartno_ct,
-                                                    hwVersion_ct)
+        return_Code = self.PH_GetHardwareInfo(hwModel_ct,
+                                              hwPartno_ct,
+                                              hwVersion_ct)
         if return_Code == 0:
             hw_Model = hwModel_ct.value.decode("utf-8")
             hw_Part = hwPartno_ct.value.decode("utf-8")
@@ -264,21 +387,40 @@ class LD_PharpDLL:
                 "part": hw_Part,
                 "version": hw_Vers}
 
-    def Get_Histogram(self, histogram_Channels):
+    def Get_Histogram(self, histogram_Channels, out=None):
         """
         extern int _stdcall PH_GetHistogram(int devidx, unsigned int* chcount,
         int block);
-        """
-        # print(f"Get histogram")
-        counts_ct = (ctypes.c_uint * histogram_Channels)()
-        return_Code = self.phlib.PH_GetHistogram(self.device_Number_ct,
-                                                 ctypes.byref(counts_ct),
-                                                 ctypes.c_int(0))
+
+        The dll writes directly into the preallocated uint32 buffer, so the
+        array returned is a view of that buffer and WILL be overwritten by
+        the next call. Copy it if it needs to outlive the next histogram.
+        Or pass out (a contiguous uint32 array, e.g. a pooled frame) to have
+        the dll write into that instead. It has to have room for all
+        HISTCHAN channels, since that's what the dll writes, even if fewer
+        are wanted.
+        """
+        if out is not None:
+            n_Needed = max(HISTCHAN, histogram_Channels)
+            if (out.dtype != np.uint32 or not out.flags.c_contiguous
+                    or len(out) < n_Needed):
+                raise ValueError("out must be a contiguous uint32 array of "
+                                 f"at least {n_Needed} channels")
+            return_Code = self.PH_GetHistogram(out.ctypes.data_as(c_uint_p),
+                                               0)
+            self.ProcessReturnCode(return_Code)
+            return out[:histogram_Channels]
+
+        if histogram_Channels > len(self.histogram_Buffer):
+            self.histogram_Buffer = np.zeros(histogram_Channels,
+                                             dtype=np.uint32)
+            self.histogram_Pointer = self.histogram_Buffer.ctypes.data_as(
+                c_uint_p)
+
+        return_Code = self.PH_GetHistogram(self.histogram_Pointer, 0)
         self.ProcessReturnCode(return_Code)
 
-        # print(f"Process histogram")
-        histogram = [x for x in counts_ct]
-        return histogram
+        return self.histogram_Buffer[:histogram_Channels]
 
     def Get_LibraryVersion(self):
         """
@@ -286,7 +428,7 @@ class LD_PharpDLL:
         """
 
         libVersion_ct = ctypes.create_string_buffer(b"", 8)
-        self.phlib.PH_GetLibraryVersion(libVersion_ct)
+        self.PH_GetLibraryVersion(libVersion_ct)
         lib_Version = libVersion_ct.value.decode("utf-8")
 
         self.logger.info(f"Library version is {lib_Version}")
@@ -298,8 +440,7 @@ class LD_PharpDLL:
         """
 
         resolution = ctypes.c_double()
-        return_Code = self.phlib.PH_GetResolution(self.device_Number_ct,
-                                                  ctypes.byref(resolution))
+        return_Code = self.PH_GetResolution(ctypes.byref(resolution))
         self.ProcessReturnCode(return_Code)
         return resolution.value
 
@@ -326,11 +467,10 @@ class LD_PharpDLL:
         """
         extern int _stdcall PH_GetWarnings(int devidx, int* warnings);
         """
-        warnings_Code = ctypes.c_int()
-        return_Code = self.phlib.PH_GetWarnings(self.device_Number_ct,
-                                                ctypes.byref(warnings_Code))
-        self.ProcessReturnCode(return_Code)
-        return warnings_Code
+        return_Code = self.hot_Warnings()
+        if return_Code:
+            self.ProcessReturnCode(return_Code)
+        return self.warnings_ct.value
 
     def Get_WarningsText(self, warnings_Code):
         """
@@ -338,9 +478,7 @@ class LD_PharpDLL:
         int warnings);
         """
         warnings_Text = ctypes.create_string_buffer(32768)
-        return_Code = self.phlib.PH_GetWarningsText(self.device_Number_ct,
-                                                    ctypes.byref(warnings_Text),
-                                                    warnings_Code)
+        return_Code = self.PH_GetWarningsText(warnings_Text, warnings_Code)
         return_String = warnings_Text.value.decode("utf-8")
         return return_String
         
@@ -350,8 +488,7 @@ class LD_PharpDLL:
         """
 
         self.logger.debug("Set binning")
-        return_Code = self.phlib.PH_SetBinning(self.device_Number_ct,
-                                               ctypes.c_int(binning))
+        return_Code = self.PH_SetBinning(binning)
         return self.ProcessReturnCode(return_Code)
 
     def Set_InputCFD(self, cfd0_level, cfd0_zerocross,
@@ -361,15 +498,9 @@ class LD_PharpDLL:
         int zc);
         """
         self.logger.debug("Set Input CFD channel 0")
-        return_Code0 = self.phlib.PH_SetInputCFD(self.device_Number_ct,
-                                                 ctypes.c_int(0),
-                                                 ctypes.c_int(cfd0_level),
-                                                 ctypes.c_int(cfd0_zerocross))
+        return_Code0 = self.PH_SetInputCFD(0, cfd0_level, cfd0_zerocross)
         self.logger.debug("Set Input CFD channel 1")
-        return_Code1 = self.phlib.PH_SetInputCFD(self.device_Number_ct,
-                                                 ctypes.c_int(1),
-                                                 ctypes.c_int(cfd1_level),
-                                                 ctypes.c_int(cfd1_zerocross))
+        return_Code1 = self.PH_SetInputCFD(1, cfd1_level, cfd1_zerocross)
         return self.ProcessReturnCode(return_Code0), \
             self.ProcessReturnCode(return_Code1)
 
@@ -433,29 +564,28 @@ class LD_PharpDLL:
 #        """
 #        raise NotImplementedError
 
-    def Set_StopOverflow(self):
+    def Set_StopOverflow(self, stop_Overflow=1, stop_Count=65535):
         """
         extern int _stdcall PH_SetStopOverflow(int devidx, int stop_ovfl,
         int stopcount);
         """
 
-        return_Code = self.phlib.PH_SetStopOverflow(self.device_Number_ct,
-                                                    ctypes.c_int(1),
-                                                    ctypes.c_int(65535))
+        return_Code = self.PH_SetStopOverflow(stop_Overflow, stop_Count)
         return self.ProcessReturnCode(return_Code)
 
-    def Set_SyncDiv(self, sync_Divider):
+    def Set_SyncDiv(self, sync_Divider, settle=True):
         """
         extern int _stdcall PH_SetSyncDiv(int devidx, int div);
         """
 
         self.logger.debug("Set Sync Divider")
-        return_Code = self.phlib.PH_SetSyncDiv(self.device_Number_ct,
-                                               ctypes.c_int(sync_Divider))
+        return_Code = self.PH_SetSyncDiv(sync_Divider)
 
         # demo says at least 100ms should pass before reading count rates after
-        # setting this solet's put a wait here for safety.
-        time.sleep(0.2)
+        # setting this solet's put a wait here for safety. (Unless the caller
+        # is going to wait itself)
+        if settle:
+            time.sleep(0.2)
 
         return self.ProcessReturnCode(return_Code)
 
@@ -465,6 +595,5 @@ class LD_PharpDLL:
         """
 
         self.logger.debug("Set Ch0 Offset")
-        return_Code = self.phlib.PH_SetOffset(self.device_Number_ct,
-                                              ctypes.c_int(sync_Offset))
+        return_Code = self.PH_SetOffset(sync_Offset)
         return self.ProcessReturnCode(return_Code)
\ No newline at end of file
@@ -8,7 +8,11 @@ behaviour
 """
 
 import configparser
+import copy
 import distutils.util
+import logging
+
+logger = logging.getLogger("PHarp.Config")
 
 class Hardware_Settings():
     """
@@ -56,6 +60,22 @@ class Hardware_Settings():
         """
         return str(self.to_Dict())
 
+    def Copy(self):
+        """
+        A snapshot of these settings, which won't change when these do.
+        """
+        return copy.copy(self)
+
+    def Diff(self, other):
+        """
+        Names of the settings (e.g. "sync_Divider") whose values are
+        different in other. All of them if other is None.
+        """
+        if other is None:
+            return {name[1:] for name in vars(self)}
+        return {name[1:] for name, value in vars(self).items()
+                if getattr(other, name) != value}
+
     @property
     def binning(self):
         return self._binning
@@ -122,8 +142,8 @@ class Hardware_Settings():
         # There's some value here where the GUI just locks up because too much
         # time is being spent updating the histograms/ Ensure >250ms for now.
         if (value < 250):
-            print(f"Acq time of {value} too short for GUI to remain responsive")
-            print(f"Value set to 250 instead")
+            logger.warning(f"Acq time of {value} too short for GUI to remain "
+                           f"responsive, value set to 250 instead")
             value = 250
         self._acq_Time = value
 
@@ -148,6 +168,8 @@ class Software_Settings():
         self._integral_Width = 5e-9
         self._cumulative_Mode = False
         self._log_Y = False
+        self._count_Interval = 100
+        self._max_FPS = 30
 
     def to_Dict(self):
         """
@@ -158,7 +180,9 @@ class Software_Settings():
                   "Show Bars": str(self.show_Bars),
                   "Integral Width": str(self.integral_Width),
                   "Cumulative Mode": str(self._cumulative_Mode),
-                  "Log Y": str(self._log_Y)
+                  "Log Y": str(self._log_Y),
+                  "Count Interval": str(self._count_Interval),
+                  "Max FPS": str(self._max_FPS)
                   }
         return config
     
@@ -217,6 +241,29 @@ class Software_Settings():
     def log_Y(self, value):
         self._log_Y = bool(distutils.util.strtobool(value))
 
+    @property
+    def count_Interval(self):
+        return self._count_Interval
+
+    @count_Interval.setter
+    def count_Interval(self, value):
+        value = int(value)
+        # The Picoharp only updates the count rates every 100ms.
+        if (value < 100):
+            logger.warning(f"Count interval of {value} shorter than the "
+                           f"hardware gate, value set to 100 instead")
+            value = 100
+        self._count_Interval = value
+
+    @property
+    def max_FPS(self):
+        return self._max_FPS
+
+    @max_FPS.setter
+    def max_FPS(self, value):
+        # Histograms drawn per second at most, however fast they arrive.
+        self._max_FPS = max(1, int(value))
+
 
 class LD_Pharp_Config():
     """
@@ -294,6 +341,11 @@ class LD_Pharp_Config():
         self.sw_Settings.integral_Width = sw_Settings["Integral Width"]
         self.sw_Settings.cumulative_Mode = sw_Settings["Cumulative Mode"]
         self.sw_Settings.log_Y = sw_Settings["Log Y"]
+        # Newer setting, older ini files won't have it.
+        self.sw_Settings.count_Interval = sw_Settings.get(
+            "Count Interval", str(self.sw_Settings.count_Interval))
+        self.sw_Settings.max_FPS = sw_Settings.get(
+            "Max FPS", str(self.sw_Settings.max_FPS))
 
 
     def Save_To_File(self, path):
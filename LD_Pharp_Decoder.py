@@ -0,0 +1,182 @@
+"""
+Decodes the raw 32 bit TTTR records the Picoharp produces in T2 and T3
+modes (see fifo_Thread.py) into numpy structured arrays of events.
+
+Whole blocks of records are decoded at once with numpy bit operations, the
+time tag overflows are corrected with a cumulative sum, so there's no
+python loop over records anywhere.
+
+Record formats (from the Picoharp 300 manual/demo code):
+    T3: | channel (4) | dtime (12) | nsync (16) |
+        channel 15 is special: dtime 0 is an nsync overflow, otherwise the
+        low 4 bits of dtime are the markers.
+    T2: | channel (4) | time tag (28) |
+        channel 15 is special: markers in the low 4 bits of the time tag,
+        or an overflow if they're all 0.
+"""
+
+# pylint: disable=C0103
+
+import numpy as np
+
+import LD_Pharp
+
+T2WRAPAROUND = 210698240
+T3WRAPAROUND = 65536
+SPECIAL_CHANNEL = 15
+
+# One decoded event. Photons have marker 0, marker events have channel 15
+# and the marker bits in marker. In T2 mode dtime and nsync are always 0.
+# time is the overflow corrected absolute time in picoseconds (T2: time tag
+# * base resolution, T3: nsync * sync period + dtime * resolution).
+event_Dtype = np.dtype([
+    ("channel", np.uint8),
+    ("marker", np.uint8),
+    ("dtime", np.uint16),
+    ("nsync", np.uint64),
+    ("time", np.int64),
+    ])
+
+
+class TTTR_Decoder():
+    """
+    Decodes successive blocks of records from one measurement, carrying the
+    overflow count over from one block to the next.
+    """
+
+    def __init__(self, mode, resolution=4.0, sync_Period=0.0):
+        """
+        mode is MODE_T2 or MODE_T3 from LD_Pharp.phdefine_h.
+        resolution is the time of one bin (ps): the base resolution in T2
+        mode, the (binned) resolution in T3 mode.
+        sync_Period (ps) is only used in T3 mode to work out absolute times,
+        if it's 0 the time field is just dtime * resolution.
+        """
+
+        if mode == LD_Pharp.phdefine_h["MODE_T2"]:
+            self._Decode = self._Decode_T2
+        elif mode == LD_Pharp.phdefine_h["MODE_T3"]:
+            self._Decode = self._Decode_T3
+        else:
+            raise ValueError(f"Mode {mode} isn't a TTTR mode")
+
+        self.mode = mode
+        self.resolution = resolution
+        self.sync_Period = sync_Period
+        self.n_Overflows = 0
+
+    def Reset(self):
+        """
+        Start of a new measurement, forget the overflows so far.
+        """
+        self.n_Overflows = 0
+
+    def Decode(self, records):
+        """
+        Decode a block of uint32 records, returns an event_Dtype array with
+        one element per photon/marker (overflow records are used up here).
+        """
+        records = np.asarray(records, dtype=np.uint32)
+        return self._Decode(records)
+
+    def _Overflow_Offsets(self, overflow, wraparound):
+        """
+        For every record, the number of overflows before (and including) it
+        in this measurement times the wraparound. Also updates the running
+        overflow count for the next block.
+        """
+        if overflow.any():
+            n_Overflows = np.cumsum(overflow, dtype=np.uint64)
+            n_Overflows += self.n_Overflows
+            self.n_Overflows = int(n_Overflows[-1])
+            return n_Overflows * np.uint64(wraparound)
+        # The usual case for short blocks, save the cumsum.
+        return np.uint64(self.n_Overflows * wraparound)
+
+    def _Decode_T3(self, records):
+        channel = (records >> 28).astype(np.uint8)
+        dtime = ((records >> 16) & 0xFFF).astype(np.uint16)
+        nsync = (records & 0xFFFF).astype(np.uint64)
+
+        special = channel == SPECIAL_CHANNEL
+        overflow = special & (dtime == 0)
+        nsync += self._Overflow_Offsets(overflow, T3WRAPAROUND)
+
+        keep = ~overflow
+        events = np.empty(np.count_nonzero(keep), dtype=event_Dtype)
+        if len(events) == len(records):
+            keep = slice(None)
+        special = special[keep]
+        dtime = dtime[keep]
+
+        events["channel"] = channel[keep]
+        events["marker"] = np.where(special, dtime & 0xF, 0)
+        dtime[special] = 0
+        events["dtime"] = dtime
+        events["nsync"] = nsync[keep]
+        time = _To_Picoseconds(dtime, self.resolution)
+        if self.sync_Period:
+            time += _To_Picoseconds(events["nsync"], self.sync_Period)
+        events["time"] = time
+        return events
+
+    def _Decode_T2(self, records):
+        channel = (records >> 28).astype(np.uint8)
+        time_Tag = (records & 0x0FFFFFFF).astype(np.uint64)
+
+        special = channel == SPECIAL_CHANNEL
+        marker = np.where(special, records & 0xF, 0).astype(np.uint8)
+        overflow = special & (marker == 0)
+        # Marker bits sit in the bottom of the time tag (and marker is 0 for
+        # everything else).
+        time_Tag -= marker
+        time_Tag += self._Overflow_Offsets(overflow, T2WRAPAROUND)
+
+        keep = ~overflow
+        events = np.empty(np.count_nonzero(keep), dtype=event_Dtype)
+        if len(events) == len(records):
+            keep = slice(None)
+        events["channel"] = channel[keep]
+        events["marker"] = marker[keep]
+        events["dtime"] = 0
+        events["nsync"] = 0
+        events["time"] = _To_Picoseconds(time_Tag[keep], self.resolution)
+        return events
+
+
+def _To_Picoseconds(counts, unit):
+    """
+    counts * unit as int64, staying in integers when unit is a whole number
+    of ps (it nearly always is) so long measurements don't lose precision.
+    """
+    if float(unit).is_integer():
+        return counts.astype(np.int64) * np.int64(unit)
+    return np.rint(counts * unit).astype(np.int64)
+
+
+def Decode_T2(records, resolution=4.0):
+    """
+    Decode one complete block of T2 records.
+    """
+    decoder = TTTR_Decoder(LD_Pharp.phdefine_h["MODE_T2"], resolution)
+    return decoder.Decode(records)
+
+
+def Decode_T3(records, resolution=4.0, sync_Period=0.0):
+    """
+    Decode one complete block of T3 records.
+    """
+    decoder = TTTR_Decoder(LD_Pharp.phdefine_h["MODE_T3"], resolution,
+                           sync_Period)
+    return decoder.Decode(records)
+
+
+if __name__ == "__main__":
+    # Photon on ch1, an overflow, a marker, then a photon on ch1.
+    test_Records = np.array([
+        (1 << 28) | (100 << 16) | 5,
+        (15 << 28),
+        (15 << 28) | (2 << 16) | 7,
+        (1 << 28) | (200 << 16) | 6,
+        ], dtype=np.uint32)
+    print(Decode_T3(test_Records, 4.0, 12500.0))
@@ -41,10 +41,17 @@ class LD_Pharp:
 
         self.base_Resolution = 4.0  # picoseconds
         self.resolution = self.base_Resolution
+        # Nothing to poll, there's no device.
+        self.last_Wait_Stats = {"polls": 0, "overshoot": 0.0}
+        # Every histogram is a new one, cumulative mode is done by the GUI.
+        self.device_Accumulation = False
 
     def __del__(self):
         self.logger.debug(f"Bye")
 
+    def Close(self):
+        pass
+
     def Update_Settings(self, hw_Settings):
         """
 
@@ -65,11 +72,11 @@ class LD_Pharp:
 
         return np.random.randint(0,65535, 2)
 
-    def Get_A_Histogram(self, n_Channels=65536):
+    def Get_A_Histogram(self, n_Channels=65536, idle=None, out=None):
         """
         Returns the time tagging histogram as a python list. It's always the
         full number of channels that can be supplied by the Picoharp. They can
-        be trimmed later.
+        be trimmed later. (Or puts it in out, like LD_Pharp)
         """
 
         gaussian = scipy.signal.gaussian(25000, 1000) * 25000
@@ -83,13 +90,35 @@ class LD_Pharp:
 
         final = np.pad(final, (0, 65536-25000), "constant", constant_values=0)
 
-        time.sleep(self.hw_Settings.acq_Time / 1000)
-
+        # "Measure" for acq_Time, calling idle every 50ms like LD_Pharp.
+        end = time.perf_counter() + self.hw_Settings.acq_Time / 1000
+        remaining = end - time.perf_counter()
+        while remaining > 0:
+            if idle is not None:
+                idle()
+            time.sleep(min(remaining, 0.05))
+            remaining = end - time.perf_counter()
+
+        if out is not None:
+            out[:n_Channels] = final[:n_Channels]
+            return out[:n_Channels]
         return final
 
+    def Set_Accumulate(self, accumulate):
+        pass
+
+    def Clear_Histogram(self):
+        pass
+
     def Get_Warnings(self):
+        return 0
+
+    def Decode_Warnings(self, warn_Code):
         return "No device detected, displaying dummy data"
 
+    def Mask_Warning(self, warning_Name, masked=True):
+        pass
+
 
 if __name__ == "__main__":
     my_LDPharp = LD_Pharp()
@@ -1,7 +1,10 @@
+import logging
+import queue
 import time
 
 from PyQt5 import QtCore
-import numpy as np
+
+import ring_Buffers
 
 
 class Acq_Thread(QtCore.QThread):
@@ -13,11 +16,17 @@ class Acq_Thread(QtCore.QThread):
     # Separate for the counts and the histograms so the histogram mode can
     # be easily toggled on/off.
     count_Signal = QtCore.pyqtSignal(int, int)
-    plot_Signal = QtCore.pyqtSignal(np.ndarray)
-    status_Signal = QtCore.pyqtSignal(str)
+    # Carries a ring_Buffers.Frame, which whoever receives it owns and has
+    # to Release() (only the one receiver, anything else that wants to keep
+    # it has to Retain() it).
+    plot_Signal = QtCore.pyqtSignal(object)
+    status_Signal = QtCore.pyqtSignal(int, str)
+    # Carries the result of a Submit-ted command back to its callback.
+    result_Signal = QtCore.pyqtSignal(object, object)
 
     def __init__(self, my_Pharp):
         QtCore.QThread.__init__(self)
+        self.logger = logging.getLogger("PHarp.Acq")
 
         # Flags.
         #Practically the thread will probably remain active whilever
@@ -29,25 +38,120 @@ class Acq_Thread(QtCore.QThread):
         self.histogram_Paused = False # temporarily stopped for some reason
         # The actual object
         self.my_Pharp = my_Pharp
+        # Warnings code last sent to the GUI, only send it again if it changes.
+        self.last_Warnings = None
+        # How often (s) to read the count rates, whatever else is going on,
+        # and when they're next due.
+        self.count_Interval = 0.1
+        self.next_Count = 0.0
+        # Histograms are read straight into these and passed on, then come
+        # back when the GUI is done with them, rather than a new array (or
+        # two) for every frame.
+        self.frame_Pool = ring_Buffers.Frame_Pool()
+
+        # Everything else that talks to the device (settings, clears etc.)
+        # gets queued up here and run by this thread in between frames, so
+        # there's only ever one thing using the device at a time.
+        self.commands = queue.Queue()
+        # This object lives in the thread that made it, so the callbacks run
+        # there (i.e. in the GUI)
+        self.result_Signal.connect(self.on_Result)
+
+    def Submit(self, function, *args, callback=None):
+        """
+        Run function(*args) in this thread before the next frame. If
+        callback is given, it's called with whatever function returns, back
+        in the thread that made this object.
+        """
+        self.commands.put((function, args, callback))
+
+    def Run_Commands(self, timeout=0):
+        """
+        Run all the commands submitted so far. If there aren't any, wait up
+        to timeout (s) for one.
+        """
+
+        try:
+            if timeout > 0:
+                command = self.commands.get(timeout=timeout)
+            else:
+                command = self.commands.get_nowait()
+        except queue.Empty:
+            return
+
+        while True:
+            function, args, callback = command
+            try:
+                result = function(*args)
+            except Exception:
+                self.logger.exception(f"Command {function} failed")
+            else:
+                if callback is not None:
+                    self.result_Signal.emit(callback, result)
+            try:
+                command = self.commands.get_nowait()
+            except queue.Empty:
+                return
+
+    def on_Result(self, callback, result):
+        callback(result)
+
+    def Set_Count_Interval(self, count_Interval):
+        """
+        count_Interval in ms. The Picoharp only updates them every 100ms so
+        there's no point going any faster.
+        """
+        self.count_Interval = max(count_Interval, 100) / 1000
+
+    def Poll_Counts(self):
+        """
+        Read the count rates (and warnings) and send them out, if they're
+        due. Called in between everything else, including while waiting for
+        a histogram.
+        """
+
+        now = time.perf_counter()
+        if now < self.next_Count:
+            return
+        # Keep to the schedule, unless it's been missed altogether.
+        self.next_Count = max(self.next_Count + self.count_Interval, now)
+
+        ch0, ch1 = self.my_Pharp.Get_CountRate()
+        self.count_Signal.emit(ch0, ch1)
+        warnings = self.my_Pharp.Get_Warnings()
+        if warnings != self.last_Warnings:
+            self.last_Warnings = warnings
+            self.status_Signal.emit(warnings,
+                                    self.my_Pharp.Decode_Warnings(warnings))
 
     def run(self):
         while self.thread_Active:
+            self.Run_Commands()
             # Always get the counts from the device, whether histogramming or
             # not.
-            ch0, ch1 = self.my_Pharp.Get_CountRate()
-            self.count_Signal.emit(ch0, ch1)
-            warnings = self.my_Pharp.Get_Warnings()
-            self.status_Signal.emit(warnings)
+            self.Poll_Counts()
 
             if self.histogram_Active and not self.histogram_Paused:
                 # If desired, get the histogram data from the device as well.
-                histo = self.my_Pharp.Get_A_Histogram()
-                self.plot_Signal.emit(np.array(histo, dtype=np.int))
+                # Keep reading the counts while it's being measured.
+                frame = self.frame_Pool.Lease()
+                self.my_Pharp.Get_A_Histogram(idle=self.Poll_Counts,
+                                              out=frame.data)
+                # How well the wait for it went (see
+                # LD_Pharp.Wait_For_Measurement)
+                wait_Stats = self.my_Pharp.last_Wait_Stats
+                self.logger.debug(f"Histogram after {wait_Stats['polls']} "
+                                  f"polls, {wait_Stats['overshoot']:.2f}ms "
+                                  f"after it finished")
+                self.plot_Signal.emit(self.frame_Pool.Publish(frame))
             else:
-                # Otherwise wait (roughly) as long as it would have taken for
-                # the histogram to have been collected. (otherwise the count
-                # rate gets polled too frequently)
-                time.sleep(self.my_Pharp.hw_Settings.acq_Time / 1000)
+                # Otherwise wait until the counts are next due. Any commands
+                # that come in in the meantime get run straight away.
+                end = self.next_Count
+                remaining = end - time.perf_counter()
+                while remaining > 0:
+                    self.Run_Commands(remaining)
+                    remaining = end - time.perf_counter()
 
     def stop(self):
         self.thread_Active = False
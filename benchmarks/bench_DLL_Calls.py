@@ -0,0 +1,109 @@
+"""
+Microbenchmark of the per-call overhead of LD_PharpDLL.
+
+Compares the old way of calling phlib (look the function up on the CDLL
+every call, wrap every argument in a fresh ctypes object, no argtypes) with
+the prebound function table LD_PharpDLL now builds at construction. Reports
+calls per second for the calls that get made in tight loops.
+
+Needs a Picoharp (or something that looks like phlib) to talk to, e.g.
+    python benchmarks/bench_DLL_Calls.py --dll /usr/local/lib64/ph300/phlib.so
+or without hardware, the simulated library (build it with make_sim.sh)
+    python benchmarks/bench_DLL_Calls.py --dll sim/phlib_sim.so
+"""
+
+# pylint: disable=C0103
+
+import argparse
+import ctypes
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import LD_PharpDLL
+
+
+def Legacy_CTCStatus(phlib, device_Number):
+    ctc_Status_ct = ctypes.c_int(0)
+    phlib.PH_CTCStatus(ctypes.c_int(device_Number),
+                       ctypes.byref(ctc_Status_ct))
+    return ctc_Status_ct.value
+
+
+def Legacy_CountRate(phlib, device_Number):
+    countRate0_ct = ctypes.c_int()
+    countRate1_ct = ctypes.c_int()
+    phlib.PH_GetCountRate(ctypes.c_int(device_Number),
+                          ctypes.c_int(0),
+                          ctypes.byref(countRate0_ct))
+    phlib.PH_GetCountRate(ctypes.c_int(device_Number),
+                          ctypes.c_int(1),
+                          ctypes.byref(countRate1_ct))
+    return countRate0_ct.value, countRate1_ct.value
+
+
+def Legacy_Warnings(phlib, device_Number):
+    warnings_Code = ctypes.c_int()
+    phlib.PH_GetWarnings(ctypes.c_int(device_Number),
+                         ctypes.byref(warnings_Code))
+    return warnings_Code
+
+
+def Calls_Per_Second(function, n_Calls):
+    """
+    Call function() n_Calls times, return the rate.
+    """
+    start = time.perf_counter()
+    for _ in range(n_Calls):
+        function()
+    return n_Calls / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--dll", default=None,
+                        help="phlib to load (default: the installed one)")
+    parser.add_argument("--device", type=int, default=0)
+    parser.add_argument("--calls", type=int, default=100000)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    logging.getLogger("PHarp").setLevel(logging.WARNING)
+
+    my_DLL = LD_PharpDLL.LD_PharpDLL(args.device, args.dll)
+    if my_DLL.Open() != 0:
+        sys.exit(f"Couldn't open device {args.device}")
+    my_DLL.Initialize(0)
+
+    # A separate CDLL instance has its own function pointers, so none of the
+    # argtypes declared by LD_PharpDLL apply to it.
+    legacy_phlib = ctypes.CDLL(my_DLL.phlib._name)
+    device = args.device
+
+    comparisons = (
+        ("PH_CTCStatus",
+         lambda: Legacy_CTCStatus(legacy_phlib, device),
+         my_DLL.Get_CTCStatus),
+        ("PH_GetCountRate x2",
+         lambda: Legacy_CountRate(legacy_phlib, device),
+         my_DLL.Get_CountRate),
+        ("PH_GetWarnings",
+         lambda: Legacy_Warnings(legacy_phlib, device),
+         my_DLL.Get_Warnings),
+        )
+
+    print(f"{'call':<20}{'before /s':>14}{'after /s':>14}{'speedup':>10}")
+    for name, legacy, prebound in comparisons:
+        before = Calls_Per_Second(legacy, args.calls)
+        after = Calls_Per_Second(prebound, args.calls)
+        print(f"{name:<20}{before:>14,.0f}{after:>14,.0f}"
+              f"{after / before:>9.2f}x")
+
+    my_DLL.Close()
+
+
+if __name__ == "__main__":
+    main()
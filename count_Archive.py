@@ -0,0 +1,213 @@
+"""
+Long term archive of the count rates, on disk, round robin database style.
+
+Every count rate received is kept at full resolution for as long as there
+is room, and also summarised (min/mean/max) into coarser and coarser
+levels which cover longer and longer times in the same space, so days of
+counts can be looked at without reading every sample. Each level is a fixed
+size memory mapped file which is written round and round, overwriting the
+oldest rows, so the archive never grows and is still there after a restart.
+"""
+
+# pylint: disable=C0103
+
+import json
+import os
+
+import numpy as np
+
+
+class Count_Archive():
+    """
+    Level 0 is every sample (time and the counts on each channel), each
+    level after that has one row (start time, then min, mean and max of
+    each channel) per factor rows of the level before.
+    """
+
+    def __init__(self, directory, n_Channels=2, capacity=2**20, factor=10,
+                 n_Levels=5):
+        """
+        directory is made if it doesn't exist, otherwise the archive in it
+        is carried on with (and has to have been made with the same
+        arguments).
+        capacity is the number of rows in each level, rounded up to a whole
+        number of factors.
+        """
+
+        self.n_Channels = n_Channels
+        self.factor = factor
+        self.capacity = -(-capacity // factor) * factor
+        self.n_Levels = n_Levels
+
+        self.raw_Dtype = np.dtype([("time", np.float64),
+                                   ("counts", np.int64, (n_Channels,))])
+        self.level_Dtype = np.dtype([("time", np.float64),
+                                     ("min", np.int64, (n_Channels,)),
+                                     ("mean", np.float64, (n_Channels,)),
+                                     ("max", np.int64, (n_Channels,))])
+
+        layout = {"n_Channels": n_Channels, "capacity": self.capacity,
+                  "factor": factor, "n_Levels": n_Levels}
+        os.makedirs(directory, exist_ok=True)
+        layout_Path = os.path.join(directory, "layout.json")
+        if os.path.exists(layout_Path):
+            with open(layout_Path) as layout_File:
+                existing = json.load(layout_File)
+            if existing != layout:
+                raise ValueError(f"Archive in {directory} is {existing}, "
+                                 f"not {layout}")
+            mode = "r+"
+        else:
+            mode = "w+"
+
+        # Number of rows ever written to each level (the rows are at these
+        # modulo capacity)
+        self.n_Totals = np.memmap(os.path.join(directory, "state.dat"),
+                                  dtype=np.int64, mode=mode,
+                                  shape=(n_Levels,))
+        self.levels = []
+        for level in range(n_Levels):
+            dtype = self.raw_Dtype if level == 0 else self.level_Dtype
+            self.levels.append(
+                np.memmap(os.path.join(directory, f"level{level}.dat"),
+                          dtype=dtype, mode=mode, shape=(self.capacity,)))
+
+        # Time of the latest sample, which every new one has to be at or
+        # after (the reads search the times in order).
+        if self.n_Totals[0]:
+            self.last_Time = float(
+                self.levels[0][(self.n_Totals[0] - 1) % self.capacity]["time"])
+        else:
+            self.last_Time = -np.inf
+
+        # Only once the files are all there.
+        if mode == "w+":
+            with open(layout_Path, "w") as layout_File:
+                json.dump(layout, layout_File)
+
+    def Append(self, time, *counts):
+        """
+        Add one sample, time (s, e.g. time.time()) and a count rate for
+        each channel. The clock going backwards (e.g. being set, or across
+        a restart) would muddle up the order, so a time before the last
+        one is taken as the same as the last one.
+        """
+
+        time = max(time, self.last_Time)
+        self.last_Time = time
+        self._Write(0, (time, counts))
+
+        # Whenever a level has another factor rows, summarise them into the
+        # next one.
+        level = 0
+        while (level < self.n_Levels - 1
+               and self.n_Totals[level] % self.factor == 0):
+            end = (self.n_Totals[level] - 1) % self.capacity + 1
+            rows = self.levels[level][end - self.factor:end]
+            if level == 0:
+                minimum = rows["counts"].min(axis=0)
+                mean = rows["counts"].mean(axis=0)
+                maximum = rows["counts"].max(axis=0)
+            else:
+                minimum = rows["min"].min(axis=0)
+                mean = rows["mean"].mean(axis=0)
+                maximum = rows["max"].max(axis=0)
+            level += 1
+            self._Write(level, (rows["time"][0], minimum, mean, maximum))
+
+    def _Write(self, level, row):
+        self.levels[level][self.n_Totals[level] % self.capacity] = row
+        self.n_Totals[level] += 1
+
+    def _Segments(self, level):
+        """
+        The rows of a level in time order, as (up to) two views.
+        """
+        rows = self.levels[level]
+        n_Total = int(self.n_Totals[level])
+        if n_Total <= self.capacity:
+            return (rows[:n_Total],)
+        head = n_Total % self.capacity
+        return (rows[head:], rows[:head])
+
+    def Oldest(self):
+        """
+        Time of the oldest sample still in the archive (None if empty)
+        """
+        times = [segments[0]["time"][0]
+                 for segments in map(self._Segments, range(self.n_Levels))
+                 if len(segments[0])]
+        return min(times) if times else None
+
+    def Read(self, t_Start, t_Stop, max_Points=1000):
+        """
+        The samples between t_Start and t_Stop, from the most detailed level
+        that has them all in no more than max_Points rows (if even the
+        coarsest level has more, every n'th row of that).
+        Returns time, min, mean, max, the last three with a column per
+        channel. (For level 0 they're all the counts themselves)
+        """
+
+        oldest = self.Oldest()
+        if oldest is None:
+            return self._Unpack(0, self.levels[0][:0])
+        t_Start = max(t_Start, oldest)
+
+        for level in range(self.n_Levels):
+            segments = self._Segments(level)
+            if not len(segments[0]):
+                continue
+            # A level which has already overwritten the start isn't any use.
+            covers = segments[0]["time"][0] <= t_Start
+            last_Level = level == self.n_Levels - 1
+            if not (covers or last_Level):
+                continue
+            # Just the rows inside the window from each segment.
+            pieces = []
+            for segment in segments:
+                start, stop = np.searchsorted(segment["time"],
+                                              (t_Start, t_Stop))
+                pieces.append(segment[start:stop])
+            n_Rows = sum(len(piece) for piece in pieces)
+            if n_Rows <= max_Points or last_Level:
+                rows = np.concatenate(pieces)
+                step = -(-len(rows) // max_Points) if len(rows) else 1
+                return self._Unpack(level, rows[::step])
+
+        # Nothing covers the window (e.g. the coarsest level is empty).
+        return self._Unpack(0, self.levels[0][:0])
+
+    @staticmethod
+    def _Unpack(level, rows):
+        if level == 0:
+            counts = rows["counts"]
+            return rows["time"], counts, counts.astype(np.float64), counts
+        return rows["time"], rows["min"], rows["mean"], rows["max"]
+
+    def Flush(self):
+        """
+        Make sure everything is written to disk.
+        """
+        for level in self.levels:
+            level.flush()
+        self.n_Totals.flush()
+
+
+if __name__ == "__main__":
+    import tempfile
+    import time
+
+    with tempfile.TemporaryDirectory() as archive_Dir:
+        archive = Count_Archive(archive_Dir, capacity=1000)
+        # 3 days of counts every 100ms would take a while, do 1e5 samples
+        # one second apart instead.
+        start = time.perf_counter()
+        for t in range(100000):
+            archive.Append(float(t), t % 100, 2 * t)
+        print(f"{(time.perf_counter() - start) * 1e6 / 100000:.1f}us "
+              f"per sample")
+        times, minimum, mean, maximum = archive.Read(0, 1e5, 500)
+        print(f"Everything: {len(times)} rows from {times[0]}s, "
+              f"every {times[1] - times[0]}s")
+        times, minimum, mean, maximum = archive.Read(99900, 1e5, 500)
+        print(f"Last 100s: {len(times)} rows")
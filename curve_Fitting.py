@@ -0,0 +1,290 @@
+"""
+Fits a model (gaussian, exponential decay...) to the histogram in one of
+the integral cursors' ROIs, live, on a thread of its own.
+
+Each fit starts from the last one's answer (the histogram doesn't change
+much from one frame to the next, so that's usually only a few iterations
+away) and if frames come in faster than they can be fitted, only the
+latest waiting one gets fitted. The GUI never waits for any of it, it
+hands over a copy of the ROI and gets the results back in a signal.
+"""
+
+# pylint: disable=C0103
+
+import logging
+import threading
+import time
+
+from PyQt5 import QtCore
+import numpy as np
+import scipy.optimize
+
+
+class Fit_Model():
+    """
+    A function to fit, y = function(x, *parameters) with x the bin number
+    from the start of the ROI, and how to guess its parameters from
+    scratch.
+
+    kinds says what each parameter is so it can be reported in the units
+    of the plot: "position" (a bin number, reported as a time on the x
+    axis), "time" (a number of bins, reported as a duration) or "value"
+    (counts, reported as they are).
+
+    Models that need more than curve_fit (see lifetime_Fitting) override
+    Guess, Evaluate and Fit.
+    """
+
+    def __init__(self, name, function, parameter_Names, kinds, guess):
+        self.name = name
+        self.function = function
+        self.parameter_Names = parameter_Names
+        self.kinds = kinds
+        self.guess = guess
+
+    def Guess(self, data, start_Bin):
+        return self.guess(data)
+
+    def Evaluate(self, n_Bins, start_Bin, parameters):
+        """
+        The model over the n_Bins bins of an ROI starting at start_Bin.
+        """
+        return self.function(np.arange(n_Bins, dtype=np.float64), *parameters)
+
+    def Fit(self, data, start_Bin, p0, max_Evaluations):
+        """
+        Returns the fitted parameters and their covariance. Raises
+        RuntimeError or ValueError if it can't.
+        """
+        x = np.arange(len(data), dtype=np.float64)
+        # Counting statistics, with empty bins not weighted infinitely.
+        sigma = np.sqrt(np.maximum(data, 1))
+        return scipy.optimize.curve_fit(self.function, x, data, p0=p0,
+                                        sigma=sigma, maxfev=max_Evaluations)
+
+    def To_Units(self, parameters, start_Bin, resolution):
+        """
+        parameters (or their errors, with start_Bin 0) in plot units.
+        """
+        values = np.array(parameters, dtype=np.float64)
+        for i, kind in enumerate(self.kinds):
+            if kind == "position":
+                values[i] = (start_Bin + values[i]) * resolution
+            elif kind == "time":
+                values[i] *= resolution
+        return values
+
+
+def Gaussian(x, amplitude, centre, sigma, offset):
+    return amplitude * np.exp(-0.5 * ((x - centre) / sigma)**2) + offset
+
+
+def Exponential(x, amplitude, tau, offset):
+    return amplitude * np.exp(-x / tau) + offset
+
+
+def Bi_Exponential(x, amplitude_1, tau_1, amplitude_2, tau_2, offset):
+    return (amplitude_1 * np.exp(-x / tau_1)
+            + amplitude_2 * np.exp(-x / tau_2)
+            + offset)
+
+
+def Guess_Gaussian(y):
+    offset = y.min()
+    amplitude = y.max() - offset
+    # Bins above half the max, roughly the FWHM (2.355 sigma)
+    fwhm = np.count_nonzero(y - offset > amplitude / 2)
+    return amplitude, float(y.argmax()), max(fwhm / 2.355, 1.0), offset
+
+
+def Guess_Exponential(y):
+    offset = y.min()
+    amplitude = y[0] - offset
+    # Where it's fallen to 1/e
+    below = np.flatnonzero(y - offset < amplitude / np.e)
+    tau = float(below[0]) if len(below) else len(y) / 3
+    return amplitude, max(tau, 1.0), offset
+
+
+def Guess_Bi_Exponential(y):
+    amplitude, tau, offset = Guess_Exponential(y)
+    return 0.7 * amplitude, tau / 3, 0.3 * amplitude, tau * 2, offset
+
+
+models = {
+    model.name: model for model in (
+        Fit_Model("Gaussian", Gaussian,
+                  ("Amplitude", "Centre", "Sigma", "Offset"),
+                  ("value", "position", "time", "value"),
+                  Guess_Gaussian),
+        Fit_Model("Exponential", Exponential,
+                  ("Amplitude", "Tau", "Offset"),
+                  ("value", "time", "value"),
+                  Guess_Exponential),
+        Fit_Model("Bi-exponential", Bi_Exponential,
+                  ("Amplitude 1", "Tau 1", "Amplitude 2", "Tau 2", "Offset"),
+                  ("value", "time", "value", "time", "value"),
+                  Guess_Bi_Exponential),
+        )
+    }
+
+
+class Fit_Worker(QtCore.QObject):
+    """
+    Fits whatever was last Submit()-ted, on a daemon thread. Anything
+    submitted while a fit is running replaces whatever was waiting (which
+    is counted as skipped).
+    """
+
+    # A dict per fit, see Fit.
+    result_Signal = QtCore.pyqtSignal(object)
+
+    def __init__(self, max_Evaluations=2000, n_Bins=65536):
+        QtCore.QObject.__init__(self)
+        self.logger = logging.getLogger("PHarp.Fit")
+
+        self.max_Evaluations = max_Evaluations
+        self.pending = None
+        # Submit copies the data into the waiting buffer, the thread swaps
+        # it with the one it's fitting when it takes the job, so neither
+        # is ever written to while it's being fitted (and there's nothing
+        # new to allocate each frame).
+        self._waiting_Data = np.zeros(n_Bins)
+        self._fitting_Data = np.zeros(n_Bins)
+        self.n_Submitted = 0
+        self.n_Skipped = 0
+        # Last successful fit's parameters, and what they were a fit of
+        # (they're only a good start for the same model on the same bins)
+        self.last_Key = None
+        self.last_Parameters = None
+
+        self.thread_Active = True
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self.run, daemon=True)
+        self._thread.start()
+
+    def Submit(self, model_Name, data, start_Bin, resolution, tag=None):
+        """
+        Fit model_Name to data (the counts in the ROI, copied so the caller
+        can carry on changing them) starting at bin start_Bin, with bins
+        resolution (s) wide. tag comes back with the result as it is, so
+        results that are out of date by the time they arrive (e.g. the ROI
+        has gone) can be told apart. Never waits.
+        """
+
+        with self._condition:
+            self.n_Submitted += 1
+            if self.pending is not None:
+                self.n_Skipped += 1
+            waiting = self._waiting_Data[:len(data)]
+            np.copyto(waiting, data)
+            self.pending = (self.n_Submitted, model_Name, waiting, start_Bin,
+                            resolution, time.perf_counter(), tag)
+            self._condition.notify()
+
+    def run(self):
+        while True:
+            with self._condition:
+                while self.thread_Active and self.pending is None:
+                    self._condition.wait()
+                if not self.thread_Active:
+                    return
+                job = self.pending
+                self.pending = None
+                self._waiting_Data, self._fitting_Data = (self._fitting_Data,
+                                                          self._waiting_Data)
+            try:
+                result = self.Fit(*job)
+            except Exception:
+                # Anything else a model throws, the thread has to live
+                # through or that's the end of fitting until a restart.
+                self.logger.exception(f"Fit of frame {job[0]} failed")
+                continue
+            self.result_Signal.emit(result)
+
+    def Fit(self, frame_Number, model_Name, data, start_Bin, resolution,
+            submit_Time, tag=None):
+        """
+        Returns a dict of: frame (its number, counting Submit calls), tag
+        (as submitted), model, start (bin), success, message, warm (whether
+        it started from the last fit), parameters (as fitted, bins from the
+        start of the ROI), values and errors (in plot units, keyed by
+        parameter name), curve (the fitted model over the ROI's bins),
+        fit_Time (s), latency (s, from Submit to finished) and skipped
+        (total so far).
+        """
+
+        model = models[model_Name]
+        data = np.asarray(data, dtype=np.float64)
+        # The model itself rather than its name, in case it's been replaced
+        # (e.g. a new IRF loaded)
+        key = (model, start_Bin, len(data), resolution)
+        result = {"frame": frame_Number, "tag": tag, "model": model_Name,
+                  "start": start_Bin, "success": False, "message": "",
+                  "warm": False, "parameters": None, "values": None,
+                  "errors": None, "curve": None}
+
+        start_Time = time.perf_counter()
+        if len(data) <= len(model.parameter_Names):
+            result["message"] = "ROI too narrow to fit"
+        else:
+            starts = []
+            if key == self.last_Key:
+                starts.append((True, self.last_Parameters))
+            starts.append((False, model.Guess(data, start_Bin)))
+            for warm, p0 in starts:
+                try:
+                    parameters, covariance = model.Fit(
+                        data, start_Bin, p0, self.max_Evaluations)
+                except Exception as e:
+                    # Not just curve_fit giving up (RuntimeError) or bad
+                    # numbers (ValueError), models can throw anything.
+                    if not isinstance(e, (RuntimeError, ValueError)):
+                        self.logger.warning(f"{model_Name} fit raised "
+                                            f"{type(e).__name__}: {e}")
+                    result["message"] = str(e)
+                    continue
+                errors = np.sqrt(np.abs(np.diag(covariance)))
+                result.update(
+                    success=True, message="", warm=warm,
+                    parameters=parameters,
+                    values=dict(zip(model.parameter_Names,
+                                    model.To_Units(parameters, start_Bin,
+                                                   resolution))),
+                    errors=dict(zip(model.parameter_Names,
+                                    model.To_Units(errors, 0, resolution))),
+                    curve=model.Evaluate(len(data), start_Bin, parameters))
+                break
+
+        if result["success"]:
+            self.last_Key = key
+            self.last_Parameters = result["parameters"]
+        else:
+            self.last_Key = None
+            self.logger.debug(f"Fit failed: {result['message']}")
+
+        end_Time = time.perf_counter()
+        result["fit_Time"] = end_Time - start_Time
+        result["latency"] = end_Time - submit_Time
+        result["skipped"] = self.n_Skipped
+        return result
+
+    def Stop(self):
+        with self._condition:
+            self.thread_Active = False
+            self._condition.notify()
+
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    x = np.arange(2000.0)
+    # Fit directly, rather than through the thread (which needs a Qt event
+    # loop to get the results back)
+    worker = Fit_Worker()
+    for frame in range(3):
+        decay = rng.poisson(Bi_Exponential(x, 800, 50, 200, 400, 5))
+        result = worker.Fit(frame, "Bi-exponential", decay, 1000, 4e-12,
+                            time.perf_counter())
+        print(f"warm={result['warm']} {result['fit_Time'] * 1e3:.1f}ms "
+              f"taus {result['values']['Tau 1']:.3e}, "
+              f"{result['values']['Tau 2']:.3e}")
@@ -0,0 +1,185 @@
+"""
+Runs every Picoharp plugged into the machine at once from one process.
+
+Each device gets its own LD_Pharp and its own Acq_Thread (so a slow device
+doesn't hold up the others) and the data from all of them comes back out of
+one set of signals, tagged with the device number it came from.
+"""
+
+# pylint: disable=C0103
+
+import concurrent.futures
+import functools
+import logging
+
+from PyQt5 import QtCore
+
+import acq_Thread
+import LD_Pharp
+import LD_PharpDLL
+
+
+def Probe_Device(device_Number, dll_Path=None):
+    """
+    Returns True if there is a Picoharp at device_Number (which is then
+    closed again so it can be opened properly).
+    """
+    my_PharpDLL = LD_PharpDLL.LD_PharpDLL(device_Number, dll_Path)
+    if my_PharpDLL.Open() != 0:
+        return False
+    my_PharpDLL.Close()
+    return True
+
+
+def Probe_Devices(dll_Path=None, n_Devices=LD_Pharp.phdefine_h["MAXDEVNUM"]):
+    """
+    Try every device number at the same time (each one that isn't there
+    takes a while to say so). Returns the numbers of the ones that answered.
+    """
+    with concurrent.futures.ThreadPoolExecutor(n_Devices) as executor:
+        found = executor.map(functools.partial(Probe_Device,
+                                               dll_Path=dll_Path),
+                             range(n_Devices))
+        return [n for n, present in zip(range(n_Devices), found) if present]
+
+
+class Device_Manager(QtCore.QObject):
+    """
+    Holds the open devices and their acquisition threads, keyed by device
+    number, and starts/pauses/reconfigures them all together.
+    """
+
+    # Same as the Acq_Thread signals, with the device number first.
+    count_Signal = QtCore.pyqtSignal(int, int, int)
+    plot_Signal = QtCore.pyqtSignal(int, object)
+    status_Signal = QtCore.pyqtSignal(int, int, str)
+
+    def __init__(self, dll_Path=None):
+        QtCore.QObject.__init__(self)
+        self.logger = logging.getLogger("PHarp.Devices")
+
+        self.dll_Path = dll_Path
+        self.devices = {}
+        self.threads = {}
+
+    def Open_All(self, hw_Settings, device_Numbers=None):
+        """
+        Open every Picoharp there is (or the ones in device_Numbers) with
+        hw_Settings, in parallel since each one takes a while to initialize
+        and calibrate. Returns the device numbers opened. If any of them
+        can't be opened, the others are closed again and the error raised.
+        """
+
+        if device_Numbers is None:
+            device_Numbers = Probe_Devices(self.dll_Path)
+        if not device_Numbers:
+            raise ConnectionError("No Picoharps found")
+        self.logger.info(f"Opening devices {device_Numbers}")
+
+        n_Devices = len(device_Numbers)
+        with concurrent.futures.ThreadPoolExecutor(n_Devices) as executor:
+            futures = [executor.submit(LD_Pharp.LD_Pharp, n, hw_Settings,
+                                       self.dll_Path)
+                       for n in device_Numbers]
+        # All or nothing, so nothing is left open (or acquiring) next to
+        # whatever the caller falls back to if one of them failed.
+        errors = [future.exception() for future in futures
+                  if future.exception() is not None]
+        if errors:
+            for future in futures:
+                if future.exception() is None:
+                    future.result().Close()
+            raise errors[0]
+
+        for device_Number, future in zip(device_Numbers, futures):
+            self.Add_Device(device_Number, future.result())
+
+        return list(device_Numbers)
+
+    def Add_Device(self, device_Number, my_Pharp):
+        """
+        Start an acquisition thread for an already open device (or an
+        LD_Pharp_Dummy) and pass its data on. Returns the thread.
+        """
+
+        thread = acq_Thread.Acq_Thread(my_Pharp)
+        # Direct connections so the tagging happens in the acquisition thread
+        # and each piece of data only gets queued up once, for the receiver.
+        direct = QtCore.Qt.DirectConnection
+        thread.count_Signal.connect(
+            functools.partial(self.count_Signal.emit, device_Number), direct)
+        thread.plot_Signal.connect(
+            functools.partial(self.plot_Signal.emit, device_Number), direct)
+        thread.status_Signal.connect(
+            functools.partial(self.status_Signal.emit, device_Number), direct)
+
+        self.devices[device_Number] = my_Pharp
+        self.threads[device_Number] = thread
+        thread.start()
+        return thread
+
+    def Set_Histogram_Active(self, active):
+        """
+        Start (or stop) histogramming on every device at once.
+        """
+        for thread in self.threads.values():
+            thread.histogram_Active = active
+
+    def Set_Count_Interval(self, count_Interval):
+        """
+        How often (ms) every device reads its count rates.
+        """
+        for thread in self.threads.values():
+            thread.Set_Count_Interval(count_Interval)
+
+    def Set_Paused(self, paused):
+        for thread in self.threads.values():
+            thread.histogram_Paused = paused
+
+    def Submit(self, device_Number, function, *args, callback=None):
+        """
+        Run function(*args) in the device's acquisition thread between
+        frames, see Acq_Thread.Submit.
+        """
+        self.threads[device_Number].Submit(function, *args, callback=callback)
+
+    def Submit_All(self, method_Name, *args, callback=None):
+        """
+        Call the LD_Pharp method method_Name(*args) on every device, each in
+        its own acquisition thread. callback (if given) is called with the
+        device number and the result as each one finishes.
+        """
+        for device_Number, thread in self.threads.items():
+            if callback is not None:
+                device_Callback = functools.partial(callback, device_Number)
+            else:
+                device_Callback = None
+            thread.Submit(getattr(thread.my_Pharp, method_Name), *args,
+                          callback=device_Callback)
+
+    def Set_Accumulate(self, accumulate):
+        self.Submit_All("Set_Accumulate", accumulate)
+
+    def Clear_Histograms(self):
+        # Straight away rather than between frames, Clear_Histogram only
+        # sets a flag (so a device waiting out an overflow sees it).
+        for thread in self.threads.values():
+            thread.my_Pharp.Clear_Histogram()
+
+    def Update_Settings(self, hw_Settings, callback=None):
+        """
+        Send hw_Settings to every device. They're copied so changing them
+        afterwards doesn't change them under a running measurement.
+        """
+        self.Submit_All("Update_Settings", hw_Settings.Copy(),
+                        callback=callback)
+
+    def Stop(self):
+        """
+        Stop all the threads (each waits for its measurement to finish),
+        then close the devices.
+        """
+        for thread in self.threads.values():
+            thread.stop()
+        for my_Pharp in self.devices.values():
+            my_Pharp.Close()
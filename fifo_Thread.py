@@ -0,0 +1,105 @@
+"""
+Thread to drain the Picoharp FIFO in the TTTR (T2/T3) modes.
+"""
+
+# pylint: disable=C0103
+# pylint: disable=R0902
+
+import logging
+import threading
+import time
+
+import LD_Pharp
+import ring_Buffers
+
+
+class FIFO_Thread(threading.Thread):
+    """
+    Reads TTTR records off the device as fast as they arrive and puts them
+    in a Record_Ring for something else to decode/histogram at its own
+    pace.
+
+    The FIFO on the device is only so big, at high count rates it fills in
+    a few tens of ms, so this loop does nothing but read it. Anything
+    slower belongs on the other side of the ring buffer.
+    """
+
+    def __init__(self, my_Pharp, ring=None, acq_Time=None):
+        """
+        my_Pharp should already be in MODE_T2 or MODE_T3 (LD_Pharp.Set_Mode)
+        If acq_Time (ms) isn't given the measurement runs until stop() is
+        called (well, for 100 hours)
+        """
+        super().__init__(daemon=True)
+
+        self.logger = logging.getLogger("PHarp.FIFO")
+
+        self.my_Pharp = my_Pharp
+        self.block_Size = LD_Pharp.phdefine_h["TTREADMAX"]
+        if ring is None:
+            ring = ring_Buffers.Record_Ring(block_Size=self.block_Size)
+        self.ring = ring
+        if acq_Time is None:
+            acq_Time = LD_Pharp.phdefine_h["ACQTMAX"]
+        self.acq_Time = acq_Time
+
+        self.thread_Active = True
+        # Set if the device FIFO overflowed, i.e. records were lost before
+        # they could be read.
+        self.fifo_Full = False
+        self.n_Records = 0
+        self.n_Reads = 0
+        self.run_Time = 0
+        # When the FIFO comes back empty, sleep (ms) before reading it again,
+        # idle_Min at first, doubling each empty read up to idle_Max. Even
+        # at the Picoharp's top count rate idle_Max is nowhere near enough
+        # to fill the FIFO.
+        self.idle_Min = 0.1
+        self.idle_Max = 5.0
+
+    def run(self):
+        fifo_Full_Flag = LD_Pharp.phdefine_h["FLAG_FIFOFULL"]
+        ring = self.ring
+        my_Pharp = self.my_Pharp
+
+        start_Time = time.perf_counter()
+        my_Pharp.Start_Measurement(self.acq_Time)
+        measurement_Done = False
+        idle_Sleep = self.idle_Min
+
+        while self.thread_Active:
+            block = ring.Reserve()
+            n_Read = my_Pharp.Read_FIFO(block)
+            ring.Commit(block, n_Read)
+            self.n_Records += n_Read
+            self.n_Reads += 1
+
+            if my_Pharp.Get_Flags() & fifo_Full_Flag:
+                self.logger.error("FIFO overrun, stopping measurement")
+                self.fifo_Full = True
+                break
+
+            # Once the measurement has finished, keep going until there's
+            # nothing left in the FIFO. Until then, an empty FIFO means the
+            # count rate is low, no need to spin on it.
+            if n_Read == 0:
+                if measurement_Done:
+                    break
+                measurement_Done = my_Pharp.Measurement_Done()
+                if not measurement_Done:
+                    time.sleep(idle_Sleep / 1000)
+                    idle_Sleep = min(2 * idle_Sleep, self.idle_Max)
+            else:
+                idle_Sleep = self.idle_Min
+
+        my_Pharp.Stop_Measurement()
+        self.run_Time = time.perf_counter() - start_Time
+        self.logger.info(
+            f"Read {self.n_Records} records in {self.n_Reads} reads over "
+            f"{self.run_Time:.1f}s, ring max fill {ring.max_Fill}, "
+            f"lost {ring.lost_Count}"
+            )
+
+    def stop(self):
+        self.thread_Active = False
+        self.join()
@@ -1,6 +1,5 @@
 from PyQt5 import QtGui
 
-import numpy as np
 import pyqtgraph
 
 class Generic_Cursor():
@@ -71,17 +70,28 @@ class Generic_Cursor():
     # def is_Enabled(self, value):
     #     self._is_enabled = value
         
+    @property
+    def on_Plot(self):
+        """
+        Whether the cursor is on the plot right now.
+        """
+        return self._lines[0].scene() is not None
+
     def Add_To_Plot(self):
         """
-        Add the cursor to the plot
+        Add the cursor to the plot (if it isn't already)
         """
+        if self.on_Plot:
+            return
         self._plot_Widget.addItem(self._lines[0])
         self._plot_Widget.addItem(self._lines[1])
         
     def Remove_From_Plot(self):
         """
-        Remove the cursor from the plot
+        Remove the cursor from the plot (if it's there)
         """
+        if not self.on_Plot:
+            return
         self._plot_Widget.removeItem(self._lines[0])
         self._plot_Widget.removeItem(self._lines[1])
         
@@ -124,12 +134,12 @@ class Integral_Cursor(Generic_Cursor):
     Bars can be plotted between the cursor lines reflecting statistics of the
     data between the lines.
     """
-    def __init__(self, plot_Widget, colour, resolution):
+    def __init__(self, plot_Widget, colour):
         """
         The plot widget this cursor should be applied to, and the colour (as
         a QColor object)
-        In order to be able to interpret the data, needs to know the x scale,
-        passed in here as "resolution". 
+        Which bins of the data are between the lines is up to whoever has the
+        data (see roi_Table), this only draws.
         """
         super().__init__(plot_Widget, colour)
         
@@ -143,15 +153,30 @@ class Integral_Cursor(Generic_Cursor):
         self._lines = (self._left_Line,
                        self._right_Line)
         
-        self._data_Bins = (0, 0)
-        
         self._width = 0
         self._left_Position = 0
         self._right_Position = 0
-        self._resolution = resolution
         
-        self.mean_Bar = None
-        self.max_Bar = None
+        # Bars of the mean and max between the lines. Made once, then
+        # resized as the data changes and hidden when there's nothing to
+        # show, they only go on and off the plot with the lines.
+        self.mean_Bar = pyqtgraph.BarGraphItem(
+            x0 = [0],
+            x1 = [0],
+            height = [0],
+            pen = self._colour,
+            brush = self._colour
+            )
+        self.max_Bar = pyqtgraph.BarGraphItem(
+            x0 = [0],
+            x1 = [0],
+            height = [0],
+            pen = self._colour,
+            brush = self._colour_Alpha
+            )
+        self._bars = (self.mean_Bar, self.max_Bar)
+        self._bar_Heights = (0, 0)
+        self.Hide_Bars()
     
     @property
     def width(self):
@@ -180,130 +205,67 @@ class Integral_Cursor(Generic_Cursor):
         self._coords = (x, y)
         self._Update_Lines()
     
-    @property
-    def resolution(self):
-        """
-        Resolution of x values, given that the data is passed in as y values,
-        need to be able to map element number in the data to an x value.
-        """
-        return self._resolution
-    
-    @resolution.setter
-    def resolution(self, value):
-        self._resolution = value
-        # Resolution change means the left and right lines need to be updated
-        # since the scaling from time->bins has changed. The bars will take
-        # care of themselves on the next data update
-        self._Update_Lines()
-
     def _Update_Lines(self):
         """
-        Updates the two vertical lines. This gets called if the coordinates,
-        width or resolution change.
+        Updates the two vertical lines. This gets called if the coordinates
+        or width change.
         """
         self._left_Position = self._coords[0] - (self._width / 2)
         self._right_Position = self._coords[0] + (self._width / 2)
         
-        # Which elements in the data array correspond to the coordinates of
-        # the lines?
-        self._data_Bins = (
-            int(self._left_Position / self._resolution),
-            int(self._right_Position / self._resolution)
-            )
-        
-        # Move the lines
+        # Move the lines, and the bars between them
         self._lines[0].setPos(self._left_Position)
         self._lines[1].setPos(self._right_Position)
+        for bar in self._bars:
+            bar.setOpts(x0=[self._left_Position], x1=[self._right_Position])
         
-    def Reset_Remove(self):
-        """
-        If desired, shunt all the lines to 0 (best default position I can
-        think of). Then remove everything, note that setting the lines to zero
-        automatically removes the bars because they are defined by those 
-        values.
-        """
-        
-        self._coords = (0, 0)
-        self._left_Position = 0
-        self._right_Position = 0
-        for line in self._lines:
-            line.setPos(0)
-        self.Remove_From_Plot()
-        
-    def Update_Stats(self, data, display_Bars, log_Y=False):
+    def Add_To_Plot(self):
         """
-        Calculate mean, max, fwhm of the data between the two markers.
-        Optionally plot bars between the markers of the mean and max values.
-        data should be an np.ndarray, display_Bars a boolean.
-        Returns a tuple (mean, max, fwhm) so the caller can actually do
-        something with them (like display on a GUI?)
+        Add the lines, and the bars with them (if they aren't already)
         """
-        
-        # Get the data between the bars
-        integral_Data = data[self._data_Bins[0]: self._data_Bins[1]]
+        if self.on_Plot:
+            return
+        super().Add_To_Plot()
+        for bar in self._bars:
+            self._plot_Widget.addItem(bar)
 
-        # If there isn't any data (usually this is if the cursor hasn't been
-        # placed yet, or the width is accidentally 0), set everything to zero
-        if len(integral_Data) == 0:
-            mean_Value = 0
-            max_Value = 0
-            max_Pos = 0
-            fwhm_Value = 0
-        else:    
-            # Calculate the values
-            mean_Value = integral_Data.mean()
-            max_Value = integral_Data.max()
-            if log_Y:
-                mean_Value = np.log10(mean_Value)
-                max_Value = np.log10(max_Value)
-            max_Pos = self._left_Position + integral_Data.argmax() * self._resolution
-            fwhm_Value = sum(integral_Data > (max_Value / 2)) * self._resolution
-                  
-            if display_Bars:
-                # Make some bars objects and add them to the plot widget.
-                self.mean_Bar = pyqtgraph.BarGraphItem(
-                    x0 = [self._left_Position],
-                    x1 = [self._right_Position],
-                    height = [mean_Value],
-                    pen = self._colour,
-                    brush = self._colour
-                    )
-                
-                self.max_Bar = pyqtgraph.BarGraphItem(
-                    x0 = [self._left_Position],
-                    x1 = [self._right_Position],
-                    height = [max_Value],
-                    pen = self._colour,
-                    brush = self._colour_Alpha
-                    )        
-                
-                self.Add_Bars()
-            else:
-                # If display bars is off, best make sure the bars aren't on
-                # the widget right now.
-                self.Remove_Bars()
-        
-        return mean_Value, max_Value, max_Pos, fwhm_Value
-    
-    def Add_Bars(self):
+    def Remove_From_Plot(self):
         """
-        Add the bars to the plot widget, if they exist.
+        Remove the lines, and the bars with them.
         """
-        for bar in [self.mean_Bar, self.max_Bar]:
-            if isinstance(bar, type(None)):
-                pass
-            else:
-                self._plot_Widget.addItem(bar)        
-    
-    def Remove_Bars(self):
+        if not self.on_Plot:
+            return
+        super().Remove_From_Plot()
+        for bar in self._bars:
+            self._plot_Widget.removeItem(bar)
+        
+    def Update_Bars(self, mean_Value, max_Value, display_Bars):
         """
-        Remove the bars from the plot widget, if they exist.
+        Optionally show bars between the markers of the mean and max values
+        of the data between them (worked out for all the cursors at once by
+        the caller, see roi_Stats.Stats_Many). display_Bars a boolean.
         """
-        for bar in [self.mean_Bar, self.max_Bar]:
-            if isinstance(bar, type(None)):
-                pass
-            else:
-                self._plot_Widget.removeItem(bar)
+
+        if not display_Bars:
+            self.Hide_Bars()
+            return
+
+        # Same bars, just a different height (if it's changed at all)
+        if (mean_Value, max_Value) != self._bar_Heights:
+            self.mean_Bar.setOpts(height=[mean_Value])
+            self.max_Bar.setOpts(height=[max_Value])
+            self._bar_Heights = (mean_Value, max_Value)
+        self.Show_Bars()
+
+    def Show_Bars(self):
+        for bar in self._bars:
+            if not bar.isVisible():
+                bar.setVisible(True)
+
+    def Hide_Bars(self):
+        for bar in self._bars:
+            if bar.isVisible():
+                bar.setVisible(False)
     
 if __name__ == "__main__":
     pass
\ No newline at end of file
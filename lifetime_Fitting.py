@@ -0,0 +1,360 @@
+"""
+Fluorescence lifetime fitting: sums of exponential decays convolved with a
+measured instrument response function (IRF), fitted to histograms.
+
+The IRF is a histogram of the laser (or scatter) on its own, saved like
+any other (on_Save_Histo). Convolution is done with FFTs, and for many sets
+of parameters at once (one FFT call for all of them) so the jacobian for
+the fit, which needs the model at every parameter nudged a bit, costs
+about the same as a couple of evaluations. Fast enough to fit the whole
+65536 bins live.
+
+Also refits a pile of saved histograms with one IRF, in parallel
+processes, e.g.
+    python lifetime_Fitting.py irf.csv sample_*.csv --components 2
+or checks fits of synthetic data come back unbiased with --check.
+"""
+
+# pylint: disable=C0103
+
+import argparse
+import concurrent.futures
+import glob
+import itertools
+import time
+
+import numpy as np
+import scipy.fft
+import scipy.optimize
+import scipy.special
+
+import curve_Fitting
+
+
+def Load_Histogram(path):
+    """
+    Read a histogram saved by on_Save_Histo ("Bin, Count" rows). Returns
+    the bins (s) and counts. Raises ValueError if it isn't one (or OSError
+    if it can't be read at all).
+    """
+    saved = np.loadtxt(path, delimiter=",", ndmin=2)
+    if saved.shape[1] < 2 or len(saved) < 2:
+        raise ValueError(f"{path} isn't a saved histogram (needs rows of "
+                         f"bin, count)")
+    return saved[:, 0], saved[:, 1]
+
+
+def Prepare_IRF(counts):
+    """
+    IRF histogram with its background (the median bin, most of it being
+    empty) taken off and scaled to add up to one.
+    """
+    irf = np.asarray(counts, dtype=np.float64)
+    irf = np.maximum(irf - np.median(irf), 0)
+    total = irf.sum()
+    if total <= 0:
+        raise ValueError("IRF is empty")
+    return irf / total
+
+
+class Reconvolution_Model(curve_Fitting.Fit_Model):
+    """
+    n_Components exponential decays starting at the start of the ROI,
+    convolved with the IRF (over the same bins), plus a flat background.
+    The IRF can also be shifted by a fraction of a bin (a phase ramp on its
+    spectrum), as the IRF and the sample never quite line up.
+
+    Parameters are amplitude and tau of each decay, then offset and shift,
+    all in bins/counts like the other Fit_Models.
+    """
+
+    def __init__(self, irf, n_Components=1, name=None):
+        """
+        irf is the IRF histogram (the whole thing, as counts, see
+        Prepare_IRF) at the same resolution as whatever will be fitted.
+        """
+
+        names = []
+        kinds = []
+        for i in range(1, n_Components + 1):
+            names += [f"Amplitude {i}", f"Tau {i}"]
+            kinds += ["value", "time"]
+        names += ["Offset", "Shift"]
+        kinds += ["value", "time"]
+        if name is None:
+            name = f"Reconvolution ({n_Components} exp)"
+        super().__init__(name, None, tuple(names), tuple(kinds), None)
+
+        self.irf = Prepare_IRF(irf)
+        self.n_Components = n_Components
+        # Spectrum of the IRF over the last ROI asked about, and what that
+        # was, since it's the same ROI frame after frame.
+        self._spectrum_Key = None
+        self._spectrum = None
+        self._frequencies = None
+
+    def _Spectrum(self, start_Bin, n_Bins):
+        """
+        The IRF over the ROI, FFT'ed, padded so the convolution doesn't
+        wrap round.
+        """
+
+        key = (start_Bin, n_Bins)
+        if key != self._spectrum_Key:
+            n_FFT = scipy.fft.next_fast_len(2 * n_Bins, real=True)
+            irf = self.irf[start_Bin:start_Bin + n_Bins]
+            self._spectrum = scipy.fft.rfft(irf, n_FFT)
+            self._frequencies = scipy.fft.rfftfreq(n_FFT)
+            self._spectrum_Key = key
+        return self._spectrum, self._frequencies
+
+    def Evaluate_Many(self, parameters, n_Bins, start_Bin):
+        """
+        The model for every row of parameters (shape (n_Sets, n_Parameters))
+        at once, shape (n_Sets, n_Bins).
+        """
+
+        parameters = np.atleast_2d(parameters)
+        spectrum, frequencies = self._Spectrum(start_Bin, n_Bins)
+        n_FFT = 2 * (len(spectrum) - 1)
+        k = self.n_Components
+        amplitudes = parameters[:, 0:2 * k:2]
+        taus = parameters[:, 1:2 * k:2]
+        offsets = parameters[:, 2 * k]
+        shifts = parameters[:, 2 * k + 1]
+
+        t = np.arange(n_Bins, dtype=np.float64)
+        decays = np.einsum("sk,skt->st", amplitudes,
+                           np.exp(-t / taus[:, :, np.newaxis]))
+        # Convolve with the IRF, moved by shift bins.
+        shifted = spectrum * np.exp(-2j * np.pi * frequencies
+                                    * shifts[:, np.newaxis])
+        convolved = scipy.fft.irfft(scipy.fft.rfft(decays, n_FFT, axis=1)
+                                    * shifted, n_FFT, axis=1)
+        return convolved[:, :n_Bins] + offsets[:, np.newaxis]
+
+    def Evaluate(self, n_Bins, start_Bin, parameters):
+        return self.Evaluate_Many(parameters, n_Bins, start_Bin)[0]
+
+    def Guess(self, data, start_Bin):
+        """
+        Background from the smallest bins, one decay time from the fall
+        after the peak (spread out over the components), amplitudes so the
+        area's about right.
+        """
+
+        offset = np.percentile(data, 5)
+        peak = int(np.argmax(data))
+        tau = curve_Fitting.Guess_Exponential(data[peak:])[1]
+        # A unit amplitude decay convolved with a unit area IRF has an
+        # area of about tau.
+        area = max(np.sum(data - offset), 1.0)
+        if self.n_Components == 1:
+            taus = [tau]
+        else:
+            taus = tau * np.geomspace(0.5, 2, self.n_Components)
+        guess = []
+        for component_Tau in taus:
+            guess += [area / self.n_Components / component_Tau,
+                      component_Tau]
+        return np.array(guess + [offset, 0.0])
+
+    def Fit(self, data, start_Bin, p0, max_Evaluations):
+        """
+        Maximum likelihood fit for Poisson counts. Weighting by the data
+        (as curve_fit does) pulls the fit down in the tails, where most
+        bins have only a few counts in, so instead the residuals are the
+        Poisson deviance residuals, whose sum of squares least_squares
+        minimises. The jacobian is from the model at p and at p with each
+        parameter nudged, all in one Evaluate_Many.
+
+        The covariance is the inverse of the Fisher information at the
+        answer.
+        """
+
+        n_Bins = len(data)
+        data = np.asarray(data, dtype=np.float64)
+        n_Parameters = len(self.parameter_Names)
+        # The model has to stay positive for the likelihood to exist.
+        smallest = 1e-9
+
+        def Deviance_Residuals(model):
+            model = np.maximum(model, smallest)
+            deviance = 2 * (model - data + scipy.special.xlogy(data, data)
+                            - scipy.special.xlogy(data, model))
+            return np.sign(model - data) * np.sqrt(np.maximum(deviance, 0))
+
+        def Residuals(p):
+            return Deviance_Residuals(
+                self.Evaluate_Many(p, n_Bins, start_Bin)[0])
+
+        def Model_Jacobian(p):
+            """
+            The model at p, and its derivatives.
+            """
+            steps = 1e-6 * np.maximum(np.abs(p), 1)
+            nudged = np.tile(p, (n_Parameters + 1, 1))
+            nudged[1:] += np.diag(steps)
+            models = self.Evaluate_Many(nudged, n_Bins, start_Bin)
+            return models[0], (models[1:] - models[0]) / steps[:, np.newaxis]
+
+        def Jacobian(p):
+            model, derivatives = Model_Jacobian(p)
+            model = np.maximum(model, smallest)
+            residuals = Deviance_Residuals(model)
+            # d(residual)/d(model) is (1 - data/model)/residual, which goes
+            # to 1/sqrt(model) as the residual goes to zero.
+            with np.errstate(divide="ignore", invalid="ignore"):
+                slope = np.where(np.abs(residuals) > 1e-6,
+                                 (1 - data / model) / residuals,
+                                 1 / np.sqrt(model))
+            return (derivatives * slope).T
+
+        lower = np.full(n_Parameters, -np.inf)
+        upper = np.full(n_Parameters, np.inf)
+        k = self.n_Components
+        lower[0:2 * k:2] = 0
+        lower[1:2 * k:2] = 1e-3
+        lower[-1] = -n_Bins / 2
+        upper[-1] = n_Bins / 2
+        p0 = np.clip(np.asarray(p0, dtype=np.float64), lower, upper)
+
+        result = scipy.optimize.least_squares(
+            Residuals, p0, jac=Jacobian, bounds=(lower, upper),
+            max_nfev=max_Evaluations, x_scale="jac")
+        if not result.success:
+            raise RuntimeError(result.message)
+
+        model, derivatives = Model_Jacobian(result.x)
+        fisher = derivatives / np.sqrt(np.maximum(model, smallest))
+        covariance = np.linalg.pinv(fisher @ fisher.T)
+        return result.x, covariance
+
+
+# One model per process for Refit_Files, made when the process starts so
+# the IRF is only sent over once.
+_process_Model = None
+
+
+def _Init_Process(irf, n_Components):
+    global _process_Model
+    _process_Model = Reconvolution_Model(irf, n_Components)
+
+
+def _Refit_File(path, start_Bin, stop_Bin, max_Evaluations):
+    result = {"path": path, "success": False, "message": "", "values": None,
+              "errors": None}
+    start_Time = time.perf_counter()
+    try:
+        bins, counts = Load_Histogram(path)
+        data = counts[start_Bin:stop_Bin]
+        resolution = bins[1] - bins[0]
+        parameters, covariance = _process_Model.Fit(
+            data, start_Bin, _process_Model.Guess(data, start_Bin),
+            max_Evaluations)
+    except (OSError, RuntimeError, ValueError) as e:
+        result["message"] = str(e)
+    else:
+        names = _process_Model.parameter_Names
+        result.update(
+            success=True,
+            values=dict(zip(names, _process_Model.To_Units(
+                parameters, start_Bin, resolution))),
+            errors=dict(zip(names, _process_Model.To_Units(
+                np.sqrt(np.abs(np.diag(covariance))), 0, resolution))))
+    result["fit_Time"] = time.perf_counter() - start_Time
+    return result
+
+
+def Refit_Files(paths, irf, n_Components=1, start_Bin=0, stop_Bin=None,
+                max_Workers=None, max_Evaluations=200):
+    """
+    Fit every saved histogram in paths with the IRF (counts), bins
+    start_Bin to stop_Bin of each, in a pool of processes. Returns a dict
+    per file (path, success, message, values, errors, fit_Time) in the
+    same order.
+    """
+
+    with concurrent.futures.ProcessPoolExecutor(
+            max_Workers, initializer=_Init_Process,
+            initargs=(irf, n_Components)) as executor:
+        return list(executor.map(_Refit_File, paths,
+                                 itertools.repeat(start_Bin),
+                                 itertools.repeat(stop_Bin),
+                                 itertools.repeat(max_Evaluations)))
+
+
+def Check_Synthetic(n_Fits=5, n_Bins=8192):
+    """
+    Regression check: fits of the model's own output, with Poisson noise
+    and low counts (a decay from 20 down onto a background of 5, where
+    weighting by the data used to pull the background down by a quarter),
+    should on average get back what went in. Returns the true and mean
+    fitted parameters.
+    """
+
+    t = np.arange(n_Bins, dtype=np.float64)
+    irf = 1e4 * np.exp(-0.5 * ((t - 500) / 20)**2)
+    model = Reconvolution_Model(irf, 1)
+    true = np.array([20.0, 800.0, 5.0, 0.0])
+    expected = model.Evaluate(n_Bins, 0, true)
+
+    fits = []
+    for seed in range(n_Fits):
+        data = np.random.default_rng(seed).poisson(expected).astype(np.float64)
+        fits.append(model.Fit(data, 0, model.Guess(data, 0), 200)[0])
+    fitted = np.mean(fits, axis=0)
+
+    amplitude, tau, offset, shift = fitted
+    assert abs(amplitude / true[0] - 1) < 0.02, amplitude
+    assert abs(tau / true[1] - 1) < 0.02, tau
+    assert abs(offset / true[2] - 1) < 0.02, offset
+    assert abs(shift) < 2, shift
+    return true, fitted
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Refit saved histograms with an IRF")
+    parser.add_argument("irf", nargs="?", help="Saved histogram of the IRF")
+    parser.add_argument("histograms", nargs="*",
+                        help="Saved histograms to fit (globs are expanded)")
+    parser.add_argument("--check", action="store_true",
+                        help="Just check fits of synthetic data come back "
+                        "unbiased")
+    parser.add_argument("--components", type=int, default=1)
+    parser.add_argument("--start", type=int, default=0,
+                        help="First bin to fit")
+    parser.add_argument("--stop", type=int, default=None,
+                        help="Bin after the last one to fit")
+    parser.add_argument("--processes", type=int, default=None)
+    args = parser.parse_args()
+
+    if args.check:
+        true, fitted = Check_Synthetic()
+        print(f"Synthetic check passed: put in {true}, "
+              f"got back {np.round(fitted, 3)}")
+        return
+    if args.irf is None or not args.histograms:
+        parser.error("an IRF and at least one histogram are needed")
+
+    paths = [path for pattern in args.histograms
+             for path in sorted(glob.glob(pattern)) or [pattern]]
+    irf = Load_Histogram(args.irf)[1]
+
+    start_Time = time.perf_counter()
+    results = Refit_Files(paths, irf, args.components, args.start, args.stop,
+                          args.processes)
+    for result in results:
+        if result["success"]:
+            values = ", ".join(f"{name} {value:.3E}"
+                               for name, value in result["values"].items())
+        else:
+            values = f"failed: {result['message']}"
+        print(f"{result['path']}: {values} ({result['fit_Time']:.2f}s)")
+    print(f"{len(paths)} histograms in "
+          f"{time.perf_counter() - start_Time:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -13,14 +13,10 @@ TODO list:
     - Type checking in config setters so they take either str or relevant type
     - use the X data to limit the plot axis when there's no data (otherwise
     cursor clicks with no data cause an exception)
-    - Consider interpreting warning codes manually so unwanted warnings can
-    be masked out.
   Med:
-    - Curve fitting (choose function - not just gaussian).
     - BUG: Integral bars only show when x=0 is visible on axis! (what.)
   Hard
-    - Add dynamic number of delta/integration cursors instead of 2/4
-    respectively
+    - Add dynamic number of delta cursors instead of 2
     - Two y axes for counts mode (hard in pyqtplot)
     - Investigate getting this to work with other hardware...
 """
@@ -35,19 +31,28 @@ TODO list:
 # Quiet f strings in log messages
 # pylint: disable=W1203
 
-import collections
 import itertools
 import logging
 import os
 import sys
+import time
 
 import numpy as np
 from PyQt5 import QtWidgets, QtCore, QtGui
 import pyqtgraph
 import qdarkstyle
 
-import acq_Thread
+import count_Archive
+import curve_Fitting
+import device_Manager
 import graph_Markers
+import roi_Stats
+import lifetime_Fitting
+import phasor_Analysis
+import plot_Decimation
+import render_Scheduler
+import roi_Table
+import ring_Buffers
 import settings_gui
 import LD_Pharp
 import LD_Pharp_Dummy
@@ -87,9 +92,21 @@ class MyWindow(QtWidgets.QMainWindow):
         
         # Define hardware info members, then init them (and the hardware)
         self.my_Pharp = None
+        self.device_Manager = None
+        self.display_Device = None
         self.allowed_Resolutions = None
-        self.this_Data = np.zeros(65536)
-        self.last_Histogram = np.zeros(65536)
+        # The histogram being displayed. Frames from the acquisition thread
+        # are copied (or added) into it and handed straight back, so it
+        # never shares memory with them.
+        self.this_Data = np.zeros(65536, dtype=np.int64)
+        # Where log(this_Data) goes when plotting on a log scale.
+        self.log_Data = np.zeros(65536)
+        # Min/max of blocks of bins of the latest histogram, to draw it with
+        # only as many points as there are pixels.
+        self.histogram_Pyramid = plot_Decimation.MinMax_Pyramid(65536)
+        # A copy of the last histogram plotted, to save. this_Data carries
+        # on changing.
+        self.last_Histogram = np.zeros(65536, dtype=np.int64)
         self.x_Data = np.zeros(65536)
         
         # LD_Pharp_Config inits with some sensible defaults
@@ -107,27 +124,45 @@ class MyWindow(QtWidgets.QMainWindow):
         self.Init_Hardware()
 
         # Members involved with UI, then init them (and the UI)
-        self.mean_TextBoxes = ()
-        self.max_TextBoxes = ()
-        self.fwhm_TextBoxes = ()
         self.click_TextBoxes = ()
-        self.normalize_Buttons = ()
+        self.roi_Model = None
+        self.fit_Worker = None
+        # Bumped whenever the fits on their way back go out of date (the ROI
+        # being fitted changed or went, or the model changed), see
+        # on_Fit_Result. And which ROI (row, start, stop) is being fitted.
+        self.fit_Generation = 0
+        self.fit_ROI = None
+        # Phasors of the ROIs at the laser repetition rate, shown in a
+        # window of their own (made the first time it's asked for).
+        self.phasor_Basis = phasor_Analysis.Phasor_Basis()
+        self.phasor_Plot = None
         self.cursors_On = None
         self.deltas_On = None
         self.integrals_On = None
         self.bars_On = None
         self.count_Mode = False
-        self.n_Counts = 0
-        self.count_History = collections.deque(maxlen=100000)
+        # Time (s since the program started), ch0 and ch1 of the latest
+        # count rates received.
+        self.count_Epoch = time.time()
+        self.sync_Rate = 0
+        self.count_History = ring_Buffers.History_Ring(100000, 3, np.float64)
+        self.count_Curves = ()
+        # All of them, for days, on disk. The count graph shows the latest
+        # ones (follows) until it's zoomed or dragged, then shows whatever
+        # part of the archive is on screen.
+        self.count_Follow = True
+        archive_Path = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                    "count_archive")
+        try:
+            self.count_Archive = count_Archive.Count_Archive(archive_Path)
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"Count rates won't be archived: {e}")
+            self.count_Archive = None
         self.detected_inis = []
         self.last_Warnings = ""
         self.Init_UI()
-        # Init_UI has set up the normalize buttons, the last one is checked by
-        # default, so this should be the initial state.
-        self.normalize_This = len(self.normalize_Buttons)
 
         # Members involved with plotting, then init them (and the plots)
-        self.last_Histogram = None
         self.last_X_Data = None
         self.click_Number = 0
         self.last_Click = None
@@ -145,18 +180,20 @@ class MyWindow(QtWidgets.QMainWindow):
         Connect to the actual device (or otherwise...)
         """
 
+        # Every Picoharp plugged in gets opened, the GUI shows the first one.
+        self.device_Manager = device_Manager.Device_Manager()
         try:
-            self.my_Pharp = LD_Pharp.LD_Pharp(
-                0,
+            device_Numbers = self.device_Manager.Open_All(
                 self.pharppy_Config.hw_Settings
                 )
-        except (UnboundLocalError, FileNotFoundError) as e:
+        except (UnboundLocalError, FileNotFoundError, ConnectionError) as e:
             # FileNotFoundError if the DLL can't be found
-            # UnboundLocalError if the DLL can't find a Picoharp.
+            # UnboundLocalError/ConnectionError if the DLL can't find a
+            # Picoharp.
             self.logger.warning(e)
             if isinstance(e, FileNotFoundError):
                 self.logger.info("phlib dll not found. Is it installed?")
-            if isinstance(e, UnboundLocalError):
+            if isinstance(e, (UnboundLocalError, ConnectionError)):
                 self.logger.info("Picoharp not found. Not plugged in or powered?")
                 self.logger.info("Prompt user if they want to use simulation mode")
             # If the dll can't get a device handle, the program falls over,
@@ -170,13 +207,21 @@ class MyWindow(QtWidgets.QMainWindow):
                 )
             if error_Response == QtWidgets.QMessageBox.Yes:
                 # Go get the simulator and launch it.
-                self.my_Pharp = LD_Pharp_Dummy.LD_Pharp(
+                self.device_Manager.Add_Device(
                     0,
-                    self.pharppy_Config.hw_Settings)
+                    LD_Pharp_Dummy.LD_Pharp(0, self.pharppy_Config.hw_Settings)
+                    )
+                device_Numbers = [0]
             else:
                 # Fall over
                 raise e
 
+        self.device_Manager.Set_Count_Interval(
+            self.pharppy_Config.sw_Settings.count_Interval)
+        self.display_Device = device_Numbers[0]
+        self.my_Pharp = self.device_Manager.devices[self.display_Device]
+        self.acq_Thread = self.device_Manager.threads[self.display_Device]
+
         # The resolutions are all 2**n multiples of the base resolution so
         # get the base resolution from the device and work out all of the
         # resolutions to display in the dropdown box.
@@ -184,12 +229,19 @@ class MyWindow(QtWidgets.QMainWindow):
             self.my_Pharp.base_Resolution * (2**n) for n in range(8)
             ]
 
-        # Make the worker thread.
-        self.acq_Thread = acq_Thread.Acq_Thread(self.my_Pharp)
-        self.acq_Thread.count_Signal.connect(self.on_Count_Signal)
-        self.acq_Thread.plot_Signal.connect(self.on_Histo_Signal)
-        self.acq_Thread.status_Signal.connect(self.on_Status_Signal)
-        self.acq_Thread.start()
+        # Histograms get drawn at most max_FPS times a second, however fast
+        # they come in.
+        self.render_Scheduler = render_Scheduler.Render_Scheduler(
+            self.pharppy_Config.sw_Settings.max_FPS)
+        self.render_Scheduler.frame_Signal.connect(self.on_Histo_Signal)
+
+        # The worker threads are already running, listen to them.
+        self.device_Manager.count_Signal.connect(self.on_Device_Count_Signal)
+        # Straight from the acquisition thread into the render scheduler,
+        # rather than queueing up a signal for the GUI for every histogram.
+        self.device_Manager.plot_Signal.connect(self.on_Device_Histo_Signal,
+                                                QtCore.Qt.DirectConnection)
+        self.device_Manager.status_Signal.connect(self.on_Device_Status_Signal)
 
     def Init_UI(self):
         """
@@ -229,6 +281,7 @@ class MyWindow(QtWidgets.QMainWindow):
         self.ui.option_Cursor.stateChanged.connect(self.on_Cursor_Button)
         self.ui.option_Deltas.stateChanged.connect(self.on_Deltas_Button)
         self.ui.option_ShowBars.stateChanged.connect(self.on_Bars_Button)
+        self.ui.option_Cumulative.stateChanged.connect(self.on_Cumulative_Button)
         self.ui.button_ClearDeltas.clicked.connect(self.on_Clear_Deltas)
         self.ui.button_ClearHistogram.clicked.connect(self.on_Clear_Histogram)
         self.ui.button_ClearIntegrals.clicked.connect(self.on_Clear_Intervals)
@@ -236,54 +289,31 @@ class MyWindow(QtWidgets.QMainWindow):
         self.ui.cursors_Tabber.currentChanged.connect(self.on_Cursor_Tab)
         self.ui.button_SaveSettings.clicked.connect(self.on_Save_Settings)
         self.ui.button_LoadSettings.clicked.connect(self.on_Load_Settings)
-        # All normalize radio buttons connected to the same method
-        self.ui.normalize_Red.toggled.connect(self.on_Normalize_Click)
-        self.ui.normalize_Green.toggled.connect(self.on_Normalize_Click)
-        self.ui.normalize_Blue.toggled.connect(self.on_Normalize_Click)
-        self.ui.normalize_Magenta.toggled.connect(self.on_Normalize_Click)
-        self.ui.normalize_Off.toggled.connect(self.on_Normalize_Click)
         self.ui.button_CountsReset.clicked.connect(self.on_Counts_Reset)
-
-        self.mean_TextBoxes = (
-            self.ui.integral_Red,
-            self.ui.integral_Green,
-            self.ui.integral_Blue,
-            self.ui.integral_Magenta
-            )
-
-        self.max_TextBoxes = (
-            self.ui.max_Red,
-            self.ui.max_Green,
-            self.ui.max_Blue,
-            self.ui.max_Magenta
-            )
-        
-        self.max_Pos_TestBoxes = (
-            self.ui.max_Pos_Red,
-            self.ui.max_Pos_Green,
-            self.ui.max_Pos_Blue,
-            self.ui.max_Pos_Magenta
-            )
+        # The settings were put in the GUI before this was connected, make
+        # sure the hardware knows whether to accumulate.
+        self.on_Cumulative_Button()
 
         self.click_TextBoxes = (
             (self.ui.click_1_X, self.ui.click_1_Y),
             (self.ui.click_2_X, self.ui.click_2_Y)
             )
 
-        self.normalize_Buttons = (
-            self.ui.normalize_Red,
-            self.ui.normalize_Green,
-            self.ui.normalize_Blue,
-            self.ui.normalize_Magenta,
-            self.ui.normalize_Off
-            )
-
-        self.fwhm_TextBoxes = (
-            self.ui.fwhm_Red,
-            self.ui.fwhm_Green,
-            self.ui.fwhm_Blue,
-            self.ui.fwhm_Magenta
-            )
+        # The integral cursors' stats go in a table, one row each, however
+        # many there are.
+        self.roi_Model = roi_Table.ROI_Table_Model(
+            self.my_Pharp.resolution * 1e-12)
+        self.ui.roi_View.setModel(self.roi_Model)
+
+        # Fitting a model to the ROI selected in the table (the first one if
+        # none are), in the background. Results are shown under the table.
+        # Loading an IRF adds reconvolution models to the list.
+        self.ui.fit_Model.addItems(curve_Fitting.models)
+        self.fit_Worker = curve_Fitting.Fit_Worker()
+        self.fit_Worker.result_Signal.connect(self.on_Fit_Result)
+        self.ui.fit_Model.currentTextChanged.connect(self.on_Fit_Model)
+        self.ui.button_LoadIRF.clicked.connect(self.on_Load_IRF)
+        self.ui.button_PhasorPlot.clicked.connect(self.on_Phasor_Button)
 
     def Init_Plot(self):
         """
@@ -303,10 +333,27 @@ class MyWindow(QtWidgets.QMainWindow):
         self.ui.graph_Widget.plotItem.showGrid(x=True, y=True)
         # self.ui.graph_Widget.plotItem.showButtons() #does this do anything?
 
-        # Dummy data that at least makes the axes look sensible...
-        self.ui.graph_Widget.plotItem.plot(self.x_Data,
-                                           np.ones_like(self.x_Data)
-                                           )
+        # The histogram is always this one curve, its data gets replaced
+        # with each new histogram. Dummy data that at least makes the axes
+        # look sensible to start with...
+        self.histogram_Curve = self.ui.graph_Widget.plotItem.plot(
+            self.x_Data,
+            np.ones_like(self.x_Data)
+            )
+        # How many bins of the histogram to plot (the rest are empty), and
+        # the y limit of the plot area. The number of bins is only worked
+        # out from scratch when the settings change (sync divider or
+        # resolution) or the histogram is cleared, otherwise it only grows.
+        self.n_Plot_Bins = None
+        self.y_Limit = 0
+        self.histogram_Pyramid.Clear()
+
+        # The count rate graphs in count mode. Kept and updated with new data
+        # rather than plotting new ones every time.
+        self.count_Curves = (
+            pyqtgraph.PlotDataItem(pen=QtGui.QColor(255, 0, 0)),
+            pyqtgraph.PlotDataItem(pen=QtGui.QColor(0, 255, 0))
+            )
 
         # Fix the plot area before anything else starts, otherwise the auto
         # scaler goes crazy with the cursors.
@@ -324,6 +371,9 @@ class MyWindow(QtWidgets.QMainWindow):
         self.ui.graph_Widget.sceneObj.sigMouseClicked.connect(
             self.on_Graph_Click
             )
+        view_Box = self.ui.graph_Widget.plotItem.vb
+        view_Box.sigRangeChangedManually.connect(self.on_Manual_Range)
+        view_Box.sigXRangeChanged.connect(self.on_X_Range_Changed)
 
         # Keep track of which crosshair should move on the next click.
         self.click_Number = 0
@@ -335,13 +385,12 @@ class MyWindow(QtWidgets.QMainWindow):
                                                       self.palette[i])
                               for i in range(2)]
 
-        self.integral_Cursors = [
-            graph_Markers.Integral_Cursor(
-                self.ui.graph_Widget,
-                self.palette[i],
-                self.my_Pharp.resolution * 1e-12)
-            for i in range(4)
-            ]
+        # One per ROI, added by clicking.
+        self.integral_Cursors = []
+        # The latest fit to one of them, if fitting.
+        self.fit_Curve = pyqtgraph.PlotDataItem(
+            pen=pyqtgraph.mkPen(QtGui.QColor(255, 255, 255),
+                                style=QtCore.Qt.DashLine))
 
         self.cursor_Marker.coords = (0, 0)
         self.cursor_Marker.colour = (255, 255, 0)
@@ -360,13 +409,10 @@ class MyWindow(QtWidgets.QMainWindow):
         Get the settings from the UI and tell the picoharp to update them.
         """
 
-        # To ensure avoiding trying to send settings while the hardware is
-        # sending data, ask the hardware to pause briefly (not stop) then
-        # un pause when settings send is finished. Pause/unpause insted of
-        # start/stop preserves the started/stopped state when settings are
-        # sent.
-        self.acq_Thread.histogram_Paused = True
-        
+        # The settings get sent by the acquisition threads in between
+        # histograms, so this doesn't wait for the hardware (and the hardware
+        # doesn't get interrupted)
+
         # Translate desired resolution to a "binning" number. Binning
         # combines histogram bins to reduce the histogram resolution.
         resolution_Req = self.ui.resolution.currentText()
@@ -383,7 +429,17 @@ class MyWindow(QtWidgets.QMainWindow):
         hw_Settings.acq_Time = int(self.ui.acq_Time.value())
 
         self.logger.info(f"Push settings\n {hw_Settings}")
-        self.my_Pharp.Update_Settings(hw_Settings)
+        self.device_Manager.Update_Settings(hw_Settings,
+                                            callback=self.on_Settings_Applied)
+
+    def on_Settings_Applied(self, device_Number, result):
+        """
+        Once a device has the new settings, update the things that depend on
+        them.
+        """
+
+        if device_Number != self.display_Device:
+            return
 
         # If binning (resolution) changes, the histogram x axis labels
         # change. Update this. The max number of bins is 65536, this will
@@ -393,12 +449,13 @@ class MyWindow(QtWidgets.QMainWindow):
                                 self.my_Pharp.resolution
                                 ) * 1e-12
 
-        # Let the cursors know the resolution has been updated (since the
+        # Let the ROIs know the resolution has been updated (since the
         # data->bin mapping depends on resolution)
-        for cursor in self.integral_Cursors:
-            cursor.resolution = self.my_Pharp.resolution * 1e-12
+        self.roi_Model.resolution = self.my_Pharp.resolution * 1e-12
 
-        self.acq_Thread.histogram_Paused = False
+        # The empty end of the histogram probably moved too.
+        self.n_Plot_Bins = None
+        self.y_Limit = 0
 
     def Apply_Default_Settings(self):
         """
@@ -518,7 +575,9 @@ class MyWindow(QtWidgets.QMainWindow):
     def start_Hist_Mode(self):
         self.logger.info("Stop histogramming")
         self.ui.status.setText("Counting")
-        self.acq_Thread.histogram_Active = False
+        self.device_Manager.Set_Histogram_Active(False)
+        # How well the display kept up.
+        self.logger.info(f"Frames {self.render_Scheduler.Stats()}")
         # self.ui.button_ApplySettings.setEnabled(True)
         # self.ui.button_Defaults.setEnabled(True)
         # self.ui.button_LoadSettings.setEnabled(True)
@@ -528,12 +587,28 @@ class MyWindow(QtWidgets.QMainWindow):
         self.logger.info("Start histogramming")
         self.on_Clear_Histogram()
         self.ui.status.setText("Histogramming")
-        self.acq_Thread.histogram_Active = True
+        self.device_Manager.Set_Histogram_Active(True)
         # self.ui.button_ApplySettings.setEnabled(False)
         # self.ui.button_Defaults.setEnabled(False)
         # self.ui.button_LoadSettings.setEnabled(False)
         # self.ui.button_SaveSettings.setEnabled(False)
         
+    def on_Device_Count_Signal(self, device_Number, ch0, ch1):
+        # Only the device being displayed, for now.
+        if device_Number == self.display_Device:
+            self.on_Count_Signal(ch0, ch1)
+
+    def on_Device_Histo_Signal(self, device_Number, frame):
+        # NB: runs in the acquisition thread, see Init_Hardware.
+        if device_Number == self.display_Device:
+            self.render_Scheduler.Put(frame)
+        else:
+            frame.Release()
+
+    def on_Device_Status_Signal(self, device_Number, warnings_Code, warnings):
+        if device_Number == self.display_Device:
+            self.on_Status_Signal(warnings_Code, warnings)
+
     def on_Count_Signal(self, ch0, ch1):
         """
         Handle the counts when the hardware thread emits them
@@ -544,8 +619,12 @@ class MyWindow(QtWidgets.QMainWindow):
         self.ui.counts_Ch1.setText(f"{ch1:.{self.count_Precision}E}")
         
         # Remember the counts in case they want to be plotted later.
-        self.count_History.append([ch0, ch1])
-        self.n_Counts += 1
+        now = time.time()
+        self.count_History.Append(now - self.count_Epoch, ch0, ch1)
+        # For the laser repetition rate (phasors)
+        self.sync_Rate = ch0
+        if self.count_Archive is not None:
+            self.count_Archive.Append(now, ch0, ch1)
         
         if self.count_Mode:
             """
@@ -563,139 +642,218 @@ class MyWindow(QtWidgets.QMainWindow):
                 fmt = f".{self.ui.value_CountPrecision.value()}E"
             self.ui.counts_Ch0_Big.setText(f"{ch0:{fmt}}")
             self.ui.counts_Ch1_Big.setText(f"{ch1:{fmt}}")
+
+            if not self.count_Follow:
+                # Looking at the archive, leave the graph where it is.
+                return
             
             # How many counts to show on the graph before the oldest ones start
-            # to be dropped. The counts are stored in a massive deque so
+            # to be dropped. The counts are stored in a big ring buffer so
             # extending the display after shrinking it brings back the old 
             # values.
             n_Counts_Display = self.ui.value_NumGraphCounts.value()
-            # If the deque contains less than n_Counts_Display counts, set the
-            # first value to the 0th element, otherwise it's the 
-            # n_Counts_Display'th to last element.
-            start_i = max(0, len(self.count_History) - n_Counts_Display) # 0 or +ve value
-            # Get just the data for plotting from the deque.
-            display_Counts = itertools.islice(self.count_History,
-                                              start_i,
-                                              None)
-            # Split into channels to plot separately
-            ch0, ch1 = zip(*display_Counts)
-            ch0 = np.array(ch0, dtype=np.int32)
-            ch1 = np.array(ch1, dtype=np.int32)
-            
-            # Make the x labels correspond to the number of count signals
-            # received. (because why not)
-            x_Data = range(self.n_Counts - len(ch0), self.n_Counts)
-            # Plot the data
-            red = QtGui.QColor(255, 0, 0)
-            green = QtGui.QColor(0, 255, 0)
-            
-            if self.ui.option_LogY.isChecked():
-                ch0 = np.log10(ch0, where=ch0>0)
-                ch1 = np.log10(ch1, where=ch1>0)
-            
-            # Clear the plot before replotting otherwise if the options are
-            # unchecked it just doesn't show new data (but still shows data
-            # from before the option was unchecked).
-            self.ui.graph_Widget.clear()
-            
-            if self.ui.option_Ch0_Counts.isChecked():
-                self.ui.graph_Widget.plot(x_Data, ch0, pen=red)
-            if self.ui.option_Ch1_Counts.isChecked():
-                self.ui.graph_Widget.plot(x_Data, ch1, pen=green)
+            # Views of the latest values, the x labels are the time since
+            # the program started.
+            x_Data, ch0_Data, ch1_Data = self.count_History.Latest(
+                n_Counts_Display)
+            ch0_Data, ch1_Data = self.Plot_Counts(x_Data, ch0_Data, ch1_Data)
         
-            # Auto scale to the visible values.
+            # Auto scale to the visible values. (but allow zooming out as far
+            # as the archive goes)
+            oldest = x_Data[0]
+            if self.count_Archive is not None:
+                oldest = min(oldest, self.count_Archive.Oldest()
+                             - self.count_Epoch)
             self.ui.graph_Widget.plotItem.vb.setLimits(
-                xMin=x_Data[0]-0.1,
+                xMin=oldest-0.1,
                 yMin=0,
                 xMax=x_Data[-1]+0.1,
-                yMax=1.1*max(max(ch0), max(ch1))
+                yMax=1.1*max(ch0_Data.max(), ch1_Data.max())
                 )
+
+    def Plot_Counts(self, x_Data, ch0_Data, ch1_Data):
+        """
+        Update the count rate curves, returns the y data as plotted.
+        """
+
+        if self.ui.option_LogY.isChecked():
+            ch0_Data = np.log10(ch0_Data, where=ch0_Data>0,
+                                out=np.zeros(len(ch0_Data)))
+            ch1_Data = np.log10(ch1_Data, where=ch1_Data>0,
+                                out=np.zeros(len(ch1_Data)))
+
+        # Update the existing curves, hiding the ones that aren't wanted.
+        ch0_Curve, ch1_Curve = self.count_Curves
+        ch0_Curve.setData(x_Data, ch0_Data)
+        ch1_Curve.setData(x_Data, ch1_Data)
+        ch0_Curve.setVisible(self.ui.option_Ch0_Counts.isChecked())
+        ch1_Curve.setVisible(self.ui.option_Ch1_Counts.isChecked())
+        return ch0_Data, ch1_Data
+
+    def on_Manual_Range(self):
+        """
+        The graph got zoomed/dragged. In count mode, stop following the
+        latest counts and show the archive instead (Auto Range goes back)
+        """
+
+        if not self.count_Mode or self.count_Archive is None:
+            return
+        if self.count_Follow:
+            self.count_Follow = False
+            view_Box = self.ui.graph_Widget.plotItem.vb
+            # The archive may have bigger values than the latest ones.
+            view_Box.setLimits(yMax=None)
+            self.on_X_Range_Changed(view_Box, view_Box.viewRange()[0])
+
+    def on_X_Range_Changed(self, view_Box, x_Range):
+        """
+        When looking at the archive in count mode, get just enough of it to
+        fill the graph across, from the most detailed level that covers it.
+        Otherwise redraw the histogram for the new range.
+        """
+
+        if not self.count_Mode:
+            # Histogram zoomed/dragged, redraw it at the new level of detail.
+            # (if it's auto ranging the whole histogram is drawn anyway)
+            if (self.histogram_Pyramid.n_Bins
+                    and not view_Box.autoRangeEnabled()[0]):
+                self.Update_Histogram_Curve()
+            return
+        if self.count_Follow:
+            return
+
+        x_Min, x_Max = x_Range
+        n_Pixels = max(int(view_Box.width()), 100)
+        times, minimum, _, maximum = self.count_Archive.Read(
+            x_Min + self.count_Epoch,
+            x_Max + self.count_Epoch,
+            n_Pixels)
+        # Draw a vertical line from the min to the max of each row so nothing
+        # (e.g. a spike) gets lost, one point per row for the raw counts.
+        x_Data = np.repeat(times - self.count_Epoch, 2)
+        envelope = np.stack((minimum, maximum), axis=1)
+        self.Plot_Counts(x_Data,
+                         envelope[:, :, 0].ravel(),
+                         envelope[:, :, 1].ravel())
         
-    def on_Histo_Signal(self, histogram_Data):
+    def on_Histo_Signal(self, frame):
         """
-        Handle the histogram when the hardware thread emits one.
+        Handle the histogram when the render scheduler passes one on (the
+        latest from the hardware thread, or in cumulative mode, all of them
+        since the last one added up).
         """
 
-        if self.ui.option_Cumulative.isChecked():
-            self.this_Data += histogram_Data
+        # The Picoharp adds up cumulative histograms itself if it can.
+        if (self.ui.option_Cumulative.isChecked()
+                and not self.my_Pharp.device_Accumulation):
+            self.this_Data += frame.data
         else:
-            self.this_Data = histogram_Data
-            
+            np.copyto(self.this_Data, frame.data)
+        # Finished with it, the acquisition thread can have it back.
+        frame.Release()
+
         if self.count_Mode:
             return
 
         # There are 65536 bins, but if (1/sync) is less than (65536*resolution)
         # then there will just be empty bins at the end of the histogram array.
-        # Look from the END of the array and find the index of the first non
-        # empty bin you find.
-        last_Full_Bin = histogram_Data.nonzero()[0][-1]
-
-        # Trim the histogram and labels so the empty bins (that will never
-        # fill) are not plotted. Then plot them.
-        plot_X = self.x_Data[:last_Full_Bin]
-        plot_Y = self.this_Data[:last_Full_Bin]
+        # Those only change when the settings do, so just check the empty end
+        # is still empty rather than searching the whole histogram each time
+        # (and when it isn't, only search back from the end as far as the
+        # last non-zero bin).
+        if (self.n_Plot_Bins is None
+                or self.this_Data[self.n_Plot_Bins:].any()):
+            n_Plot_Bins = plot_Decimation.Filled_Length(
+                self.this_Data, self.n_Plot_Bins or 0)
+            if n_Plot_Bins != self.n_Plot_Bins and n_Plot_Bins:
+                # So the new bins can be panned/zoomed to (or the old ones
+                # can't)
+                self.ui.graph_Widget.plotItem.vb.setLimits(
+                    xMax=self.x_Data[n_Plot_Bins - 1] * 1.05)
+            self.n_Plot_Bins = n_Plot_Bins
+        if self.n_Plot_Bins == 0:
+            return
+
+        # Trim the histogram so the empty bins (that will never fill) are
+        # not plotted. Then plot them.
+        plot_Y = self.this_Data[:self.n_Plot_Bins]
         # pyqtgraph log mode seems weird, just log the bin values instead if
-        # log scale is what's required...
+        # log scale is what's required... (empty bins go at 0, like 1 count)
         if self.ui.option_LogY.isChecked():
-            plot_Y = np.log10(plot_Y, where=plot_Y>0)
-            
-        self.ui.graph_Widget.plot(plot_X,
-                                  plot_Y,
-                                  clear=True)
+            log_Y = self.log_Data[:self.n_Plot_Bins]
+            np.maximum(plot_Y, 1, out=log_Y)
+            plot_Y = np.log10(log_Y, out=log_Y)
+
+        self.histogram_Pyramid.Update(plot_Y)
+        self.Update_Histogram_Curve()
+
         # Change the plot limits so that the auto scale doesn't go crazy with
-        # the cursors (if they're on) (plus a little margin so the labels show)
-        self.ui.graph_Widget.plotItem.vb.setLimits(xMin=0,
-                                                   yMin=0,
-                                                   xMax=plot_X[-1] * 1.05,
-                                                   yMax=plot_Y.max() * 1.05)
+        # the cursors (if they're on) (plus a little margin so the labels
+        # show). Only when the histogram outgrows them (or is a lot smaller)
+        # though, not every time.
+        y_Max = plot_Y.max() * 1.05
+        if not self.y_Limit / 4 < y_Max <= self.y_Limit:
+            self.y_Limit = 2 * y_Max
+            self.ui.graph_Widget.plotItem.vb.setLimits(
+                xMin=0,
+                yMin=0,
+                yMax=self.y_Limit)
 
-        if self.no_Data:
-            pass
-        else:
-            if self.cursors_On:
-                self.Draw_Cursors()
-            if self.deltas_On:
-                self.Draw_Deltas()
-            if self.integrals_On:
-                self.Draw_Integrals()
-                self.Display_Integrals()
+        # The cursors etc. stay on the plot, only the stats need updating.
+        if self.integrals_On:
+            self.Display_Integrals()
 
         # Remember the last histogram, so it can be saved.
-        self.last_Histogram = self.this_Data
+        np.copyto(self.last_Histogram, self.this_Data)
         self.last_X_Data = self.x_Data
     
-    def on_Status_Signal(self, warnings):
-        # Check if the warnings are any different to last time. If not, don't
-        # do anything. This saves an interaction with the GUI but also doesn't
-        # reset the scroll position of the text box back to the top which is
-        # annoying if you're trying to read the error.
-        if warnings == self.last_Warnings:
-            pass
-        else:
-            log_String = "\n".join(["New Warnings",
-                                    "-----------",
-                                    warnings[:-1],
-                                    "-----------"])
-            self.logger.warning(log_String)
-            self.last_Warnings = warnings
-            # I THINK the string "WARNING_" only occurs once per warning.
-            # There's nothing else there is consistently once in every warning
-            # (there's not even consistent newline characters), maybe colons
-            # would work too?
-            n_Warnings = warnings.count("WARNING_")
-            # Update the tab label to show the number of warnings in brackets
-            # Then update the actual text box with the warnings text reported
-            # by the phlib dll.
-            self.ui.control_Warning_Tabber.setTabText(1, f"Warnings ({n_Warnings})")
-            self.ui.warnings_Display.setText(warnings)
-                
+    def Update_Histogram_Curve(self):
+        """
+        Draw the part of the histogram that's on screen (all of it unless
+        the plot's been zoomed in), cut down to about one min and max per
+        pixel.
+        """
+
+        view_Box = self.ui.graph_Widget.plotItem.vb
+        start = 0
+        stop = self.histogram_Pyramid.n_Bins
+        if not view_Box.autoRangeEnabled()[0]:
+            # Zoomed in, just what's on screen (and a screen either side so
+            # it doesn't look empty while being dragged)
+            x_Min, x_Max = view_Box.viewRange()[0]
+            bin_Width = self.x_Data[1]
+            margin = x_Max - x_Min
+            start = max(start, int((x_Min - margin) / bin_Width))
+            stop = min(stop, int((x_Max + margin) / bin_Width) + 1)
+        n_Pixels = max(int(view_Box.width()), 100)
+
+        bins, values = self.histogram_Pyramid.View(start, stop, n_Pixels)
+        self.histogram_Curve.setData(self.x_Data[bins], values)
+
+    def on_Status_Signal(self, warnings_Code, warnings):
+        # Only sent when the warnings change, so this doesn't keep resetting
+        # the scroll position of the text box back to the top (which is
+        # annoying if you're trying to read the error).
+        log_String = "\n".join(["New Warnings",
+                                "-----------",
+                                warnings,
+                                "-----------"])
+        self.logger.warning(log_String)
+        self.last_Warnings = warnings
+        # One bit per warning in the code.
+        n_Warnings = bin(warnings_Code).count("1")
+        # Update the tab label to show the number of warnings in brackets
+        # Then update the actual text box with the warnings text reported
+        # by the phlib dll.
+        self.ui.control_Warning_Tabber.setTabText(1, f"Warnings ({n_Warnings})")
+        self.ui.warnings_Display.setText(warnings)
+
 ##############################################################################
 # GUI METHODS (NON GRAPHING)
 ##############################################################################
 
     def on_Counts_Reset(self):
-        self.count_History.clear()
-        self.n_Counts = 0
+        self.count_History.Clear()
 
     def on_Cursor_Button(self):
         """
@@ -728,27 +886,44 @@ class MyWindow(QtWidgets.QMainWindow):
             self.deltas_On = self.pharppy_Config.sw_Settings.show_Deltas
             self.integrals_On = False
             self.count_Mode = False
-            self.acq_Thread.histogram_Paused = False
+            self.device_Manager.Set_Paused(False)
+            self.Remove_Count_Curves()
             # enable xy cursor if the GUI element wants them
             self.on_Cursor_Button()
+            self.Show_Histogram()
         # Tab 1 is integrals mode
         elif tab_Number == 1:
             self.deltas_On = False
             self.integrals_On = True
             self.count_Mode = False
-            self.acq_Thread.histogram_Paused = False
+            self.device_Manager.Set_Paused(False)
+            self.Remove_Count_Curves()
             # enable xy cursor if the GUI element wants them
             self.on_Cursor_Button()
+            self.Show_Histogram()
         elif tab_Number == 2:
             self.deltas_On = False
             self.integrals_On = False
             self.count_Mode = True
-            self.acq_Thread.histogram_Paused = True
+            self.device_Manager.Set_Paused(True)
             self.cursors_On = False
+            # Swap the histogram for the count rate graphs.
+            self.count_Follow = True
+            self.Show_Histogram(False)
+            for curve in self.count_Curves:
+                self.ui.graph_Widget.addItem(curve)
         # Something's gone very awry.
         else:
             pass
 
+    def Remove_Count_Curves(self):
+        """
+        Take the count rate graphs off the plot (if they're on it)
+        """
+        for curve in self.count_Curves:
+            if curve.scene() is not None:
+                self.ui.graph_Widget.removeItem(curve)
+
     def on_Integral_Width_Button(self):
         """
         Take new value for integral width from the GUI.
@@ -758,25 +933,7 @@ class MyWindow(QtWidgets.QMainWindow):
 
         for cursor in self.integral_Cursors:
             cursor.width = self.pharppy_Config.sw_Settings.integral_Width
-
-    def on_Normalize_Click(self, checked):
-        """
-        When a normalize radio button is clicked. Update a variable keeping
-        track of which one is clicked.
-        Note that the signal is emitted when a radio button changes state, so
-        this triggers twice on any click, once for a deactivate and once for
-        an activate. Hence this only runs for the checked radio box. (not that
-        it would do any harm but it's neater this way)
-        """
-
-        # Check the event was from a "checked" event not an "unchecked" event
-        if checked:
-            for i, radio in enumerate(self.normalize_Buttons):
-                # Go through all the buttons looking for the checked one.
-                if radio.isChecked():
-                    self.logger.debug(f"Normalize button {i} is pressed")
-                    # Remember which button it was that was checked.
-                    self.normalize_This = i
+        self.roi_Model.Set_Widths(self.pharppy_Config.sw_Settings.integral_Width)
 
     def on_Save_Histo(self):
         """
@@ -806,6 +963,30 @@ class MyWindow(QtWidgets.QMainWindow):
 # PLOTTING METHODS
 ##############################################################################
 
+    def Show_Histogram(self, show=True):
+        """
+        Put the histogram and whichever of the cursors, deltas and integrals
+        are turned on on the plot (or take them all off). They stay there
+        between histograms so this only needs doing when they're turned
+        on/off.
+        """
+
+        on_Plot = self.histogram_Curve.scene() is not None
+        if show and not on_Plot:
+            self.ui.graph_Widget.addItem(self.histogram_Curve)
+        elif not show and on_Plot:
+            self.ui.graph_Widget.removeItem(self.histogram_Curve)
+
+        for turned_On, draw, remove in (
+                (self.cursors_On, self.Draw_Cursors, self.Remove_Cursors),
+                (self.deltas_On, self.Draw_Deltas, self.Remove_Deltas),
+                (self.integrals_On, self.Draw_Integrals, self.Remove_Integrals)
+                ):
+            if show and turned_On:
+                draw()
+            else:
+                remove()
+
     def Draw_Cursors(self):
         """
         Add a vertical line and a horizontal line to the plot widget. The idea
@@ -822,12 +1003,15 @@ class MyWindow(QtWidgets.QMainWindow):
 
     def Draw_Integrals(self):
         """
-        Persistent cursors. 4 pairs spaced by a user supplied value.
+        Persistent cursors. A pair per ROI spaced by a user supplied value.
+        (and the fit to one of them, if fitting)
         """
         # for line in itertools.chain.from_iterable(self.integral_vLines):
         #     self.ui.graph_Widget.addItem(line)
         for integral in self.integral_Cursors:
             integral.Add_To_Plot()
+        if self.ui.fit_Model.currentIndex() > 0 and self.fit_Curve.scene() is None:
+            self.ui.graph_Widget.addItem(self.fit_Curve)
 
     def Remove_Cursors(self):
         """
@@ -850,59 +1034,158 @@ class MyWindow(QtWidgets.QMainWindow):
         #     self.ui.graph_Widget.removeItem(line)
         for integral in self.integral_Cursors:
             integral.Remove_From_Plot()
+        if self.fit_Curve.scene() is not None:
+            self.ui.graph_Widget.removeItem(self.fit_Curve)
 
     def Display_Integrals(self):
         """
-        Send the histogram data to the cursors objects, which know where to
-        look for the data between their markers.
-        Integral cursor objects calculate and return the mean, max and fwhm
-        of the data between the markers.
-        Then Update the GUI as well (including optional normalizing)
+        Work out the mean, max, position of the max, fwhm and sum of the
+        data between the markers of every integral cursor. Then update the
+        table (which does any normalizing) and the bars.
         """
 
-        # Send the histogram data to each cursor so it can extract the relevant
-        # data, update the bars and returns the mean, max and fwhm values.
-        integrals_Readings = [
-            cursor.Update_Stats(self.this_Data, self.bars_On, self.ui.option_LogY.isChecked())
-            for cursor in self.integral_Cursors
-            ]
+        stats = roi_Stats.Stats_Many(self.this_Data, self.roi_Model.starts,
+                                     self.roi_Model.stops)
+        self.roi_Model.Set_Stats(*stats,
+                                 log_Y=self.ui.option_LogY.isChecked())
 
-        # A big iterable so let's define it separate to the for loop
-        iterable = zip(
-            integrals_Readings,
-            self.mean_TextBoxes,
-            self.max_TextBoxes,
-            self.max_Pos_TestBoxes,
-            self.fwhm_TextBoxes
-            )
+        for cursor, mean_Value, max_Value in zip(self.integral_Cursors,
+                                                 *self.roi_Model.bar_Heights):
+            cursor.Update_Bars(mean_Value, max_Value, self.bars_On)
+
+        self.Submit_Fit()
+        if self.phasor_Plot is not None and self.phasor_Plot.isVisible():
+            self.Display_Phasors(stats[0])
+
+    def Display_Phasors(self, sums):
+        """
+        Phasor of every ROI at the laser repetition rate (the sync rate
+        times the sync divider), on the phasor plot.
+        """
+
+        frequency = self.sync_Rate * self.my_Pharp.hw_Settings.sync_Divider
+        if not self.phasor_Basis.Set_Frequency(
+                frequency, self.my_Pharp.resolution * 1e-12):
+            self.phasor_Plot.Clear("No sync")
+            return
+        g, s = self.phasor_Basis.Phasors(self.this_Data,
+                                         self.roi_Model.starts,
+                                         self.roi_Model.stops,
+                                         sums)
+        tau_Phase, _ = self.phasor_Basis.Lifetimes(g, s)
+        self.phasor_Plot.Update(g, s, self.roi_Model.colours, frequency,
+                                tau_Phase)
 
-        # Update the GUI
-        for ((this_Mean, this_Max, this_Max_Pos, this_FWHM),
-             mean_Box, max_Box, max_Pos_Box, fwhm_Box) in iterable:
-
-            # Check if normalization is turned on, and if so for which channel
-            if self.normalize_This < len(self.normalize_Buttons) - 1:
-                mean_Factor = integrals_Readings[self.normalize_This][0]
-                max_Factor = integrals_Readings[self.normalize_This][1]
-                zero_Time = integrals_Readings[self.normalize_This][2]
-
-                # Check for invalid normalization factors
-                if mean_Factor > 0:
-                    this_Mean /= mean_Factor
-                else:
-                    this_Mean = np.inf
-                if max_Factor > 0:
-                    this_Max /= max_Factor
-                else:
-                    this_Max = np.inf
-                    
-                this_Max_Pos -= zero_Time
-
-            # Finally, update the GUI
-            mean_Box.setText(f"{this_Mean:.3E}")
-            max_Box.setText(f"{this_Max:.3E}")
-            max_Pos_Box.setText(f"{this_Max_Pos:.3E}")
-            fwhm_Box.setText(f"{this_FWHM:.3E}")
+    def Submit_Fit(self):
+        """
+        Send the counts in the ROI being fitted to the fit worker (which
+        copies them). The fit happens on the worker's thread and comes back
+        in on_Fit_Result.
+        """
+
+        if self.ui.fit_Model.currentIndex() == 0 or not len(self.integral_Cursors):
+            return
+        row = self.ui.roi_View.currentIndex().row()
+        if row < 0:
+            row = 0
+        start = int(np.clip(self.roi_Model.starts[row], 0, len(self.this_Data)))
+        stop = int(np.clip(self.roi_Model.stops[row], start, len(self.this_Data)))
+        if (row, start, stop) != self.fit_ROI:
+            self.fit_ROI = (row, start, stop)
+            self.fit_Generation += 1
+            self.fit_Curve.clear()
+        self.fit_Worker.Submit(self.ui.fit_Model.currentText(),
+                               self.this_Data[start:stop],
+                               start,
+                               self.my_Pharp.resolution * 1e-12,
+                               tag=self.fit_Generation)
+
+    def on_Fit_Result(self, result):
+        """
+        Draw the fit and show its parameters (and how long it took).
+        """
+
+        # Turned off, or the model or ROI changed, since this was sent.
+        if result["tag"] != self.fit_Generation:
+            return
+        self.logger.debug(f"Fit of frame {result['frame']}: {result['values']} "
+                          f"in {result['fit_Time'] * 1e3:.1f}ms")
+        if not result["success"]:
+            self.ui.fit_Label.setText(f"Fit failed: {result['message']}")
+            return
+
+        start = result["start"]
+        curve = result["curve"]
+        if self.ui.option_LogY.isChecked():
+            curve = np.log10(curve, where=curve > 0, out=np.zeros(len(curve)))
+        self.fit_Curve.setData(self.x_Data[start:start + len(curve)], curve)
+
+        parameters = ", ".join(f"{name} {value:.3E}"
+                               for name, value in result["values"].items())
+        self.ui.fit_Label.setText(
+            f"{parameters} ({result['fit_Time'] * 1e3:.1f}ms, "
+            f"{result['skipped']} frames skipped)")
+
+    def on_Fit_Model(self, model_Name):
+        """
+        Fitting turned on/off or a different model chosen.
+        """
+
+        self.logger.info(f"Fit model {model_Name}")
+        self.fit_Generation += 1
+        self.fit_Curve.clear()
+        self.ui.fit_Label.setText("")
+        if self.ui.fit_Model.currentIndex() == 0:
+            if self.fit_Curve.scene() is not None:
+                self.ui.graph_Widget.removeItem(self.fit_Curve)
+        elif self.integrals_On:
+            self.Draw_Integrals()
+
+    def on_Load_IRF(self):
+        """
+        Load a histogram saved of the instrument response, to fit lifetimes
+        reconvolved with it (see lifetime_Fitting). Replaces any IRF loaded
+        before.
+        """
+
+        filename, _ = QtWidgets.QFileDialog.getOpenFileName(
+            self, "Load IRF", "", "Histograms (*.csv);;All files (*)")
+        if not filename:
+            return
+        try:
+            bins, counts = lifetime_Fitting.Load_Histogram(filename)
+            new_Models = [lifetime_Fitting.Reconvolution_Model(counts, n)
+                          for n in (1, 2)]
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"Couldn't load IRF {filename}: {e}")
+            return
+
+        resolution = self.my_Pharp.resolution * 1e-12
+        if len(bins) > 1 and not np.isclose(bins[1] - bins[0], resolution):
+            self.logger.warning(f"IRF bins are {bins[1] - bins[0]:.3E}s, "
+                                f"histogram bins are {resolution:.3E}s")
+        self.logger.info(f"Loaded IRF {filename}")
+
+        for model in new_Models:
+            if model.name not in curve_Fitting.models:
+                self.ui.fit_Model.addItem(model.name)
+            curve_Fitting.models[model.name] = model
+        # Start the current fit again if it was using the old IRF.
+        if self.ui.fit_Model.currentText() in [model.name
+                                                for model in new_Models]:
+            self.on_Fit_Model(self.ui.fit_Model.currentText())
+
+    def on_Phasor_Button(self):
+        """
+        Show the phasor plot window (it's updated along with the integrals
+        while it's open).
+        """
+
+        if self.phasor_Plot is None:
+            self.phasor_Plot = phasor_Analysis.Phasor_Plot(self)
+            self.phasor_Plot.resize(400, 300)
+        self.phasor_Plot.show()
+        self.phasor_Plot.raise_()
 
     def on_Auto_Range(self):
         """
@@ -910,6 +1193,8 @@ class MyWindow(QtWidgets.QMainWindow):
         """
         # pyqtgraph has our back on this one!
         self.logger.debug("Auto range histogram")
+        # Back to showing the latest counts in count mode.
+        self.count_Follow = True
         self.ui.graph_Widget.plotItem.autoBtnClicked()
 
     def on_Bars_Button(self):
@@ -921,6 +1206,19 @@ class MyWindow(QtWidgets.QMainWindow):
         self.bars_On = self.ui.option_ShowBars.isChecked()
         self.pharppy_Config.sw_Settings.show_Bars = str(self.bars_On)
 
+    def on_Cumulative_Button(self):
+        """
+        Toggle adding each histogram on to the previous ones.
+        """
+
+        cumulative = self.ui.option_Cumulative.isChecked()
+        self.pharppy_Config.sw_Settings.cumulative_Mode = str(cumulative)
+        self.device_Manager.Set_Accumulate(cumulative)
+        # Histograms the GUI doesn't get round to drawing still need adding on
+        # if the Picoharp isn't adding them up itself.
+        self.render_Scheduler.Set_Accumulate(
+            cumulative and not self.my_Pharp.device_Accumulation)
+
     def on_Clear_Deltas(self):
         """
         Get rid of the current displayed deltas cursors without turning off
@@ -950,20 +1248,32 @@ class MyWindow(QtWidgets.QMainWindow):
         """
         # pyqtgraph has our back on this one too.
         self.logger.debug("Clear histogram")
-        self.ui.graph_Widget.plotItem.clear()
+        self.histogram_Curve.clear()
+        self.n_Plot_Bins = None
+        self.histogram_Pyramid.Clear()
+        self.render_Scheduler.Clear()
+        self.this_Data[:] = 0
+        # Including the one being added up on the Picoharp in cumulative mode.
+        self.device_Manager.Clear_Histograms()
 
     def on_Clear_Intervals(self):
         """
         Clear the interval cursors from the plot.
         """
 
-        # So the first interval displayed after clikcing this is the first
-        # one in the list
         self.click_Number = 0
 
-        # Move all the interval lines to zero. (i.e. hide them)
+        # Take them all off the plot and forget them, the next click starts
+        # a new list.
         for cursor in self.integral_Cursors:
-            cursor.Reset_Remove()
+            cursor.Remove_From_Plot()
+        self.integral_Cursors = []
+        self.roi_Model.Clear()
+        self.fit_Generation += 1
+        self.fit_ROI = None
+        self.fit_Curve.clear()
+        if self.phasor_Plot is not None:
+            self.phasor_Plot.Clear()
 
     def on_Click_Deltas(self, coords):
         """
@@ -989,16 +1299,25 @@ class MyWindow(QtWidgets.QMainWindow):
 
     def on_Click_Integrals(self, coords):
         """
-        Draw the lines where the click was. Update the GUI co-ordinates
-        corresponding to the click number.
+        Add a new integral cursor (and row in the table) where the click was.
         """
 
-        this_Cursor = self.integral_Cursors[self.click_Number]
-        this_Cursor.coords = (coords.x(), coords.y())
-        this_Cursor.width = self.pharppy_Config.sw_Settings.integral_Width
+        n_Cursors = len(self.integral_Cursors)
+        # The usual colours first, then as many more as it takes.
+        if n_Cursors < len(self.palette):
+            colour = self.palette[n_Cursors]
+        else:
+            colour = pyqtgraph.intColor(n_Cursors, hues=13)
+        width = self.pharppy_Config.sw_Settings.integral_Width
 
-        # Advance click number through values 0, 1, 2, 3 repeating.
-        self.click_Number = (self.click_Number + 1) % 4
+        this_Cursor = graph_Markers.Integral_Cursor(
+            self.ui.graph_Widget,
+            colour)
+        this_Cursor.coords = (coords.x(), coords.y())
+        this_Cursor.width = width
+        this_Cursor.Add_To_Plot()
+        self.integral_Cursors.append(this_Cursor)
+        self.roi_Model.Add_ROI(coords.x(), width, colour)
 
     def on_Deltas_Button(self):
         """
@@ -1030,8 +1349,8 @@ class MyWindow(QtWidgets.QMainWindow):
         self.ui.cursors_Tabber UI object. If it's set for deltas, clicking puts
         down one of two cursors and the X and Y different are written to text
         boxes.
-        If it's set for integrals, pairs of cursors are placed (up to 4) and
-        the bin values between them are summed (live).
+        If it's set for integrals, each click places a new pair of cursors
+        and the bin values between them are summed (live).
         """
 
         # Get the xy coordinates of the click.
@@ -1062,12 +1381,17 @@ class MyWindow(QtWidgets.QMainWindow):
         self.ui.current_X.setText(f"{coords.x():3E}")
         self.ui.current_Y.setText(f"{coords.y():.0f}")
 
-        # Hack. For some reason the cursor moving removes any bars that the
-        # cursor overlaps. This way at least they're only missing for
-        if self.bars_On and self.integrals_On:
-            for cursor in self.integral_Cursors:
-                cursor.Remove_Bars()
-                cursor.Add_Bars()
+    def closeEvent(self, event):
+        """
+        Make sure the count archive is all on disk, and the fitting and
+        acquisition threads stopped (and the devices closed), before going.
+        """
+        if self.count_Archive is not None:
+            self.count_Archive.Flush()
+        self.fit_Worker.Stop()
+        if self.device_Manager is not None:
+            self.device_Manager.Stop()
+        super().closeEvent(event)
 
 if __name__ == "__main__":
     app = QtWidgets.QApplication([])
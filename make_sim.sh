@@ -0,0 +1,3 @@
+#!/bin/sh
+
+gcc -O2 -Wall -shared -fPIC -o sim/phlib_sim.so sim/phlib_sim.c -lm -lpthread
@@ -0,0 +1,192 @@
+"""
+Phasor (frequency domain) lifetime analysis of the integral cursors' ROIs.
+
+Each ROI's decay is turned into one point (g, s), its first Fourier
+component at the laser repetition frequency over its total counts. A single
+exponential lands on the semicircle from (0, 0) to (1, 0), further round
+the shorter its lifetime, mixtures land inside it. No fitting, just a dot
+product per ROI with a cos and sin table made once per frequency, so it's
+cheap enough to do every frame for every ROI.
+
+The repetition frequency is the sync (ch0) count rate, which is counted
+after the sync divider, times the divider. For the numbers to mean anything
+each ROI wants to start at the rise of its decay and be about one laser
+period long.
+"""
+
+# pylint: disable=C0103
+
+from PyQt5 import QtCore
+import numpy as np
+import pyqtgraph
+
+
+class Phasor_Basis():
+    """
+    cos and sin of 2 pi f t for every bin of the histogram (t = bin *
+    resolution, like the plot), rebuilt only when the frequency or
+    resolution change. The sync rate wobbles a bit from one reading to the
+    next, changes smaller than tolerance (relative) don't count.
+    """
+
+    def __init__(self, n_Bins=65536, harmonic=1, tolerance=1e-4):
+        self.n_Bins = n_Bins
+        self.harmonic = harmonic
+        self.tolerance = tolerance
+        self.frequency = 0
+        self.resolution = 0
+        # Rows cos and sin, so one matrix product per ROI does both.
+        self.basis = np.zeros((2, n_Bins))
+
+    @property
+    def omega(self):
+        return 2 * np.pi * self.harmonic * self.frequency
+
+    def Set_Frequency(self, frequency, resolution):
+        """
+        Repetition frequency (Hz) and width of a bin (s). Returns whether
+        there's a usable frequency.
+        """
+
+        if frequency <= 0:
+            self.frequency = 0
+            return False
+        if (resolution == self.resolution
+                and abs(frequency - self.frequency)
+                <= self.tolerance * frequency):
+            return True
+
+        self.frequency = frequency
+        self.resolution = resolution
+        phase = self.omega * resolution * np.arange(self.n_Bins)
+        np.cos(phase, out=self.basis[0])
+        np.sin(phase, out=self.basis[1])
+        return True
+
+    def Phasors(self, data, starts, stops, sums):
+        """
+        g and s of each ROI starts[i] to stops[i] - 1 of data, with sums
+        the total counts in each (as roi_Stats.Stats_Many already has
+        them). Time in each ROI counts from its start, so the table's
+        phase is turned back by its start. Empty ROIs have no phasor, they
+        get nan.
+        """
+
+        n_ROIs = len(starts)
+        components = np.zeros((2, n_ROIs))
+        for i, (start, stop) in enumerate(zip(starts, stops)):
+            start = min(max(int(start), 0), len(data))
+            stop = min(max(int(stop), start), len(data))
+            components[:, i] = self.basis[:, start:stop] @ data[start:stop]
+
+        phase = self.omega * self.resolution * np.asarray(starts)
+        cos_Phase = np.cos(phase)
+        sin_Phase = np.sin(phase)
+        sums = np.asarray(sums, dtype=np.float64)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            g = np.where(sums > 0, (components[0] * cos_Phase
+                                    + components[1] * sin_Phase) / sums,
+                         np.nan)
+            s = np.where(sums > 0, (components[1] * cos_Phase
+                                    - components[0] * sin_Phase) / sums,
+                         np.nan)
+        return g, s
+
+    def Lifetimes(self, g, s):
+        """
+        The single exponential lifetimes (s) that would give these phasors'
+        phase (s / g) and modulation (their length). The same if it really
+        is a single exponential, otherwise they bracket the lifetimes.
+        nan where there's no phasor, or it's not in the right half of the
+        plot (g <= 0) for there to be a lifetime.
+        """
+
+        g = np.asarray(g, dtype=np.float64)
+        s = np.asarray(s, dtype=np.float64)
+        # nan compares False, so empty ROIs are left out too.
+        valid = g > 0
+        tau_Phase = np.full(len(g), np.nan)
+        tau_Modulation = np.full(len(g), np.nan)
+        g = g[valid]
+        s = s[valid]
+        tau_Phase[valid] = s / (self.omega * g)
+        tau_Modulation[valid] = (np.sqrt(np.maximum(1 / (g**2 + s**2) - 1, 0))
+                                 / self.omega)
+        return tau_Phase, tau_Modulation
+
+
+class Phasor_Plot(pyqtgraph.PlotWidget):
+    """
+    A window of its own (closed along with its parent) with the universal
+    semicircle and a dot per ROI in the ROI's colour.
+    """
+
+    def __init__(self, parent=None):
+        pyqtgraph.PlotWidget.__init__(self, parent)
+        self.setWindowFlags(QtCore.Qt.Window)
+        self.setWindowTitle("Phasor")
+        self.setLabel("bottom", "g")
+        self.setLabel("left", "s")
+        self.setAspectLocked(True)
+        self.showGrid(x=True, y=True)
+        self.setXRange(0, 1)
+        self.setYRange(0, 0.6)
+
+        angles = np.linspace(0, np.pi, 200)
+        self.plot(0.5 + 0.5 * np.cos(angles), 0.5 * np.sin(angles),
+                  pen=pyqtgraph.mkPen("w", style=QtCore.Qt.DashLine))
+        self.points = pyqtgraph.ScatterPlotItem(size=10)
+        self.addItem(self.points)
+
+    def Update(self, g, s, colours, frequency, tau_Phase):
+        """
+        Move the dots to (g, s), colours being the ROIs' QColors, and list
+        each ROI's phase lifetime (s) in the title. ROIs without a phasor
+        (nan, e.g. empty) get no dot, and "-" for a lifetime.
+        """
+        shown = np.flatnonzero(np.isfinite(g) & np.isfinite(s))
+        self.points.setData(np.asarray(g)[shown], np.asarray(s)[shown],
+                            brush=[colours[i] for i in shown], pen=None)
+        lifetimes = ", ".join(
+            f"{i + 1}: {tau * 1e9:.2f}ns" if np.isfinite(tau)
+            else f"{i + 1}: \u2013"
+            for i, tau in enumerate(tau_Phase))
+        self.setTitle(f"{frequency / 1e6:.3f} MHz  {lifetimes}")
+
+    def Clear(self, message=""):
+        self.points.clear()
+        self.setTitle(message)
+
+
+if __name__ == "__main__":
+    import time
+
+    rng = np.random.default_rng(0)
+    resolution = 4e-12
+    frequency = 40e6
+    # Single exponentials, decays repeated every laser period, ROIs a
+    # period long starting at the rise.
+    period_Bins = int(round(1 / (frequency * resolution)))
+    t = np.arange(65536)
+    taus = np.array([0.5e-9, 2e-9, 4e-9])
+    starts = np.array([1000, 20000, 40000])
+    stops = starts + period_Bins
+    histogram = np.zeros(65536, dtype=np.int64)
+    for tau, start, stop in zip(taus, starts, stops):
+        since = (t[start:stop] - start) * resolution
+        decay = np.zeros_like(since)
+        # The tails of the earlier pulses too.
+        for n in range(20):
+            decay += np.exp(-(since + n / frequency) / tau)
+        histogram[start:stop] = rng.poisson(1000 * decay)
+
+    basis = Phasor_Basis()
+    basis.Set_Frequency(frequency, resolution)
+    sums = np.array([histogram[a:b].sum() for a, b in zip(starts, stops)])
+    start_Time = time.perf_counter()
+    g, s = basis.Phasors(histogram, starts, stops, sums)
+    print(f"{len(starts)} ROIs in "
+          f"{(time.perf_counter() - start_Time) * 1e3:.2f}ms")
+    for tau, tau_Phase, tau_Modulation in zip(taus, *basis.Lifetimes(g, s)):
+        print(f"tau {tau:.2e}: phase {tau_Phase:.3e}, "
+              f"modulation {tau_Modulation:.3e}")
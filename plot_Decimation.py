@@ -0,0 +1,155 @@
+"""
+Cuts a histogram down to about as many points as there are pixels to draw
+it in, before handing it to pyqtgraph.
+
+A 65536 bin histogram drawn a couple of thousand pixels wide puts dozens of
+bins in every pixel, and only the highest and lowest of those can be seen
+anyway. So each pixel's worth of bins is replaced by its min and max (drawn
+as a vertical line), which keeps narrow peaks exactly as tall as they are,
+unlike just taking every n'th bin.
+"""
+
+# pylint: disable=C0103
+
+import numpy as np
+
+
+def Filled_Length(data, start=0, chunk=4096):
+    """
+    Number of bins of data up to and including the last one that isn't
+    zero, or start if all the bins from start on are. Goes back from the
+    end a chunk at a time, so it stops as soon as it finds one and never
+    needs more than a chunk's worth of indices.
+    """
+
+    stop = len(data)
+    while stop > start:
+        block_Start = max(start, stop - chunk)
+        block = data[block_Start:stop]
+        if block.any():
+            return block_Start + int(np.flatnonzero(block)[-1]) + 1
+        stop = block_Start
+    return start
+
+
+class MinMax_Pyramid():
+    """
+    The min and max of every 2, 4, 8... bins of some data, worked out once
+    (for each new histogram) so any zoom level can be drawn without going
+    through the whole histogram again.
+
+    Make one (with the most bins it will ever need), then Update() it with
+    each new histogram. Every level is allocated up front and reused, and
+    the data is copied in, so it's free to change after Update.
+    """
+
+    def __init__(self, n_Max=65536, dtype=np.float64):
+        self.n_Max = n_Max
+        self.n_Bins = 0
+        self.data = np.zeros(n_Max, dtype=dtype)
+        # One buffer each per level, each half (rounded up) the one below.
+        self.mins = [None]
+        self.maxs = [None]
+        n = n_Max
+        while n > 1:
+            n = (n + 1) // 2
+            self.mins.append(np.zeros(n, dtype=dtype))
+            self.maxs.append(np.zeros(n, dtype=dtype))
+        # levels[k] is (min, max) of each block of 2**k bins.
+        self.levels = []
+
+    def Update(self, data):
+        if len(data) > self.n_Max:
+            raise ValueError(f"{len(data)} bins, pyramid only has room for "
+                             f"{self.n_Max}")
+        n = self.n_Bins = len(data)
+        np.copyto(self.data[:n], data)
+        self.levels = [(self.data[:n], self.data[:n])]
+        k = 0
+        while n > 1:
+            mins, maxs = self.levels[k]
+            k += 1
+            pairs = n // 2
+            n = (n + 1) // 2
+            np.minimum(mins[0:2 * pairs:2], mins[1:2 * pairs:2],
+                       out=self.mins[k][:pairs])
+            np.maximum(maxs[0:2 * pairs:2], maxs[1:2 * pairs:2],
+                       out=self.maxs[k][:pairs])
+            if n > pairs:
+                # Odd one out at the end is a block on its own.
+                self.mins[k][pairs] = mins[-1]
+                self.maxs[k][pairs] = maxs[-1]
+            self.levels.append((self.mins[k][:n], self.maxs[k][:n]))
+
+    def Clear(self):
+        self.n_Bins = 0
+        self.levels = []
+
+    def View(self, start=0, stop=None, n_Pixels=1000):
+        """
+        Points to draw bins start to stop with, when they are going to be
+        n_Pixels across on screen. Returns (bins, values): bins are the
+        indices of the (first) bin each point belongs to, so the x values
+        can be looked up. With at least one bin per pixel there's a min and
+        a max point per block of bins, otherwise every bin is returned as it
+        is. Both are new arrays (pyqtgraph keeps hold of what it's given),
+        but only about 2 * n_Pixels long.
+        """
+
+        if stop is None or stop > self.n_Bins:
+            stop = self.n_Bins
+        start = max(0, min(start, stop))
+        n_Bins = stop - start
+
+        # The biggest blocks that still give at least one per pixel.
+        level = 0
+        while (level + 1 < len(self.levels)
+               and n_Bins >> (level + 1) >= n_Pixels):
+            level += 1
+
+        if level == 0:
+            return np.arange(start, stop), self.levels[0][0][start:stop].copy()
+
+        first = start >> level
+        last = -(-stop >> level)
+        mins, maxs = self.levels[level]
+        bins = np.repeat(np.arange(first, last) << level, 2)
+        values = np.empty(len(bins), dtype=mins.dtype)
+        values[0::2] = mins[first:last]
+        values[1::2] = maxs[first:last]
+        return bins, values
+
+
+if __name__ == "__main__":
+    import time
+
+    rng = np.random.default_rng(0)
+    histogram = rng.poisson(100, 65536).astype(np.float64)
+    # A peak one bin wide, which every n'th bin would miss.
+    histogram[12345] = 10000
+
+    pyramid = MinMax_Pyramid()
+    start_Time = time.perf_counter()
+    pyramid.Update(histogram)
+    build_Time = time.perf_counter() - start_Time
+    bins, values = pyramid.View(0, 65536, 1500)
+    print(f"{len(values)} points instead of 65536, max {values.max()} "
+          f"(built in {build_Time * 1e3:.2f}ms)")
+    bins, values = pyramid.View(12000, 12500, 1500)
+    print(f"Zoomed in: {len(values)} points")
+
+    # Odd lengths, against working each block out directly.
+    for n in (1, 2, 3, 1001, 65535):
+        pyramid.Update(histogram[:n])
+        for level, (mins, maxs) in enumerate(pyramid.levels):
+            blocks = [histogram[i:min(i + (1 << level), n)]
+                      for i in range(0, n, 1 << level)]
+            assert np.array_equal(mins, [block.min() for block in blocks])
+            assert np.array_equal(maxs, [block.max() for block in blocks])
+    print("Odd lengths OK")
+
+    histogram[:] = 0
+    assert Filled_Length(histogram) == 0
+    histogram[[10, 40000]] = 1
+    assert Filled_Length(histogram) == 40001
+    assert Filled_Length(histogram, 50000) == 50000
@@ -0,0 +1,112 @@
+"""
+Limits how often histograms get drawn, whatever rate they arrive at.
+
+Every histogram from the acquisition thread used to queue up its own signal
+to the GUI, so if drawing took longer than acquiring (short acquisition
+times, dragging the plot about, lots of integrals) they piled up and the
+display got further and further behind. Instead they're posted into a
+mailbox here, straight from the acquisition thread, and a timer in the GUI
+thread takes whatever is in it a capped number of times a second.
+"""
+
+# pylint: disable=C0103
+
+import threading
+
+from PyQt5 import QtCore
+import numpy as np
+
+
+class Render_Scheduler(QtCore.QObject):
+    """
+    Holds at most one frame (ring_Buffers.Frame) waiting to be drawn. A
+    frame that arrives before the last one was drawn replaces it (dropped),
+    or when the histograms are being added up on the PC, is added on to it
+    (merged) so no counts go missing.
+
+    Frames Put() in belong to the scheduler from then on, and are either
+    released here (dropped/merged) or handed on to the one receiver of
+    frame_Signal, which then has to release them.
+    """
+
+    # Emitted in the GUI thread, at most max_FPS times a second.
+    frame_Signal = QtCore.pyqtSignal(object)
+
+    def __init__(self, max_FPS=30):
+        QtCore.QObject.__init__(self)
+
+        # Set when each frame is only the counts since the last one and they
+        # need adding up (cumulative mode with no help from the device),
+        # rather than a whole histogram that supersedes the last.
+        self.accumulate = False
+
+        self.pending = None
+        self.shown_Count = 0
+        self.dropped_Count = 0
+        self.merged_Count = 0
+        self._lock = threading.Lock()
+
+        self.timer = QtCore.QTimer(self)
+        self.timer.timeout.connect(self.on_Timer)
+        self.Set_Max_FPS(max_FPS)
+        self.timer.start()
+
+    def Set_Max_FPS(self, max_FPS):
+        self.timer.setInterval(int(1000 / max(max_FPS, 1)))
+
+    def Set_Accumulate(self, accumulate):
+        with self._lock:
+            self.accumulate = accumulate
+
+    def Put(self, frame):
+        """
+        Post a frame to be drawn. Safe to call from any thread, never waits
+        for the GUI.
+        """
+
+        with self._lock:
+            previous = self.pending
+            if previous is None:
+                self.pending = frame
+                return
+            if self.accumulate:
+                # Frames are read only once sent, so the sum goes in a new
+                # one from the same pool.
+                self.pending = frame.pool.Lease()
+                np.add(previous.data, frame.data, out=self.pending.data)
+                frame.pool.Publish(self.pending)
+                self.merged_Count += 1
+                frame.Release()
+            else:
+                self.pending = frame
+                self.dropped_Count += 1
+        previous.Release()
+
+    def Clear(self):
+        """
+        Forget any frame waiting to be drawn (e.g. the histogram has just
+        been cleared so it's out of date)
+        """
+        with self._lock:
+            frame = self.pending
+            self.pending = None
+        if frame is not None:
+            frame.Release()
+
+    def Stats(self):
+        return {"shown": self.shown_Count,
+                "dropped": self.dropped_Count,
+                "merged": self.merged_Count}
+
+    def on_Timer(self):
+        with self._lock:
+            frame = self.pending
+            self.pending = None
+        if frame is None:
+            return
+        self.shown_Count += 1
+        self.frame_Signal.emit(frame)
+
+    def Stop(self):
+        self.timer.stop()
+        self.Clear()
@@ -0,0 +1,277 @@
+"""
+Preallocated numpy ring buffers (and a pool of reusable histogram frames)
+for data that arrives faster or for longer than it makes sense to keep
+allocating.
+"""
+
+# pylint: disable=C0103
+
+import logging
+import threading
+
+import numpy as np
+
+
+class Record_Ring():
+    """
+    Ring buffer of uint32 TTTR records, written by one thread (draining the
+    Picoharp FIFO) and read by another.
+
+    The writer asks for somewhere to put the next block with Reserve(), has
+    the dll fill it directly, then hands it back with Commit(). Blocks go
+    straight into the ring whenever there's a contiguous block's worth of
+    free space before the end, otherwise into a scratch block that is
+    copied in (wrapping round) on Commit.
+
+    The writer never waits for the reader: the device FIFO has to be
+    drained whatever happens, so if the reader falls a whole ring behind the
+    oldest records are dropped (only as many as the records actually
+    written need room for) and counted in lost_Count.
+    """
+
+    def __init__(self, capacity=2**24, block_Size=131072):
+        """
+        capacity is rounded up to a whole number of blocks. block_Size
+        should be the number of records the writer asks the dll for in one
+        go (TTREADMAX for the Picoharp).
+        """
+
+        n_Blocks = max(1, -(-capacity // block_Size))
+        self.block_Size = block_Size
+        self.capacity = n_Blocks * block_Size
+        self.records = np.zeros(self.capacity, dtype=np.uint32)
+        self.scratch = np.zeros(block_Size, dtype=np.uint32)
+
+        # Totals since the ring was made (or Reset), positions in the ring
+        # are these modulo capacity.
+        self.write_Count = 0
+        self.read_Count = 0
+        self.lost_Count = 0
+        # Most records ever waiting to be read, to see how close the reader
+        # has come to falling behind.
+        self.max_Fill = 0
+
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        """
+        Number of records waiting to be read.
+        """
+        return self.write_Count - self.read_Count
+
+    def Reset(self):
+        with self._lock:
+            self.write_Count = 0
+            self.read_Count = 0
+            self.lost_Count = 0
+            self.max_Fill = 0
+
+    def Reserve(self):
+        """
+        Returns a block_Size uint32 array for the writer to fill. It's only
+        part of the ring itself if none of that part is unread, so the
+        reader never sees half written records. Otherwise it's the scratch
+        block, and how much unread data to drop is left to Commit, when
+        it's known how much was written.
+        """
+
+        with self._lock:
+            head = self.write_Count % self.capacity
+            free = self.capacity - (self.write_Count - self.read_Count)
+            if (head + self.block_Size <= self.capacity
+                    and free >= self.block_Size):
+                return self.records[head:head + self.block_Size]
+            return self.scratch
+
+    def Commit(self, block, n_Records):
+        """
+        The writer has put n_Records records at the start of block (which
+        came from Reserve).
+        """
+
+        if n_Records <= 0:
+            return
+
+        with self._lock:
+            if block is self.scratch:
+                overrun = (self.write_Count + n_Records
+                           - self.read_Count - self.capacity)
+                if overrun > 0:
+                    self.read_Count += overrun
+                    self.lost_Count += overrun
+                head = self.write_Count % self.capacity
+                n_End = min(n_Records, self.capacity - head)
+                self.records[head:head + n_End] = self.scratch[:n_End]
+                self.records[:n_Records - n_End] = self.scratch[n_End:n_Records]
+            self.write_Count += n_Records
+            self.max_Fill = max(self.max_Fill,
+                                self.write_Count - self.read_Count)
+
+    def Read(self, max_Records=None, out=None):
+        """
+        Returns (a copy of) the records written since the last Read, oldest
+        first, up to max_Records of them. If out is given the records are
+        copied into the start of it (and it sets max_Records if that's not
+        given) and a view of the filled part is returned.
+        """
+
+        if max_Records is None:
+            max_Records = self.capacity if out is None else len(out)
+
+        with self._lock:
+            n_Records = min(self.write_Count - self.read_Count, max_Records)
+            if out is None:
+                out = np.empty(n_Records, dtype=np.uint32)
+            tail = self.read_Count % self.capacity
+            n_End = min(n_Records, self.capacity - tail)
+            out[:n_End] = self.records[tail:tail + n_End]
+            out[n_End:n_Records] = self.records[:n_Records - n_End]
+            self.read_Count += n_Records
+
+        return out[:n_Records]
+
+
+
+class History_Ring():
+    """
+    The last capacity values of a few channels (e.g. the count rates), in a
+    preallocated array. Every value is stored twice, capacity apart, so the
+    latest n values of a channel are always one contiguous slice (a view,
+    no copying and no wrapping round to worry about) however long it has
+    been running.
+    """
+
+    def __init__(self, capacity=100000, n_Channels=2, dtype=np.int64):
+        self.capacity = capacity
+        self.values = np.zeros((n_Channels, 2 * capacity), dtype=dtype)
+        # Total number of values ever appended (since Clear)
+        self.n_Total = 0
+
+    def __len__(self):
+        return min(self.n_Total, self.capacity)
+
+    def Clear(self):
+        self.n_Total = 0
+
+    def Append(self, *values):
+        """
+        One value per channel.
+        """
+        head = self.n_Total % self.capacity
+        self.values[:, head] = values
+        self.values[:, head + self.capacity] = values
+        self.n_Total += 1
+
+    def Latest(self, n_Values=None):
+        """
+        View of the latest n_Values (all of them if not given) of every
+        channel, oldest first, shape (n_Channels, n). Only valid until the
+        next Append.
+        """
+        if n_Values is None or n_Values > len(self):
+            n_Values = len(self)
+        end = self.n_Total % self.capacity + self.capacity
+        return self.values[:, end - n_Values:end]
+
+
+class Frame():
+    """
+    One histogram's worth of buffer from a Frame_Pool. Whoever has a frame
+    has to Release() it when done with it, and can't use it after that. If
+    anything else needs to keep it too (say a second consumer) it calls
+    Retain() first, and the buffer only goes back in the pool when every
+    holder has released it.
+    """
+
+    def __init__(self, pool, data):
+        self.pool = pool
+        self.data = data
+        self.holders = 0
+
+    def Retain(self):
+        with self.pool.lock:
+            if self.holders <= 0:
+                raise RuntimeError("Frame retained after it was released")
+            self.holders += 1
+        return self
+
+    def Release(self):
+        with self.pool.lock:
+            if self.holders <= 0:
+                raise RuntimeError("Frame released more times than leased")
+            self.holders -= 1
+            if self.holders == 0:
+                self.pool.free.append(self)
+
+
+class Frame_Pool():
+    """
+    Fixed set of preallocated histogram buffers, handed out with Lease()
+    and given back by their Frame's Release(), so a steady stream of
+    histograms doesn't allocate anything.
+
+    Frames are leased writeable, filled (e.g. by the dll straight into
+    frame.data), then Publish()-ed before being sent anywhere, which makes
+    them read only: no receiver can change a histogram that something else
+    might be holding on to.
+    """
+
+    def __init__(self, n_Frames=8, n_Channels=65536, dtype=np.uint32):
+        self.logger = logging.getLogger("PHarp.Frames")
+        self.n_Channels = n_Channels
+        self.dtype = dtype
+        self.lock = threading.Lock()
+        self.free = [Frame(self, np.zeros(n_Channels, dtype=dtype))
+                     for _ in range(n_Frames)]
+        self.n_Frames = n_Frames
+
+    def Lease(self):
+        """
+        A free, writeable frame with one holder (the caller). If they're
+        all in use the pool grows rather than making the caller wait, which
+        should only happen if something is forgetting to release them.
+        """
+
+        with self.lock:
+            if self.free:
+                frame = self.free.pop()
+            else:
+                frame = None
+                self.n_Frames += 1
+        if frame is None:
+            self.logger.warning(f"Frame pool empty, now {self.n_Frames} "
+                                f"frames. Are they being released?")
+            frame = Frame(self, np.zeros(self.n_Channels, dtype=self.dtype))
+        frame.holders = 1
+        frame.data.flags.writeable = True
+        return frame
+
+    @staticmethod
+    def Publish(frame):
+        """
+        Make a filled frame read only before handing it on.
+        """
+        frame.data.flags.writeable = False
+        return frame
+
+
+if __name__ == "__main__":
+    ring = Record_Ring(capacity=10, block_Size=4)
+    for i in range(5):
+        block = ring.Reserve()
+        block[:3] = np.arange(3) + 10 * i
+        ring.Commit(block, 3)
+    print(ring.Read(), ring.lost_Count)
+
+    history = History_Ring(capacity=4)
+    for i in range(6):
+        history.Append(i, -i)
+    print(history.Latest(3))
+
+    pool = Frame_Pool(n_Frames=2, n_Channels=4)
+    frame = pool.Lease()
+    frame.data[:] = 1
+    Frame_Pool.Publish(frame).Retain()
+    frame.Release()
+    frame.Release()
+    print(len(pool.free), pool.Lease() is frame)
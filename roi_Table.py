@@ -0,0 +1,208 @@
+"""
+The integral cursors' regions of interest as a table, for a QTableView.
+
+There used to be four integral cursors, each with its own row of text boxes
+set one by one every frame. Here the ROIs are just arrays (where each
+starts and stops, and its colour), however many there are, their stats for
+each frame come in as arrays too (see roi_Stats.Stats_Many) and the
+view asks for whichever cells it's actually showing.
+"""
+
+# pylint: disable=C0103
+
+from PyQt5 import QtCore
+import numpy as np
+
+
+class ROI_Table_Model(QtCore.QAbstractTableModel):
+    """
+    Regions of interest on the histogram x axis and their stats. Positions
+    are in seconds (like the plot), resolution converts them to bins.
+
+    The "Ref" column has a checkbox to normalise the other ROIs to that one
+    (means, maxes and sums divided by its, max positions relative to its).
+    """
+
+    columns = ("Ref", "Start", "Stop", "Sum", "Mean", "Max", "Max Pos",
+               "FWHM")
+    # Columns that change every frame.
+    first_Stat_Column = 3
+
+    def __init__(self, resolution):
+        QtCore.QAbstractTableModel.__init__(self)
+
+        self._resolution = resolution
+        self.lefts = np.zeros(0)
+        self.rights = np.zeros(0)
+        self.colours = []
+        self.starts = np.zeros(0, dtype=np.int64)
+        self.stops = np.zeros(0, dtype=np.int64)
+        # Row everything is normalised to, None for not normalised.
+        self.reference = None
+
+        # Latest stats, as they come, then as shown (one row per ROI, one
+        # column per entry of columns)
+        self.stats = None
+        self.log_Y = False
+        self.values = np.zeros((0, len(self.columns)))
+        # Mean and max of every ROI on the same scale as the plot, not
+        # normalised, for the bars.
+        self.bar_Heights = (np.zeros(0), np.zeros(0))
+
+    @property
+    def resolution(self):
+        """
+        Width of a bin (s)
+        """
+        return self._resolution
+
+    @resolution.setter
+    def resolution(self, value):
+        self._resolution = value
+        self._Update_Bins()
+
+    def _Update_Bins(self):
+        # Truncated like Integral_Cursor does.
+        self.starts = (self.lefts / self._resolution).astype(np.int64)
+        self.stops = (self.rights / self._resolution).astype(np.int64)
+        self.stats = None
+        self._Update_Values()
+
+    def Add_ROI(self, centre, width, colour):
+        """
+        New ROI width wide around centre (both in s), drawn in colour (a
+        QColor). Returns its row.
+        """
+
+        row = len(self.lefts)
+        self.beginInsertRows(QtCore.QModelIndex(), row, row)
+        self.lefts = np.append(self.lefts, centre - width / 2)
+        self.rights = np.append(self.rights, centre + width / 2)
+        self.colours.append(colour)
+        self._Update_Bins()
+        self.endInsertRows()
+        return row
+
+    def Set_Widths(self, width):
+        """
+        Make every ROI width wide, keeping their centres.
+        """
+        centres = (self.lefts + self.rights) / 2
+        self.lefts = centres - width / 2
+        self.rights = centres + width / 2
+        self._Update_Bins()
+        self._Changed(0)
+
+    def Clear(self):
+        self.beginResetModel()
+        self.lefts = np.zeros(0)
+        self.rights = np.zeros(0)
+        self.colours = []
+        self.reference = None
+        self._Update_Bins()
+        self.endResetModel()
+
+    def Set_Stats(self, sums, means, maxes, peaks, fwhms, log_Y=False):
+        """
+        This frame's stats (from roi_Stats.Stats_Many with starts and
+        stops), peaks and fwhms in bins. With log_Y, means and maxes are
+        shown as log10 like the plot.
+        """
+        self.stats = (sums, means, maxes, peaks, fwhms)
+        self.log_Y = log_Y
+        self._Update_Values()
+        self._Changed(self.first_Stat_Column)
+
+    def _Update_Values(self):
+        """
+        Work out everything shown, for every ROI at once.
+        """
+
+        values = np.zeros((len(self.lefts), len(self.columns)))
+        values[:, 1] = self.lefts
+        values[:, 2] = self.rights
+        have_Stats = (self.stats is not None
+                      and len(self.stats[0]) == len(values))
+        if have_Stats:
+            sums, means, maxes, peaks, fwhms = self.stats
+            values[:, 3] = sums
+            with np.errstate(divide="ignore"):
+                values[:, 4] = np.log10(means) if self.log_Y else means
+                values[:, 5] = np.log10(maxes) if self.log_Y else maxes
+            values[:, 6] = self.lefts + (peaks - self.starts) * self._resolution
+            values[:, 7] = fwhms * self._resolution
+        self.bar_Heights = (values[:, 4].copy(), values[:, 5].copy())
+
+        if have_Stats and self.reference is not None:
+            reference = values[self.reference].copy()
+            with np.errstate(divide="ignore", invalid="ignore"):
+                for column in (3, 4, 5):
+                    if reference[column] > 0:
+                        values[:, column] /= reference[column]
+                    else:
+                        values[:, column] = np.inf
+            values[:, 6] -= reference[6]
+
+        self.values = values
+
+    def _Changed(self, first_Column):
+        """
+        Tell the view every row has changed, from first_Column on.
+        """
+        if len(self.values):
+            self.dataChanged.emit(
+                self.index(0, first_Column),
+                self.index(len(self.values) - 1, len(self.columns) - 1))
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.lefts)
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.columns)
+
+    def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
+        if role != QtCore.Qt.DisplayRole:
+            return None
+        if orientation == QtCore.Qt.Horizontal:
+            return self.columns[section]
+        return str(section + 1)
+
+    def flags(self, index):
+        flags = QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsSelectable
+        if index.column() == 0:
+            flags |= QtCore.Qt.ItemIsUserCheckable
+        return flags
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        row = index.row()
+        column = index.column()
+        if column == 0:
+            if role == QtCore.Qt.DecorationRole:
+                return self.colours[row]
+            if role == QtCore.Qt.CheckStateRole:
+                if row == self.reference:
+                    return QtCore.Qt.Checked
+                return QtCore.Qt.Unchecked
+            return None
+        if role == QtCore.Qt.DisplayRole:
+            return f"{self.values[row, column]:.3E}"
+        return None
+
+    def setData(self, index, value, role=QtCore.Qt.EditRole):
+        """
+        Ticking an ROI's Ref box normalises to it (and unticks any other),
+        unticking it goes back to not normalising.
+        """
+        if index.column() != 0 or role != QtCore.Qt.CheckStateRole:
+            return False
+        if value == QtCore.Qt.Checked:
+            self.reference = index.row()
+        elif index.row() == self.reference:
+            self.reference = None
+        self._Update_Values()
+        self._Changed(0)
+        return True
@@ -2,9 +2,10 @@
 
 # Form implementation generated from reading ui file 'settings_gui.ui'
 #
-# Created by: PyQt5 UI code generator 5.14.1
+# Created by: PyQt5 UI code generator 5.15.11
 #
-# WARNING! All changes made in this file will be lost!
+# WARNING: Any manual changes made to this file will be lost when pyuic5 is
+# run again.  Do not edit this file unless you know what you are doing.
 
 
 from PyQt5 import QtCore, QtGui, QtWidgets
@@ -274,199 +275,37 @@ class Ui_MainWindow(object):
         self.gridLayout_16.addWidget(self.button_ClearIntegrals, 0, 1, 1, 1)
         self.verticalLayout_2.addLayout(self.gridLayout_16)
         self.horizontalLayout_4.addLayout(self.verticalLayout_2)
-        spacerItem = QtWidgets.QSpacerItem(40, 20, QtWidgets.QSizePolicy.Expanding, QtWidgets.QSizePolicy.Minimum)
-        self.horizontalLayout_4.addItem(spacerItem)
-        self.gridLayout_13 = QtWidgets.QGridLayout()
-        self.gridLayout_13.setObjectName("gridLayout_13")
-        self.normalize_Magenta = QtWidgets.QRadioButton(self.tab_Integrals)
-        self.normalize_Magenta.setMaximumSize(QtCore.QSize(16777215, 14))
-        self.normalize_Magenta.setText("")
-        self.normalize_Magenta.setObjectName("normalize_Magenta")
-        self.gridLayout_13.addWidget(self.normalize_Magenta, 5, 8, 1, 1)
-        self.integral_Green = QtWidgets.QLineEdit(self.tab_Integrals)
-        self.integral_Green.setMinimumSize(QtCore.QSize(100, 0))
-        self.integral_Green.setMaximumSize(QtCore.QSize(100, 20))
-        font = QtGui.QFont()
-        font.setPointSize(12)
-        self.integral_Green.setFont(font)
-        self.integral_Green.setObjectName("integral_Green")
-        self.gridLayout_13.addWidget(self.integral_Green, 1, 3, 1, 2)
-        self.label_4 = QtWidgets.QLabel(self.tab_Integrals)
-        self.label_4.setMaximumSize(QtCore.QSize(16777215, 14))
-        self.label_4.setObjectName("label_4")
-        self.gridLayout_13.addWidget(self.label_4, 0, 5, 1, 1)
-        self.normalize_Blue = QtWidgets.QRadioButton(self.tab_Integrals)
-        self.normalize_Blue.setMaximumSize(QtCore.QSize(16777215, 14))
-        self.normalize_Blue.setText("")
-        self.normalize_Blue.setObjectName("normalize_Blue")
-        self.gridLayout_13.addWidget(self.normalize_Blue, 5, 6, 1, 1)
-        self.max_Blue = QtWidgets.QLineEdit(self.tab_Integrals)
-        self.max_Blue.setMinimumSize(QtCore.QSize(100, 0))
-        self.max_Blue.setMaximumSize(QtCore.QSize(100, 20))
-        font = QtGui.QFont()
-        font.setPointSize(12)
-        self.max_Blue.setFont(font)
-        self.max_Blue.setObjectName("max_Blue")
-        self.gridLayout_13.addWidget(self.max_Blue, 2, 5, 1, 2)
-        self.label_3 = QtWidgets.QLabel(self.tab_Integrals)
-        self.label_3.setMaximumSize(QtCore.QSize(16777215, 14))
-        self.label_3.setObjectName("label_3")
-        self.gridLayout_13.addWidget(self.label_3, 0, 3, 1, 1)
-        self.label_9 = QtWidgets.QLabel(self.tab_Integrals)
-        self.label_9.setMaximumSize(QtCore.QSize(16777215, 14))
-        self.label_9.setObjectName("label_9")
-        self.gridLayout_13.addWidget(self.label_9, 5, 0, 1, 1)
-        self.max_Red = QtWidgets.QLineEdit(self.tab_Integrals)
-        self.max_Red.setMinimumSize(QtCore.QSize(100, 0))
-        self.max_Red.setMaximumSize(QtCore.QSize(100, 20))
-        font = QtGui.QFont()
-        font.setPointSize(12)
-        self.max_Red.setFont(font)
-        self.max_Red.setObjectName("max_Red")
-        self.gridLayout_13.addWidget(self.max_Red, 2, 1, 1, 2)
-        self.fwhm_Green = QtWidgets.QLineEdit(self.tab_Integrals)
-        self.fwhm_Green.setMinimumSize(QtCore.QSize(100, 0))
-        self.fwhm_Green.setMaximumSize(QtCore.QSize(100, 20))
-        font = QtGui.QFont()
-        font.setPointSize(12)
-        self.fwhm_Green.setFont(font)
-        self.fwhm_Green.setObjectName("fwhm_Green")
-        self.gridLayout_13.addWidget(self.fwhm_Green, 4, 3, 1, 2)
-        self.fwhm_Blue = QtWidgets.QLineEdit(self.tab_Integrals)
-        self.fwhm_Blue.setMinimumSize(QtCore.QSize(100, 0))
-        self.fwhm_Blue.setMaximumSize(QtCore.QSize(100, 20))
-        font = QtGui.QFont()
-        font.setPointSize(12)
-        self.fwhm_Blue.setFont(font)
-        self.fwhm_Blue.setObjectName("fwhm_Blue")
-        self.gridLayout_13.addWidget(self.fwhm_Blue, 4, 5, 1, 2)
-        self.normalize_Red = QtWidgets.QRadioButton(self.tab_Integrals)
-        self.normalize_Red.setMaximumSize(QtCore.QSize(16777215, 14))
-        self.normalize_Red.setText("")
-        self.normalize_Red.setObjectName("normalize_Red")
-        self.gridLayout_13.addWidget(self.normalize_Red, 5, 2, 1, 1)
-        self.integral_Blue = QtWidgets.QLineEdit(self.tab_Integrals)
-        self.integral_Blue.setMinimumSize(QtCore.QSize(100, 0))
-        self.integral_Blue.setMaximumSize(QtCore.QSize(100, 20))
-        font = QtGui.QFont()
-        font.setPointSize(12)
-        self.integral_Blue.setFont(font)
-        self.integral_Blue.setObjectName("integral_Blue")
-        self.gridLayout_13.addWidget(self.integral_Blue, 1, 5, 1, 2)
-        self.label_11 = QtWidgets.QLabel(self.tab_Integrals)
-        self.label_11.setMaximumSize(QtCore.QSize(16777215, 14))
-        self.label_11.setObjectName("label_11")
-        self.gridLayout_13.addWidget(self.label_11, 4, 0, 1, 1)
-        self.max_Pos_Red = QtWidgets.QLineEdit(self.tab_Integrals)
-        self.max_Pos_Red.setMinimumSize(QtCore.QSize(100, 20))
-        self.max_Pos_Red.setMaximumSize(QtCore.QSize(100, 20))
-        font = QtGui.QFont()
-        font.setPointSize(12)
-        self.max_Pos_Red.setFont(font)
-        self.max_Pos_Red.setObjectName("max_Pos_Red")
-        self.gridLayout_13.addWidget(self.max_Pos_Red, 3, 1, 1, 2)
-        self.label_8 = QtWidgets.QLabel(self.tab_Integrals)
-        self.label_8.setMaximumSize(QtCore.QSize(16777215, 14))
-        self.label_8.setObjectName("label_8")
-        self.gridLayout_13.addWidget(self.label_8, 2, 0, 1, 1)
-        self.label_7 = QtWidgets.QLabel(self.tab_Integrals)
-        self.label_7.setMaximumSize(QtCore.QSize(16777215, 14))
-        self.label_7.setObjectName("label_7")
-        self.gridLayout_13.addWidget(self.label_7, 1, 0, 1, 1)
-        self.integral_Red = QtWidgets.QLineEdit(self.tab_Integrals)
-        self.integral_Red.setMinimumSize(QtCore.QSize(100, 0))
-        self.integral_Red.setMaximumSize(QtCore.QSize(100, 20))
-        font = QtGui.QFont()
-        font.setPointSize(12)
-        self.integral_Red.setFont(font)
-        self.integral_Red.setObjectName("integral_Red")
-        self.gridLayout_13.addWidget(self.integral_Red, 1, 1, 1, 2)
-        self.normalize_Green = QtWidgets.QRadioButton(self.tab_Integrals)
-        self.normalize_Green.setMaximumSize(QtCore.QSize(16777215, 14))
-        self.normalize_Green.setText("")
-        self.normalize_Green.setObjectName("normalize_Green")
-        self.gridLayout_13.addWidget(self.normalize_Green, 5, 4, 1, 1)
-        self.label_17 = QtWidgets.QLabel(self.tab_Integrals)
-        self.label_17.setObjectName("label_17")
-        self.gridLayout_13.addWidget(self.label_17, 3, 0, 1, 1)
-        self.max_Magenta = QtWidgets.QLineEdit(self.tab_Integrals)
-        self.max_Magenta.setMinimumSize(QtCore.QSize(100, 0))
-        self.max_Magenta.setMaximumSize(QtCore.QSize(100, 20))
-        font = QtGui.QFont()
-        font.setPointSize(12)
-        self.max_Magenta.setFont(font)
-        self.max_Magenta.setObjectName("max_Magenta")
-        self.gridLayout_13.addWidget(self.max_Magenta, 2, 7, 1, 2)
-        self.fwhm_Magenta = QtWidgets.QLineEdit(self.tab_Integrals)
-        self.fwhm_Magenta.setMinimumSize(QtCore.QSize(100, 0))
-        self.fwhm_Magenta.setMaximumSize(QtCore.QSize(100, 20))
-        font = QtGui.QFont()
-        font.setPointSize(12)
-        self.fwhm_Magenta.setFont(font)
-        self.fwhm_Magenta.setObjectName("fwhm_Magenta")
-        self.gridLayout_13.addWidget(self.fwhm_Magenta, 4, 7, 1, 2)
-        self.label = QtWidgets.QLabel(self.tab_Integrals)
-        self.label.setMaximumSize(QtCore.QSize(16777215, 14))
-        self.label.setObjectName("label")
-        self.gridLayout_13.addWidget(self.label, 0, 1, 1, 1)
-        self.max_Pos_Green = QtWidgets.QLineEdit(self.tab_Integrals)
-        self.max_Pos_Green.setMinimumSize(QtCore.QSize(100, 20))
-        self.max_Pos_Green.setMaximumSize(QtCore.QSize(100, 20))
-        font = QtGui.QFont()
-        font.setPointSize(12)
-        self.max_Pos_Green.setFont(font)
-        self.max_Pos_Green.setObjectName("max_Pos_Green")
-        self.gridLayout_13.addWidget(self.max_Pos_Green, 3, 3, 1, 2)
-        self.label_5 = QtWidgets.QLabel(self.tab_Integrals)
-        self.label_5.setMaximumSize(QtCore.QSize(16777215, 14))
-        self.label_5.setObjectName("label_5")
-        self.gridLayout_13.addWidget(self.label_5, 0, 7, 1, 1)
-        self.fwhm_Red = QtWidgets.QLineEdit(self.tab_Integrals)
-        self.fwhm_Red.setMinimumSize(QtCore.QSize(100, 0))
-        self.fwhm_Red.setMaximumSize(QtCore.QSize(100, 20))
-        font = QtGui.QFont()
-        font.setPointSize(12)
-        self.fwhm_Red.setFont(font)
-        self.fwhm_Red.setObjectName("fwhm_Red")
-        self.gridLayout_13.addWidget(self.fwhm_Red, 4, 1, 1, 2)
-        self.max_Pos_Magenta = QtWidgets.QLineEdit(self.tab_Integrals)
-        self.max_Pos_Magenta.setMinimumSize(QtCore.QSize(100, 20))
-        self.max_Pos_Magenta.setMaximumSize(QtCore.QSize(100, 20))
-        font = QtGui.QFont()
-        font.setPointSize(12)
-        self.max_Pos_Magenta.setFont(font)
-        self.max_Pos_Magenta.setObjectName("max_Pos_Magenta")
-        self.gridLayout_13.addWidget(self.max_Pos_Magenta, 3, 7, 1, 2)
-        self.normalize_Off = QtWidgets.QRadioButton(self.tab_Integrals)
-        self.normalize_Off.setMaximumSize(QtCore.QSize(16777215, 14))
-        self.normalize_Off.setChecked(True)
-        self.normalize_Off.setObjectName("normalize_Off")
-        self.gridLayout_13.addWidget(self.normalize_Off, 5, 9, 1, 1)
-        self.max_Green = QtWidgets.QLineEdit(self.tab_Integrals)
-        self.max_Green.setMinimumSize(QtCore.QSize(100, 0))
-        self.max_Green.setMaximumSize(QtCore.QSize(100, 20))
-        font = QtGui.QFont()
-        font.setPointSize(12)
-        self.max_Green.setFont(font)
-        self.max_Green.setObjectName("max_Green")
-        self.gridLayout_13.addWidget(self.max_Green, 2, 3, 1, 2)
-        self.max_Pos_Blue = QtWidgets.QLineEdit(self.tab_Integrals)
-        self.max_Pos_Blue.setMinimumSize(QtCore.QSize(100, 20))
-        self.max_Pos_Blue.setMaximumSize(QtCore.QSize(100, 20))
-        font = QtGui.QFont()
-        font.setPointSize(12)
-        self.max_Pos_Blue.setFont(font)
-        self.max_Pos_Blue.setObjectName("max_Pos_Blue")
-        self.gridLayout_13.addWidget(self.max_Pos_Blue, 3, 5, 1, 2)
-        self.integral_Magenta = QtWidgets.QLineEdit(self.tab_Integrals)
-        self.integral_Magenta.setMinimumSize(QtCore.QSize(100, 0))
-        self.integral_Magenta.setMaximumSize(QtCore.QSize(100, 20))
-        font = QtGui.QFont()
-        font.setPointSize(12)
-        self.integral_Magenta.setFont(font)
-        self.integral_Magenta.setObjectName("integral_Magenta")
-        self.gridLayout_13.addWidget(self.integral_Magenta, 1, 7, 1, 2)
-        self.horizontalLayout_4.addLayout(self.gridLayout_13)
+        self.verticalLayout_ROIs = QtWidgets.QVBoxLayout()
+        self.verticalLayout_ROIs.setObjectName("verticalLayout_ROIs")
+        self.roi_View = QtWidgets.QTableView(self.tab_Integrals)
+        self.roi_View.setObjectName("roi_View")
+        self.roi_View.verticalHeader().setDefaultSectionSize(20)
+        self.verticalLayout_ROIs.addWidget(self.roi_View)
+        self.horizontalLayout_Fit = QtWidgets.QHBoxLayout()
+        self.horizontalLayout_Fit.setObjectName("horizontalLayout_Fit")
+        self.fit_Model = QtWidgets.QComboBox(self.tab_Integrals)
+        self.fit_Model.setObjectName("fit_Model")
+        self.fit_Model.addItem("")
+        self.horizontalLayout_Fit.addWidget(self.fit_Model)
+        self.button_LoadIRF = QtWidgets.QPushButton(self.tab_Integrals)
+        self.button_LoadIRF.setObjectName("button_LoadIRF")
+        self.horizontalLayout_Fit.addWidget(self.button_LoadIRF)
+        self.button_PhasorPlot = QtWidgets.QPushButton(self.tab_Integrals)
+        self.button_PhasorPlot.setObjectName("button_PhasorPlot")
+        self.horizontalLayout_Fit.addWidget(self.button_PhasorPlot)
+        self.fit_Label = QtWidgets.QLabel(self.tab_Integrals)
+        sizePolicy = QtWidgets.QSizePolicy(QtWidgets.QSizePolicy.Expanding, QtWidgets.QSizePolicy.Preferred)
+        sizePolicy.setHorizontalStretch(1)
+        sizePolicy.setVerticalStretch(0)
+        sizePolicy.setHeightForWidth(self.fit_Label.sizePolicy().hasHeightForWidth())
+        self.fit_Label.setSizePolicy(sizePolicy)
+        self.fit_Label.setText("")
+        self.fit_Label.setTextInteractionFlags(QtCore.Qt.TextSelectableByMouse)
+        self.fit_Label.setObjectName("fit_Label")
+        self.horizontalLayout_Fit.addWidget(self.fit_Label)
+        self.verticalLayout_ROIs.addLayout(self.horizontalLayout_Fit)
+        self.horizontalLayout_4.addLayout(self.verticalLayout_ROIs)
+        self.horizontalLayout_4.setStretch(1, 1)
         self.cursors_Tabber.addTab(self.tab_Integrals, "")
         self.tab_Counts = QtWidgets.QWidget()
         self.tab_Counts.setObjectName("tab_Counts")
@@ -514,8 +353,8 @@ class Ui_MainWindow(object):
         self.option_Ch1_Counts.setObjectName("option_Ch1_Counts")
         self.gridLayout_9.addWidget(self.option_Ch1_Counts, 1, 2, 1, 1)
         self.gridLayout_12.addLayout(self.gridLayout_9, 0, 0, 1, 1)
-        spacerItem1 = QtWidgets.QSpacerItem(40, 20, QtWidgets.QSizePolicy.Expanding, QtWidgets.QSizePolicy.Minimum)
-        self.gridLayout_12.addItem(spacerItem1, 0, 1, 1, 1)
+        spacerItem = QtWidgets.QSpacerItem(40, 20, QtWidgets.QSizePolicy.Expanding, QtWidgets.QSizePolicy.Minimum)
+        self.gridLayout_12.addItem(spacerItem, 0, 1, 1, 1)
         self.groupBox_2 = QtWidgets.QGroupBox(self.tab_Counts)
         self.groupBox_2.setMinimumSize(QtCore.QSize(170, 0))
         self.groupBox_2.setMaximumSize(QtCore.QSize(170, 16777215))
@@ -553,8 +392,8 @@ class Ui_MainWindow(object):
         self.gridLayout_12.addWidget(self.groupBox_2, 0, 2, 1, 1)
         self.cursors_Tabber.addTab(self.tab_Counts, "")
         self.horizontalLayout_5.addWidget(self.cursors_Tabber)
-        spacerItem2 = QtWidgets.QSpacerItem(243, 88, QtWidgets.QSizePolicy.Expanding, QtWidgets.QSizePolicy.Minimum)
-        self.horizontalLayout_5.addItem(spacerItem2)
+        spacerItem1 = QtWidgets.QSpacerItem(243, 88, QtWidgets.QSizePolicy.Expanding, QtWidgets.QSizePolicy.Minimum)
+        self.horizontalLayout_5.addItem(spacerItem1)
         self.verticalLayout_7.addWidget(self.frame_3)
         self.gridLayout_2.addLayout(self.verticalLayout_7, 0, 0, 1, 1)
         self.verticalLayout_6 = QtWidgets.QVBoxLayout()
@@ -833,8 +672,8 @@ class Ui_MainWindow(object):
         self.verticalLayout_5.addWidget(self.button_Defaults)
         self.verticalLayout_4.addWidget(self.groupBox)
         self.verticalLayout_6.addWidget(self.frame)
-        spacerItem3 = QtWidgets.QSpacerItem(20, 40, QtWidgets.QSizePolicy.Minimum, QtWidgets.QSizePolicy.Expanding)
-        self.verticalLayout_6.addItem(spacerItem3)
+        spacerItem2 = QtWidgets.QSpacerItem(20, 40, QtWidgets.QSizePolicy.Minimum, QtWidgets.QSizePolicy.Expanding)
+        self.verticalLayout_6.addItem(spacerItem2)
         self.control_Warning_Tabber = QtWidgets.QTabWidget(self.centralwidget)
         sizePolicy = QtWidgets.QSizePolicy(QtWidgets.QSizePolicy.Fixed, QtWidgets.QSizePolicy.Fixed)
         sizePolicy.setHorizontalStretch(0)
@@ -966,12 +805,12 @@ class Ui_MainWindow(object):
         self.gridLayout_17.addWidget(self.warnings_Display, 0, 0, 1, 1)
         self.control_Warning_Tabber.addTab(self.warnings_Tab, "")
         self.verticalLayout_6.addWidget(self.control_Warning_Tabber)
-        self.label_171 = QtWidgets.QLabel(self.centralwidget)
-        self.label_171.setTextFormat(QtCore.Qt.RichText)
-        self.label_171.setScaledContents(False)
-        self.label_171.setWordWrap(False)
-        self.label_171.setObjectName("label_171")
-        self.verticalLayout_6.addWidget(self.label_171)
+        self.label_17 = QtWidgets.QLabel(self.centralwidget)
+        self.label_17.setTextFormat(QtCore.Qt.RichText)
+        self.label_17.setScaledContents(False)
+        self.label_17.setWordWrap(False)
+        self.label_17.setObjectName("label_17")
+        self.verticalLayout_6.addWidget(self.label_17)
         self.gridLayout_2.addLayout(self.verticalLayout_6, 0, 1, 1, 1)
         MainWindow.setCentralWidget(self.centralwidget)
 
@@ -998,16 +837,9 @@ class Ui_MainWindow(object):
         self.button_IntegralWidth.setText(_translate("MainWindow", "Apply"))
         self.option_ShowBars.setText(_translate("MainWindow", "Show Bars"))
         self.button_ClearIntegrals.setText(_translate("MainWindow", "Clear Markers"))
-        self.label_4.setText(_translate("MainWindow", "Blue"))
-        self.label_3.setText(_translate("MainWindow", "Green"))
-        self.label_9.setText(_translate("MainWindow", "Normalize:"))
-        self.label_11.setText(_translate("MainWindow", "Fit FWHM:"))
-        self.label_8.setText(_translate("MainWindow", "Max:"))
-        self.label_7.setText(_translate("MainWindow", "Mean:"))
-        self.label_17.setText(_translate("MainWindow", "Max Position:"))
-        self.label.setText(_translate("MainWindow", "Red"))
-        self.label_5.setText(_translate("MainWindow", "Magenta"))
-        self.normalize_Off.setText(_translate("MainWindow", "Off"))
+        self.fit_Model.setItemText(0, _translate("MainWindow", "No fit"))
+        self.button_LoadIRF.setText(_translate("MainWindow", "Load IRF"))
+        self.button_PhasorPlot.setText(_translate("MainWindow", "Phasor plot"))
         self.cursors_Tabber.setTabText(self.cursors_Tabber.indexOf(self.tab_Integrals), _translate("MainWindow", "Integrate"))
         self.label_14.setText(_translate("MainWindow", "<html><head/><body><p><span style=\" color:#00ff00;\">Ch 1 (signal)</span></p></body></html>"))
         self.label_13.setText(_translate("MainWindow", "<html><head/><body><p><span style=\" color:#ff0000;\">Ch 0 (sync)</span></p></body></html>"))
@@ -1056,5 +888,5 @@ class Ui_MainWindow(object):
         self.counts_Ch1_Label.setText(_translate("MainWindow", "Ch1 (signal)"))
         self.control_Warning_Tabber.setTabText(self.control_Warning_Tabber.indexOf(self.controls_Tab), _translate("MainWindow", "Controls"))
         self.control_Warning_Tabber.setTabText(self.control_Warning_Tabber.indexOf(self.warnings_Tab), _translate("MainWindow", "Warnings"))
-        self.label_171.setText(_translate("MainWindow", "<html><head/><body><p align=\"right\">Source code and some docs available at: <br/><a href=\"github.com/dldlowndes/LD_Pharppy\"><span style=\" text-decoration: underline; color:#007af4;\">github.com/dldlowndes/LD_Pharppy</span></a><br/>Version 1.0</p></body></html>"))
+        self.label_17.setText(_translate("MainWindow", "<html><head/><body><p align=\"right\">Source code and some docs available at: <br/><a href=\"github.com/dldlowndes/LD_Pharppy\"><span style=\" text-decoration: underline; color:#007af4;\">github.com/dldlowndes/LD_Pharppy</span></a><br/>Version 1.0</p></body></html>"))
 from pyqtgraph import PlotWidget
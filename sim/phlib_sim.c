@@ -0,0 +1,783 @@
+/*
+ * Simulated phlib (PicoHarp 300 library v3.0) for running LD_PharpDLL and
+ * LD_Pharp without a Picoharp plugged in.
+ *
+ * Build with make_sim.sh, then load it like the real library:
+ *     LD_PharpDLL.LD_PharpDLL(0, dll_Path="sim/phlib_sim.so")
+ * or point everything at it with PHLIB_PATH=sim/phlib_sim.so
+ *
+ * This implements the PH_* C ABI that LD_PharpDLL uses and tries to behave
+ * like the device does in the ways that matter for timing:
+ *   - measurements run in real time, PH_CTCStatus only reports done once
+ *     tacq has passed (or the histogram overflowed with stop on overflow),
+ *   - count rates come from a 100ms gate, so they only change every 100ms
+ *     and read 0 for the first 100ms after Initialize/SetSyncDiv/SetInputCFD,
+ *   - histograms fill at the simulated count rate for as long as the
+ *     measurement actually ran (so skipping PH_ClearHistMem accumulates),
+ *   - TTTR records are generated at a fixed rate into a finite FIFO which
+ *     overflows (FLAG_FIFOFULL) if it isn't read out fast enough.
+ *
+ * Environment variables:
+ *   PHSIM_DEVICES      number of devices that "exist" (default 1, max 8)
+ *   PHSIM_SYNC_RATE    sync rate before the divider, Hz (default 20e6)
+ *   PHSIM_COUNT_RATE   photon rate on input 1, Hz (default 1e5)
+ *   PHSIM_CALL_US      extra latency added to every device call, us, to
+ *                      mimic the USB round trip (default 0)
+ */
+
+#include <math.h>
+#include <pthread.h>
+#include <stdint.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <time.h>
+
+#define LIB_VERSION "3.0"
+#define MAXDEVNUM 8
+#define HISTCHAN 65536
+#define TTREADMAX 131072
+#define FIFO_SIZE (4 * TTREADMAX)
+#define MODE_HIST 0
+#define MODE_T2 2
+#define MODE_T3 3
+#define BINSTEPSMAX 8
+#define BASE_RESOLUTION 4.0
+#define GATE_TIME 0.1
+#define T2WRAPAROUND 210698240u
+#define T3WRAPAROUND 65536u
+
+#define FLAG_FIFOFULL 0x0003
+#define FLAG_OVERFLOW 0x0040
+
+#define WARNING_INP0_RATE_ZERO 0x0001
+#define WARNING_INP0_RATE_TOO_LOW 0x0002
+#define WARNING_INP0_RATE_TOO_HIGH 0x0004
+#define WARNING_INP1_RATE_ZERO 0x0010
+#define WARNING_INP1_RATE_TOO_HIGH 0x0040
+#define WARNING_INP_RATE_RATIO 0x0100
+#define WARNING_DIVIDER_GREATER_ONE 0x0200
+#define WARNING_TIME_SPAN_TOO_SMALL 0x0400
+
+#define ERROR_NONE 0
+#define ERROR_DEVICE_OPEN_FAIL -1
+#define ERROR_DEVICE_NOT_OPEN -10
+#define ERROR_INVALID_ARGUMENT -17
+#define ERROR_INVALID_MODE -18
+#define ERROR_NOT_INITIALIZED -22
+
+typedef struct {
+    int open;
+    int mode;
+    int initialized;
+    pthread_mutex_t lock;
+    uint64_t rng;
+
+    /* Settings */
+    int binning;
+    int sync_div;
+    int offset;
+    int cfd_level[2];
+    int cfd_zc[2];
+    int stop_ovfl;
+    int stop_count;
+
+    /* Measurement state */
+    int running;
+    int ctc_done;
+    int flags;
+    int tacq;
+    double start_time;
+    double stop_time;
+    double filled_until;
+
+    /* Count rate gate */
+    double gate_start;
+    int rates[2];
+
+    /* Histogram memory and the shape photons are drawn from */
+    uint32_t hist[HISTCHAN];
+    double *shape;
+    int shape_bins;
+    int shape_valid;
+
+    /* TTTR */
+    double fifo_until;
+    double fifo_level;
+    uint64_t tttr_photons;
+    uint64_t last_overflow;
+} sim_device;
+
+static sim_device devices[MAXDEVNUM];
+static pthread_once_t init_once = PTHREAD_ONCE_INIT;
+static int n_devices = 1;
+static double sync_rate = 20e6;
+static double count_rate = 1e5;
+static long call_us = 0;
+
+static const struct {
+    int code;
+    const char *text;
+} error_strings[] = {
+    {0, "ERROR_NONE"},
+    {-1, "ERROR_DEVICE_OPEN_FAIL"},
+    {-2, "ERROR_DEVICE_BUSY"},
+    {-10, "ERROR_DEVICE_NOT_OPEN"},
+    {-17, "ERROR_INVALID_ARGUMENT"},
+    {-18, "ERROR_INVALID_MODE"},
+    {-22, "ERROR_NOT_INITIALIZED"},
+};
+
+static const struct {
+    int bit;
+    const char *text;
+} warning_strings[] = {
+    {WARNING_INP0_RATE_ZERO,
+     "WARNING_INP0_RATE_ZERO:\nThe sync input rate is zero.\n"},
+    {WARNING_INP0_RATE_TOO_LOW,
+     "WARNING_INP0_RATE_TOO_LOW:\nThe sync input rate is very low.\n"},
+    {WARNING_INP0_RATE_TOO_HIGH,
+     "WARNING_INP0_RATE_TOO_HIGH:\nThe sync input rate is too high.\n"},
+    {WARNING_INP1_RATE_ZERO,
+     "WARNING_INP1_RATE_ZERO:\nThe input 1 rate is zero.\n"},
+    {WARNING_INP1_RATE_TOO_HIGH,
+     "WARNING_INP1_RATE_TOO_HIGH:\nThe input 1 rate is too high.\n"},
+    {WARNING_INP_RATE_RATIO,
+     "WARNING_INP_RATE_RATIO:\nThe input 1 rate is more than 5% of the "
+     "sync rate, expect pile-up.\n"},
+    {WARNING_DIVIDER_GREATER_ONE,
+     "WARNING_DIVIDER_GREATER_ONE:\nThe sync divider is greater than one "
+     "but the sync rate is low.\n"},
+    {WARNING_TIME_SPAN_TOO_SMALL,
+     "WARNING_TIME_SPAN_TOO_SMALL:\nThe histogram time span is shorter "
+     "than the sync period.\n"},
+};
+
+/* ------------------------------------------------------------------------
+ * Helpers
+ * --------------------------------------------------------------------- */
+
+static double now(void)
+{
+    struct timespec ts;
+    clock_gettime(CLOCK_MONOTONIC, &ts);
+    return ts.tv_sec + ts.tv_nsec * 1e-9;
+}
+
+static void sleep_seconds(double seconds)
+{
+    struct timespec ts;
+    if (seconds <= 0)
+        return;
+    ts.tv_sec = (time_t)seconds;
+    ts.tv_nsec = (long)((seconds - ts.tv_sec) * 1e9);
+    nanosleep(&ts, NULL);
+}
+
+static double env_double(const char *name, double fallback)
+{
+    const char *value = getenv(name);
+    return value ? atof(value) : fallback;
+}
+
+static void init_library(void)
+{
+    n_devices = (int)env_double("PHSIM_DEVICES", 1);
+    if (n_devices < 0)
+        n_devices = 0;
+    if (n_devices > MAXDEVNUM)
+        n_devices = MAXDEVNUM;
+    sync_rate = env_double("PHSIM_SYNC_RATE", 20e6);
+    count_rate = env_double("PHSIM_COUNT_RATE", 1e5);
+    call_us = (long)env_double("PHSIM_CALL_US", 0);
+    for (int i = 0; i < MAXDEVNUM; i++) {
+        pthread_mutex_init(&devices[i].lock, NULL);
+        devices[i].rng = 0x9E3779B97F4A7C15ull * (i + 1);
+    }
+}
+
+static uint64_t next_random(sim_device *dev)
+{
+    /* xorshift64* */
+    dev->rng ^= dev->rng >> 12;
+    dev->rng ^= dev->rng << 25;
+    dev->rng ^= dev->rng >> 27;
+    return dev->rng * 2685821657736338717ull;
+}
+
+static double uniform(sim_device *dev)
+{
+    return ((next_random(dev) >> 11) + 0.5) * (1.0 / 9007199254740992.0);
+}
+
+static double gaussian(sim_device *dev)
+{
+    return sqrt(-2.0 * log(uniform(dev))) * cos(2.0 * M_PI * uniform(dev));
+}
+
+static uint32_t poisson(sim_device *dev, double mean)
+{
+    if (mean <= 0)
+        return 0;
+    if (mean > 30) {
+        double value = mean + sqrt(mean) * gaussian(dev);
+        return value > 0 ? (uint32_t)(value + 0.5) : 0;
+    }
+    double limit = exp(-mean), product = uniform(dev);
+    uint32_t k = 0;
+    while (product > limit) {
+        product *= uniform(dev);
+        k++;
+    }
+    return k;
+}
+
+static double resolution(sim_device *dev)
+{
+    return BASE_RESOLUTION * (1 << dev->binning);
+}
+
+static double sync_period_ps(void)
+{
+    return sync_rate > 0 ? 1e12 / sync_rate : 0;
+}
+
+/* Rates that would be seen with the current settings (before gating) */
+static void true_rates(sim_device *dev, double *rate0, double *rate1)
+{
+    *rate0 = sync_rate / dev->sync_div;
+    /* A discriminator level set too high sees nothing */
+    *rate1 = dev->cfd_level[1] > 700 ? 0 : count_rate;
+    if (dev->cfd_level[0] > 700)
+        *rate0 = 0;
+}
+
+/* Photon arrival time distribution: a peak a quarter of the way through the
+ * sync period on a flat background, zero past the end of the period. */
+static void make_shape(sim_device *dev)
+{
+    double res = resolution(dev);
+    double period = sync_period_ps();
+    int bins = HISTCHAN;
+    double total = 0;
+
+    if (period > 0 && period / res < HISTCHAN)
+        bins = (int)(period / res);
+    if (!dev->shape)
+        dev->shape = malloc(sizeof(double) * HISTCHAN);
+
+    double centre = (period > 0 ? period : HISTCHAN * BASE_RESOLUTION) / 4;
+    centre -= dev->offset * 1000.0;
+    for (int i = 0; i < bins; i++) {
+        double t = (i + 0.5) * res - centre;
+        dev->shape[i] = exp(-t * t / (2 * 300.0 * 300.0)) * res + 0.02 * res;
+        total += dev->shape[i];
+    }
+    for (int i = 0; i < bins; i++)
+        dev->shape[i] /= total;
+    dev->shape_bins = bins;
+    dev->shape_valid = 1;
+}
+
+/* Put the photons that arrived between filled_until and until into the
+ * histogram memory. */
+static void fill_histogram(sim_device *dev, double until)
+{
+    double rate0, rate1;
+    double duration = until - dev->filled_until;
+
+    if (duration <= 0 || dev->mode != MODE_HIST)
+        return;
+    if (!dev->shape_valid)
+        make_shape(dev);
+    true_rates(dev, &rate0, &rate1);
+    if (rate0 == 0)
+        rate1 = 0;
+
+    double photons = rate1 * duration;
+    for (int i = 0; i < dev->shape_bins; i++) {
+        uint64_t value = dev->hist[i] + poisson(dev, photons * dev->shape[i]);
+        if (dev->stop_ovfl && value >= (uint64_t)dev->stop_count) {
+            value = dev->stop_count;
+            dev->flags |= FLAG_OVERFLOW;
+        }
+        dev->hist[i] = value > 0xFFFFFFFFu ? 0xFFFFFFFFu : (uint32_t)value;
+    }
+    dev->filled_until = until;
+}
+
+/* Bring the measurement up to date: fill, and finish it if it's run out of
+ * time or overflowed. */
+static void update_measurement(sim_device *dev)
+{
+    double t = now();
+    if (!dev->running)
+        return;
+    double end = dev->start_time + dev->tacq * 1e-3;
+    if (t >= end)
+        t = end;
+    fill_histogram(dev, t);
+    if (t >= end || (dev->flags & FLAG_OVERFLOW && dev->stop_ovfl)) {
+        dev->ctc_done = 1;
+        dev->stop_time = t;
+    }
+}
+
+static void update_rates(sim_device *dev)
+{
+    double t = now();
+    if (t - dev->gate_start < GATE_TIME)
+        return;
+    double rate0, rate1;
+    true_rates(dev, &rate0, &rate1);
+    if (rate0 == 0)
+        rate1 = 0;
+    /* A 100ms gate counts rate * 0.1 events, give the rate that implies */
+    dev->rates[0] = (int)(poisson(dev, rate0 * GATE_TIME) / GATE_TIME);
+    dev->rates[1] = (int)(poisson(dev, rate1 * GATE_TIME) / GATE_TIME);
+    /* Gates run back to back, skip any that were missed */
+    dev->gate_start += GATE_TIME * (int)((t - dev->gate_start) / GATE_TIME);
+}
+
+/* Counting restarts when the inputs change, rates read 0 for a gate. */
+static void restart_rates(sim_device *dev)
+{
+    dev->gate_start = now();
+    dev->rates[0] = 0;
+    dev->rates[1] = 0;
+    dev->shape_valid = 0;
+}
+
+/* Every device call goes through here: checks, locks, adds latency. */
+static sim_device *get_device(int devidx, int *error)
+{
+    pthread_once(&init_once, init_library);
+    if (devidx < 0 || devidx >= MAXDEVNUM) {
+        *error = ERROR_INVALID_ARGUMENT;
+        return NULL;
+    }
+    sim_device *dev = &devices[devidx];
+    if (!dev->open) {
+        *error = ERROR_DEVICE_NOT_OPEN;
+        return NULL;
+    }
+    if (call_us > 0)
+        sleep_seconds(call_us * 1e-6);
+    pthread_mutex_lock(&dev->lock);
+    *error = ERROR_NONE;
+    return dev;
+}
+
+#define DEVICE_OR_RETURN(devidx)              \
+    int error;                                \
+    sim_device *dev = get_device(devidx, &error); \
+    if (!dev)                                 \
+        return error;
+
+#define RETURN(code)                          \
+    do {                                      \
+        pthread_mutex_unlock(&dev->lock);     \
+        return (code);                        \
+    } while (0)
+
+/* ------------------------------------------------------------------------
+ * Library functions
+ * --------------------------------------------------------------------- */
+
+int PH_GetLibraryVersion(char *version)
+{
+    strcpy(version, LIB_VERSION);
+    return ERROR_NONE;
+}
+
+int PH_GetErrorString(char *errstring, int errcode)
+{
+    for (size_t i = 0; i < sizeof(error_strings) / sizeof(*error_strings); i++) {
+        if (error_strings[i].code == errcode) {
+            strcpy(errstring, error_strings[i].text);
+            return ERROR_NONE;
+        }
+    }
+    sprintf(errstring, "ERROR_UNKNOWN_%d", errcode);
+    return ERROR_NONE;
+}
+
+/* ------------------------------------------------------------------------
+ * Device open/close/setup
+ * --------------------------------------------------------------------- */
+
+int PH_OpenDevice(int devidx, char *serial)
+{
+    pthread_once(&init_once, init_library);
+    if (devidx < 0 || devidx >= MAXDEVNUM)
+        return ERROR_INVALID_ARGUMENT;
+    if (devidx >= n_devices) {
+        serial[0] = '\0';
+        return ERROR_DEVICE_OPEN_FAIL;
+    }
+    sim_device *dev = &devices[devidx];
+    pthread_mutex_lock(&dev->lock);
+    dev->open = 1;
+    dev->initialized = 0;
+    sprintf(serial, "%07d", 1020000 + devidx);
+    pthread_mutex_unlock(&dev->lock);
+    return ERROR_NONE;
+}
+
+int PH_CloseDevice(int devidx)
+{
+    DEVICE_OR_RETURN(devidx);
+    dev->open = 0;
+    dev->running = 0;
+    RETURN(ERROR_NONE);
+}
+
+int PH_Initialize(int devidx, int mode)
+{
+    DEVICE_OR_RETURN(devidx);
+    if (mode != MODE_HIST && mode != MODE_T2 && mode != MODE_T3)
+        RETURN(ERROR_INVALID_MODE);
+    dev->mode = mode;
+    dev->initialized = 1;
+    dev->binning = 0;
+    dev->sync_div = 1;
+    dev->offset = 0;
+    dev->cfd_level[0] = dev->cfd_level[1] = 100;
+    dev->cfd_zc[0] = dev->cfd_zc[1] = 10;
+    dev->stop_ovfl = 0;
+    dev->stop_count = 65535;
+    dev->running = 0;
+    dev->ctc_done = 0;
+    dev->flags = 0;
+    memset(dev->hist, 0, sizeof(dev->hist));
+    restart_rates(dev);
+    RETURN(ERROR_NONE);
+}
+
+int PH_Calibrate(int devidx)
+{
+    DEVICE_OR_RETURN(devidx);
+    if (!dev->initialized)
+        RETURN(ERROR_NOT_INITIALIZED);
+    /* The real calibration takes a moment */
+    sleep_seconds(0.05);
+    RETURN(ERROR_NONE);
+}
+
+int PH_GetHardwareInfo(int devidx, char *model, char *partno, char *version)
+{
+    DEVICE_OR_RETURN(devidx);
+    strcpy(model, "PicoHarp 300");
+    strcpy(partno, "930004");
+    strcpy(version, "2.0");
+    RETURN(ERROR_NONE);
+}
+
+int PH_GetSerialNumber(int devidx, char *serial)
+{
+    DEVICE_OR_RETURN(devidx);
+    sprintf(serial, "%07d", 1020000 + devidx);
+    RETURN(ERROR_NONE);
+}
+
+int PH_GetFeatures(int devidx, int *features)
+{
+    DEVICE_OR_RETURN(devidx);
+    /* DLL | TTTR | MARKERS | LOWRES | TRIGOUT */
+    *features = 0x001F;
+    RETURN(ERROR_NONE);
+}
+
+int PH_GetBaseResolution(int devidx, double *resolution, int *binsteps)
+{
+    DEVICE_OR_RETURN(devidx);
+    *resolution = BASE_RESOLUTION;
+    *binsteps = BINSTEPSMAX;
+    RETURN(ERROR_NONE);
+}
+
+int PH_GetResolution(int devidx, double *res)
+{
+    DEVICE_OR_RETURN(devidx);
+    *res = resolution(dev);
+    RETURN(ERROR_NONE);
+}
+
+/* ------------------------------------------------------------------------
+ * Settings
+ * --------------------------------------------------------------------- */
+
+int PH_SetSyncDiv(int devidx, int div)
+{
+    DEVICE_OR_RETURN(devidx);
+    if (div != 1 && div != 2 && div != 4 && div != 8)
+        RETURN(ERROR_INVALID_ARGUMENT);
+    dev->sync_div = div;
+    restart_rates(dev);
+    RETURN(ERROR_NONE);
+}
+
+int PH_SetInputCFD(int devidx, int channel, int level, int zc)
+{
+    DEVICE_OR_RETURN(devidx);
+    if (channel < 0 || channel > 1 || level < 0 || level > 800 || zc < 0 ||
+        zc > 20)
+        RETURN(ERROR_INVALID_ARGUMENT);
+    dev->cfd_level[channel] = level;
+    dev->cfd_zc[channel] = zc;
+    restart_rates(dev);
+    RETURN(ERROR_NONE);
+}
+
+int PH_SetBinning(int devidx, int binning)
+{
+    DEVICE_OR_RETURN(devidx);
+    if (binning < 0 || binning >= BINSTEPSMAX)
+        RETURN(ERROR_INVALID_ARGUMENT);
+    dev->binning = binning;
+    dev->shape_valid = 0;
+    RETURN(ERROR_NONE);
+}
+
+int PH_SetOffset(int devidx, int offset)
+{
+    DEVICE_OR_RETURN(devidx);
+    dev->offset = offset;
+    dev->shape_valid = 0;
+    RETURN(ERROR_NONE);
+}
+
+int PH_SetSyncOffset(int devidx, int syncoffset)
+{
+    return PH_SetOffset(devidx, syncoffset);
+}
+
+int PH_SetStopOverflow(int devidx, int stop_ovfl, int stopcount)
+{
+    DEVICE_OR_RETURN(devidx);
+    if (stopcount < 1 || stopcount > 65535)
+        RETURN(ERROR_INVALID_ARGUMENT);
+    dev->stop_ovfl = stop_ovfl;
+    dev->stop_count = stopcount;
+    RETURN(ERROR_NONE);
+}
+
+int PH_SetMultistopEnable(int devidx, int enable)
+{
+    DEVICE_OR_RETURN(devidx);
+    (void)enable;
+    RETURN(ERROR_NONE);
+}
+
+/* ------------------------------------------------------------------------
+ * Measurements
+ * --------------------------------------------------------------------- */
+
+int PH_ClearHistMem(int devidx, int block)
+{
+    DEVICE_OR_RETURN(devidx);
+    (void)block;
+    memset(dev->hist, 0, sizeof(dev->hist));
+    dev->flags &= ~FLAG_OVERFLOW;
+    RETURN(ERROR_NONE);
+}
+
+int PH_StartMeas(int devidx, int tacq)
+{
+    DEVICE_OR_RETURN(devidx);
+    if (!dev->initialized)
+        RETURN(ERROR_NOT_INITIALIZED);
+    if (tacq < 1 || tacq > 360000000)
+        RETURN(ERROR_INVALID_ARGUMENT);
+    dev->tacq = tacq;
+    dev->start_time = now();
+    dev->filled_until = dev->start_time;
+    dev->fifo_until = dev->start_time;
+    dev->fifo_level = 0;
+    dev->tttr_photons = 0;
+    dev->last_overflow = 0;
+    dev->running = 1;
+    dev->ctc_done = 0;
+    dev->flags &= ~FLAG_FIFOFULL;
+    RETURN(ERROR_NONE);
+}
+
+int PH_StopMeas(int devidx)
+{
+    DEVICE_OR_RETURN(devidx);
+    if (dev->running) {
+        update_measurement(dev);
+        if (!dev->ctc_done)
+            dev->stop_time = now();
+    }
+    dev->running = 0;
+    RETURN(ERROR_NONE);
+}
+
+int PH_CTCStatus(int devidx, int *ctcstatus)
+{
+    DEVICE_OR_RETURN(devidx);
+    update_measurement(dev);
+    *ctcstatus = dev->ctc_done || !dev->running;
+    RETURN(ERROR_NONE);
+}
+
+int PH_GetElapsedMeasTime(int devidx, double *elapsed)
+{
+    DEVICE_OR_RETURN(devidx);
+    update_measurement(dev);
+    double end = dev->running && !dev->ctc_done ? now() : dev->stop_time;
+    *elapsed = (end - dev->start_time) * 1e3;
+    RETURN(ERROR_NONE);
+}
+
+int PH_GetHistogram(int devidx, unsigned int *chcount, int block)
+{
+    DEVICE_OR_RETURN(devidx);
+    (void)block;
+    if (dev->mode != MODE_HIST)
+        RETURN(ERROR_INVALID_MODE);
+    update_measurement(dev);
+    memcpy(chcount, dev->hist, sizeof(dev->hist));
+    RETURN(ERROR_NONE);
+}
+
+int PH_GetCountRate(int devidx, int channel, int *rate)
+{
+    DEVICE_OR_RETURN(devidx);
+    if (channel < 0 || channel > 1)
+        RETURN(ERROR_INVALID_ARGUMENT);
+    update_rates(dev);
+    *rate = dev->rates[channel];
+    RETURN(ERROR_NONE);
+}
+
+int PH_GetFlags(int devidx, int *flags)
+{
+    DEVICE_OR_RETURN(devidx);
+    update_measurement(dev);
+    *flags = dev->flags;
+    RETURN(ERROR_NONE);
+}
+
+int PH_GetWarnings(int devidx, int *warnings)
+{
+    DEVICE_OR_RETURN(devidx);
+    update_rates(dev);
+    int w = 0;
+    double period = dev->rates[0] > 0 ? 1e12 / dev->rates[0] : 0;
+    if (dev->rates[0] == 0)
+        w |= WARNING_INP0_RATE_ZERO;
+    else if (dev->rates[0] < 100)
+        w |= WARNING_INP0_RATE_TOO_LOW;
+    else if (dev->rates[0] > 84000000)
+        w |= WARNING_INP0_RATE_TOO_HIGH;
+    if (dev->rates[1] == 0)
+        w |= WARNING_INP1_RATE_ZERO;
+    else if (dev->rates[1] > 10000000)
+        w |= WARNING_INP1_RATE_TOO_HIGH;
+    if (dev->rates[0] > 0 && dev->rates[1] > 0.05 * dev->rates[0])
+        w |= WARNING_INP_RATE_RATIO;
+    if (dev->sync_div > 1 && dev->rates[0] > 0 && dev->rates[0] < 1000000)
+        w |= WARNING_DIVIDER_GREATER_ONE;
+    if (dev->mode == MODE_HIST && period > HISTCHAN * resolution(dev))
+        w |= WARNING_TIME_SPAN_TOO_SMALL;
+    *warnings = w;
+    RETURN(ERROR_NONE);
+}
+
+int PH_GetWarningsText(int devidx, char *text, int warnings)
+{
+    DEVICE_OR_RETURN(devidx);
+    text[0] = '\0';
+    for (size_t i = 0; i < sizeof(warning_strings) / sizeof(*warning_strings);
+         i++) {
+        if (warnings & warning_strings[i].bit) {
+            strcat(text, warning_strings[i].text);
+            strcat(text, "\n");
+        }
+    }
+    RETURN(ERROR_NONE);
+}
+
+/* ------------------------------------------------------------------------
+ * TTTR
+ * --------------------------------------------------------------------- */
+
+/* A photon on input 1: same shape as the histograms, a peak a quarter of
+ * the way through the sync period on a flat background. */
+static uint32_t t3_record(sim_device *dev, uint64_t nsync, double period_ps)
+{
+    double res = resolution(dev);
+    double t = period_ps / 4 + 300.0 * gaussian(dev);
+    if (uniform(dev) < 0.1)
+        t = uniform(dev) * fmin(period_ps, 4096 * res);
+    int dtime = t < 0 ? 0 : (int)(t / res);
+    if (dtime > 4095)
+        dtime = 4095;
+    return (1u << 28) | ((uint32_t)dtime << 16) | (uint32_t)(nsync % T3WRAPAROUND);
+}
+
+int PH_ReadFiFo(int devidx, unsigned int *buffer, int count, int *nactual)
+{
+    DEVICE_OR_RETURN(devidx);
+    *nactual = 0;
+    if (dev->mode != MODE_T2 && dev->mode != MODE_T3)
+        RETURN(ERROR_INVALID_MODE);
+    if (count < 0 || count > TTREADMAX)
+        RETURN(ERROR_INVALID_ARGUMENT);
+    if (!dev->running)
+        RETURN(ERROR_NONE);
+
+    double rate0, rate1;
+    true_rates(dev, &rate0, &rate1);
+    if (rate0 == 0 && dev->mode == MODE_T3)
+        rate1 = 0;
+
+    double t = now();
+    double end = dev->start_time + dev->tacq * 1e-3;
+    if (t >= end) {
+        t = end;
+        dev->ctc_done = 1;
+        dev->stop_time = end;
+    }
+    /* Photons that arrived since the last read go into the FIFO, which
+     * only holds so many. */
+    dev->fifo_level += rate1 * (t - dev->fifo_until);
+    dev->fifo_until = t;
+    if (dev->fifo_level > FIFO_SIZE) {
+        dev->fifo_level = FIFO_SIZE;
+        dev->flags |= FLAG_FIFOFULL;
+    }
+
+    int n = 0;
+    double period_ps = rate0 > 0 ? 1e12 / rate0 : 1e6;
+    double photon_period = rate1 > 0 ? 1.0 / rate1 : 0;
+    while (n < count && dev->fifo_level >= 1) {
+        /* Arrival time of this photon since the start, in seconds */
+        double arrival = dev->tttr_photons * photon_period;
+        if (dev->mode == MODE_T3) {
+            uint64_t nsync = (uint64_t)(arrival * rate0);
+            uint64_t overflows = nsync / T3WRAPAROUND;
+            if (overflows > dev->last_overflow) {
+                buffer[n++] = 15u << 28;
+                dev->last_overflow++;
+                continue;
+            }
+            buffer[n++] = t3_record(dev, nsync, period_ps);
+        } else {
+            uint64_t tag = (uint64_t)(arrival * 1e12 / BASE_RESOLUTION);
+            uint64_t overflows = tag / T2WRAPAROUND;
+            if (overflows > dev->last_overflow) {
+                buffer[n++] = 15u << 28;
+                dev->last_overflow++;
+                continue;
+            }
+            buffer[n++] = (1u << 28) | (uint32_t)(tag % T2WRAPAROUND);
+        }
+        dev->tttr_photons++;
+        dev->fifo_level -= 1;
+    }
+    *nactual = n;
+    RETURN(ERROR_NONE);
+}
@@ -0,0 +1,170 @@
+"""
+Histograms built in software from decoded T3 events (see LD_Pharp_Decoder)
+rather than by the Picoharp itself.
+
+The hardware can only bin in 2**n multiples of the 4ps base resolution and
+changing that means a new measurement. Here any number of histograms, each
+with its own bin width and time window, are filled from the same stream of
+photons as it arrives, so the same data can be looked at at several
+resolutions at once (and a new one added without re-measuring anything
+that comes after).
+"""
+
+# pylint: disable=C0103
+
+import math
+import threading
+
+import numpy as np
+
+
+class Soft_Histogram():
+    """
+    One histogram of photon arrival time (relative to the sync) with an
+    arbitrary bin width and window, accumulated block by block.
+
+    T3 dtimes only take 4096 values, so rather than binning every photon
+    again for every histogram, each block is counted once per dtime
+    (Soft_Histogrammer does this) and each histogram just maps those 4096
+    counts onto its own bins. That's the same answer, since all the photons
+    with the same dtime land in the same bin anyway.
+
+    Note if bin_Width isn't a whole multiple of the resolution the events
+    were recorded at, some bins will cover more hardware bins than others
+    and the histogram will show a (real, but uninteresting) comb pattern.
+    """
+
+    def __init__(self, bin_Width, window_Start=0.0, window_Stop=None,
+                 channel=1, resolution=4.0, n_Dtimes=4096):
+        """
+        bin_Width, window_Start and window_Stop in ps. If window_Stop isn't
+        given the window covers every dtime.
+        channel is the input to histogram (in T3 mode the sync is on 0 so
+        the photons are on 1)
+        resolution is the (ps) size of a dtime step, n_Dtimes how many
+        dtime values there are.
+        """
+
+        if bin_Width <= 0:
+            raise ValueError(f"Bin width {bin_Width} must be positive")
+        if window_Stop is None:
+            window_Stop = n_Dtimes * resolution
+
+        self.bin_Width = float(bin_Width)
+        self.window_Start = float(window_Start)
+        self.n_Bins = math.ceil((window_Stop - window_Start) / bin_Width)
+        self.window_Stop = self.window_Start + self.n_Bins * self.bin_Width
+        self.channel = channel
+        self.counts = np.zeros(self.n_Bins, dtype=np.int64)
+        self.n_Events = 0
+
+        # Which of this histogram's bins each dtime falls in, for the
+        # dtimes that fall in the window at all.
+        dtime_Times = np.arange(n_Dtimes) * float(resolution)
+        bins = np.floor((dtime_Times - self.window_Start) / self.bin_Width)
+        self._in_Window = (bins >= 0) & (bins < self.n_Bins)
+        self._dtime_Bins = bins[self._in_Window].astype(np.intp)
+
+    @property
+    def bin_Edges(self):
+        """
+        n_Bins + 1 bin edges in ps.
+        """
+        return self.window_Start + self.bin_Width * np.arange(self.n_Bins + 1)
+
+    def Clear(self):
+        self.counts[:] = 0
+        self.n_Events = 0
+
+    def Add_Dtime_Counts(self, dtime_Counts):
+        """
+        Add a block of photons on this histogram's channel, given as the
+        number of photons with each dtime.
+        """
+
+        weights = dtime_Counts[self._in_Window]
+        new_Counts = np.bincount(self._dtime_Bins,
+                                 weights=weights,
+                                 minlength=self.n_Bins)
+        self.counts += new_Counts.astype(np.int64)
+        self.n_Events += int(weights.sum())
+
+
+class Soft_Histogrammer():
+    """
+    A set of Soft_Histograms fed from the same events. Each block of events
+    is only looked at once: the photons on each channel are counted up per
+    dtime, then those counts are handed to every histogram.
+    """
+
+    def __init__(self, resolution, n_Dtimes=4096):
+        """
+        resolution is the (ps) size of a dtime step in the events.
+        """
+        self.resolution = resolution
+        self.n_Dtimes = n_Dtimes
+        self.histograms = []
+        self._lock = threading.Lock()
+
+    def Add_Histogram(self, bin_Width, window_Start=0.0, window_Stop=None,
+                      channel=1):
+        """
+        Start filling another histogram (from the next block of events on)
+        Returns it so the caller can keep hold of it.
+        """
+        histogram = Soft_Histogram(bin_Width, window_Start, window_Stop,
+                                   channel, self.resolution, self.n_Dtimes)
+        with self._lock:
+            self.histograms.append(histogram)
+        return histogram
+
+    def Remove_Histogram(self, histogram):
+        with self._lock:
+            self.histograms.remove(histogram)
+
+    def Clear(self):
+        with self._lock:
+            for histogram in self.histograms:
+                histogram.Clear()
+
+    def Add_Events(self, events):
+        """
+        events is an LD_Pharp_Decoder.event_Dtype array from a T3 mode
+        measurement. Marker events are ignored.
+        """
+
+        with self._lock:
+            channels = {histogram.channel for histogram in self.histograms}
+            for channel in channels:
+                photons = ((events["channel"] == channel)
+                           & (events["marker"] == 0))
+                dtime_Counts = np.bincount(events["dtime"][photons],
+                                           minlength=self.n_Dtimes)
+                for histogram in self.histograms:
+                    if histogram.channel == channel:
+                        histogram.Add_Dtime_Counts(dtime_Counts)
+
+    def Snapshot(self):
+        """
+        Copies of the counts of every histogram, safe to hand to another
+        thread (e.g. the GUI) while this one keeps filling.
+        """
+        with self._lock:
+            return [histogram.counts.copy() for histogram in self.histograms]
+
+
+if __name__ == "__main__":
+    import LD_Pharp_Decoder
+
+    rng = np.random.default_rng(0)
+    n_Photons = 1000000
+    dtime = np.clip(rng.normal(1000, 30, n_Photons), 0, 4095).astype(np.uint32)
+    records = (np.uint32(1) << 28) | (dtime << 16)
+    events = LD_Pharp_Decoder.Decode_T3(records, 4.0)
+
+    histogrammer = Soft_Histogrammer(4.0)
+    coarse = histogrammer.Add_Histogram(64.0)
+    fine = histogrammer.Add_Histogram(4.0, 3800.0, 4200.0)
+    histogrammer.Add_Events(events)
+    print(f"coarse peak at {coarse.bin_Edges[coarse.counts.argmax()]}ps, "
+          f"fine peak at {fine.bin_Edges[fine.counts.argmax()]}ps")